@@ -21,12 +21,16 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'store.apps.StoreStaticFilesConfig',  # بديل django.contrib.staticfiles يستبعد ثيمات الإدارة غير المستخدمة
     'store',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'store.metrics.MetricsMiddleware',
+    'store.slow_queries.SlowQueryMiddleware',
+    'store.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,10 +60,15 @@ TEMPLATES = [
 WSGI_APPLICATION = 'Core.wsgi.application'
 
 
+# STORE_DB_PATH يسمح بتشغيل نسخة على قاعدة بيانات أخرى (مثل أمر loadtest) بدون تعديل الإعدادات
+# وضع WAL: القراءة (والنسخ الاحتياطي backup_db) لا تمنع الكتابة
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('STORE_DB_PATH') or BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL',
+        },
     }
 }
 
@@ -94,6 +103,91 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# WhiteNoise يخدم الملفات الثابتة بأسماء مشفرة (hash) مع نسخ gzip و brotli وتخزين مؤقت طويل في المتصفح
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'store.storage.StaticFilesStorage',
+    },
+}
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+
+# تخزين مؤقت على القرص (نتائج منشئ التقارير) بدون الحاجة إلى Redis، والمجلد قابل للتغيير بـ STORE_CACHE_DIR
+# (FileBasedCache نفسه مع عد الإصابات والإخفاقات في /metrics)
+CACHES = {
+    'default': {
+        'BACKEND': 'store.cache.MeteredFileBasedCache',
+        'LOCATION': os.environ.get('STORE_CACHE_DIR') or BASE_DIR / 'cache',
+    }
+}
+
+# الردود الأصغر من هذا الحجم (بالبايت) تُرسل بدون ضغط
+STORE_COMPRESS_MIN_LENGTH = 1024
+
+# المهام الثقيلة تُنفذ عبر "python manage.py run_worker"، وعند True تُنفذ فوراً داخل الطلب (للتطوير فقط)
+STORE_JOBS_EAGER = False
+
+# التنبيهات اليومية (python manage.py compute_alerts): أيام التنبيه قبل قسط البنك، وعمر الفاتورة غير المسددة
+STORE_ALERT_BANK_DAYS = 3
+STORE_ALERT_INVOICE_AGE_DAYS = 30
+# مستلمو بريد التنبيهات (الافتراضي: بريد المديرين superuser)
+STORE_ALERT_EMAILS = []
+
+# البريد: SMTP فقط عند ضبط EMAIL_HOST، وإلا تُكتب الرسائل في مخرجات الأمر (console) بدلاً من
+# محاولة الاتصال بـ localhost:25 غير الموجود
+EMAIL_HOST = os.environ.get('EMAIL_HOST', '')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT') or 587)
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '1') == '1'
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND') or (
+    'django.core.mail.backends.smtp.EmailBackend' if EMAIL_HOST else 'django.core.mail.backends.console.EmailBackend'
+)
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL') or 'webmaster@localhost'
+
+# منشئ التقارير (/api/report/): أقصى عدد صفوف في الرد، ومدة بقاء النتيجة في الكاش (بالثواني)
+STORE_REPORT_MAX_ROWS = 1000
+STORE_REPORT_CACHE_SECONDS = 600
+# تقارير تُجهز في الكاش بمهمة precompute_reports (معاملات /api/report/ لكل تقرير)
+STORE_PRECOMPUTE_REPORTS = [
+    {'group': 'month', 'measures': 'total_price,profit,margin', 'type': 'out'},
+    {'group': 'contact', 'measures': 'total_price,remaining', 'sort': '-remaining', 'limit': '20'},
+]
+
+# مدة الاحتفاظ بمفاتيح منع تكرار النماذج المرسلة من الهاتف (بالأيام)، ويجب أن تزيد عن أطول انقطاع متوقع
+STORE_IDEMPOTENCY_DAYS = 30
+
+# أرشفة الفواتير المسددة بالكامل (python manage.py archive_ledger): عمر الفاتورة بالأيام قبل نقلها للأرشيف
+STORE_ARCHIVE_AFTER_DAYS = 365
+
+# النسخ الاحتياطي (python manage.py backup_db): مجلد النسخ، عدد أحدث النسخ المحتفظ بها،
+# وعدد الأشهر التي تبقى منها أول نسخة في كل شهر
+STORE_BACKUP_DIR = os.environ.get('STORE_BACKUP_DIR') or BASE_DIR / 'backups'
+STORE_BACKUP_KEEP = 7
+STORE_BACKUP_KEEP_MONTHLY = 12
+
+# توقع الخزنة في الرئيسية (/api/forecast/): عدد الأشهر الافتراضي، وعدد الأيام لحساب متوسط مصاريف البيت اليومي
+STORE_FORECAST_MONTHS = 3
+STORE_FORECAST_HOME_DAYS = 90
+
+# استيراد كشف البنك (/bank/import/): أقصى عدد أيام بين تاريخ الفاتورة وتاريخ التحويل عند البحث عن الفواتير المطابقة
+STORE_BANK_IMPORT_WINDOW_DAYS = 90
+
+# مقاييس Prometheus (/metrics): مجلد ملفات العدادات المشترك بين العمليات (ملف لكل عملية حية + ملف مجمع للمنتهية)،
+# كل كم ثانية تكتب العملية عداداتها فيه، ورمز القراءة بدون تسجيل دخول (Authorization: Bearer <الرمز>)
+STORE_METRICS_DIR = os.environ.get('STORE_METRICS_DIR') or BASE_DIR / 'metrics'
+STORE_METRICS_FLUSH_SECONDS = 2
+STORE_METRICS_TOKEN = os.environ.get('STORE_METRICS_TOKEN', '')
+
+# سجل الاستعلامات البطيئة (/admin-logs/slow-queries/): أي استعلام أبطأ من هذا الحد بالمللي ثانية يُسجل مع
+# خطة تنفيذه (0 = معطل)، ملف السجل وحجمه الأقصى قبل تدويره، وعدد أشكال الاستعلامات المعروضة في الصفحة
+STORE_SLOW_QUERY_MS = int(os.environ.get('STORE_SLOW_QUERY_MS') or 0)
+STORE_SLOW_QUERY_LOG = os.environ.get('STORE_SLOW_QUERY_LOG') or BASE_DIR / 'logs' / 'slow_queries.jsonl'
+STORE_SLOW_QUERY_MAX_BYTES = 5 * 1024 * 1024
+STORE_SLOW_QUERY_TOP = 20
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
@@ -138,6 +232,9 @@ JAZZMIN_SETTINGS = {
         "store.HomeExpense": "fas fa-house-user",
         "store.Capital": "fas fa-money-bill-wave",
         "store.BankLoan": "fas fa-university",
+        "store.PeriodClose": "fas fa-lock",
+        "store.Job": "fas fa-tasks",
+        "store.Alert": "fas fa-bell",
     },
     
     # جعل القائمة الجانبية تفتح وتغلق (اختياري)
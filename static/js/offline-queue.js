@@ -0,0 +1,100 @@
+/*
+ * طابور النماذج المرسلة (IndexedDB). يُستخدم من الصفحات (offline.js) ومن الـ service worker (sw.js).
+ *
+ * كل نموذج يُحفظ في الطابور قبل إرساله ويُحذف بعد تأكيد السيرفر، فلا يضيع إدخال لو انقطع
+ * الاتصال في منتصف الطلب. الإرسال يحمل X-Idempotency-Key ثابتاً لكل نموذج، فإعادة الإرسال
+ * (من الصفحة ومن الـ service worker معاً مثلاً) لا تُسجل العملية مرتين.
+ */
+(function (scope) {
+    var DB_NAME = 'store-offline';
+    var STORE = 'requests';
+    var database = null;
+
+    function open() {
+        if (database) return database;
+        database = new Promise(function (resolve, reject) {
+            var request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = function () {
+                request.result.createObjectStore(STORE, { keyPath: 'key' });
+            };
+            request.onsuccess = function () { resolve(request.result); };
+            request.onerror = function () { database = null; reject(request.error); };
+        });
+        return database;
+    }
+
+    function run(mode, action) {
+        return open().then(function (db) {
+            return new Promise(function (resolve, reject) {
+                var tx = db.transaction(STORE, mode);
+                var request = action(tx.objectStore(STORE));
+                tx.oncomplete = function () { resolve(request.result); };
+                tx.onerror = tx.onabort = function () { reject(tx.error); };
+            });
+        });
+    }
+
+    function newKey() {
+        if (scope.crypto && crypto.randomUUID) return crypto.randomUUID();
+        var bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.prototype.map.call(bytes, function (b) { return ('0' + b.toString(16)).slice(-2); }).join('');
+    }
+
+    var OfflineQueue = {
+        newKey: newKey,
+
+        add: function (entry) {
+            return run('readwrite', function (store) { return store.put(entry); });
+        },
+
+        remove: function (key) {
+            return run('readwrite', function (store) { return store.delete(key); });
+        },
+
+        all: function () {
+            return run('readonly', function (store) { return store.getAll(); }).then(function (entries) {
+                return entries.sort(function (a, b) { return a.created - b.created; });
+            });
+        },
+
+        /*
+         * إرسال نموذج واحد. النتيجة {done: true, data} عند رد JSON من السيرفر (نُفذ أو كان مكرراً)،
+         * و {done: false, reason} إذا لم يقبله السيرفر بعد (انتهت الجلسة أو رمز CSRF) فيبقى في الطابور.
+         * انقطاع الشبكة يرفض الـ Promise.
+         */
+        send: function (entry) {
+            return fetch(entry.url, {
+                method: 'POST',
+                body: new URLSearchParams(entry.fields),
+                headers: { 'X-Idempotency-Key': entry.key, 'Accept': 'application/json' },
+                credentials: 'same-origin',
+                referrer: entry.page,
+            }).then(function (response) {
+                var type = response.headers.get('Content-Type') || '';
+                if (response.ok && type.indexOf('application/json') === 0) {
+                    return response.json().then(function (data) { return { done: true, data: data }; });
+                }
+                return { done: false, reason: response.url.indexOf('/login/') !== -1 ? 'login' : 'rejected' };
+            });
+        },
+
+        /* إرسال كل الطابور بالترتيب، والتوقف عند أول انقطاع للشبكة. يُرجع نتائج ما تم إرساله. */
+        replay: function () {
+            var results = [];
+            return OfflineQueue.all().then(function (entries) {
+                return entries.reduce(function (chain, entry) {
+                    return chain.then(function (stopped) {
+                        if (stopped) return true;
+                        return OfflineQueue.send(entry).then(function (result) {
+                            result.entry = entry;
+                            results.push(result);
+                            return result.done ? OfflineQueue.remove(entry.key).then(function () { return false; }) : false;
+                        }, function () { return true; });
+                    });
+                }, Promise.resolve(false));
+            }).then(function () { return results; });
+        },
+    };
+
+    scope.OfflineQueue = OfflineQueue;
+})(self);
@@ -114,7 +114,7 @@
         // Apply select2 to any select boxes that don't yet have it
         // and are not part of the django's empty-form inline
         const noSelect2 = '.empty-form select, .select2-hidden-accessible, .selectfilter, .selector-available select, .selector-chosen select, select[data-autocomplete-light-function=select2]';
-        $('select').not(noSelect2).select2({ width: 'element' });
+        $('select').not(noSelect2).select2({ width: '100%' });
     }
 
     $(document).ready(function () {
@@ -126,8 +126,8 @@
         $('.related-lookup').append('<i class="fa fa-search"></i>');
 
         // Style the inline fieldset button
-        $('.inline-related fieldset.module .add-row a').addClass('btn btn-sm btn-default float-right');
-        $('div.add-row>a').addClass('btn btn-sm btn-default float-right');
+        $('.inline-related fieldset.module .add-row a').addClass('btn btn-sm btn-default float-end');
+        $('div.add-row>a').addClass('btn btn-sm btn-default float-end');
 
         // Ensure we preserve the tab the user was on using the url hash, even on page reload
         if ($tabs.length) { handleTabs($tabs); }
@@ -13,7 +13,7 @@
     }
 
     function handleMenu() {
-        $('[data-widget=pushmenu]').bind('click', function () {
+        $('[data-widget=pushmenu], [data-lte-toggle=sidebar]').on('click', function () {
             const menuClosed = getCookie('jazzy_menu') === 'closed';
             if (!menuClosed) {
                 setCookie('jazzy_menu', 'closed');
@@ -48,6 +48,61 @@
         $main_li_parent.addClass('menu-is-opening menu-open');
     };
 
+    function initThemeChooser() {
+        const $themeSelect = $('#jazzmin-theme-select');
+        const $modeSelect = $('#jazzmin-mode-select');
+
+        if (!$themeSelect.length && !$modeSelect.length) {
+            return;
+        }
+
+        // Restore saved theme from localStorage
+        const savedTheme = localStorage.getItem('jazzmin-theme');
+        if (savedTheme && $themeSelect.length) {
+            $themeSelect.val(savedTheme);
+        }
+
+        // Restore saved mode from localStorage
+        const savedMode = localStorage.getItem('jazzmin-theme-mode');
+        if (savedMode && $modeSelect.length) {
+            $modeSelect.val(savedMode);
+        }
+
+        // Theme switching — #jazzmin-theme link is always present in the DOM
+        $themeSelect.on('change', function () {
+            const newTheme = $(this).val();
+            const $themeCSS = $('#jazzmin-theme');
+            const base = $themeCSS.data('theme-base');
+
+            if (newTheme === 'default') {
+                $themeCSS.removeAttr('href');
+            } else {
+                $themeCSS.attr('href', base + '/' + newTheme + '/bootstrap.min.css');
+            }
+
+            $('body').removeClass(function (index, className) {
+                return (className.match(/(^|\s)theme-\S+/g) || []).join(' ');
+            }).addClass('theme-' + newTheme);
+
+            localStorage.setItem('jazzmin-theme', newTheme);
+        });
+
+        // Color scheme switching
+        $modeSelect.on('change', function () {
+            const mode = $(this).val();
+            var resolved = mode === 'auto'
+                ? (window.matchMedia && window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light')
+                : mode;
+            document.documentElement.setAttribute('data-bs-theme', resolved);
+            localStorage.setItem('jazzmin-theme-mode', mode);
+        });
+
+        // Keep dropdown open when interacting with selects
+        $('#jazzy-theme-chooser').on('click', function (e) {
+            e.stopPropagation();
+        });
+    }
+
     $(document).ready(function () {
         // Set active status on links
         setActiveLinks()
@@ -55,6 +110,9 @@
         // When we use the menu, store its state in a cookie to preserve it
         handleMenu();
 
+        // Theme chooser (navbar dropdown)
+        initThemeChooser();
+
         // Add minimal changelist styling to templates that we have been unable to override (e.g MPTT)
         // Needs to be here and not in change_list.js because this is the only JS we are guaranteed to run
         // (as its included in base.html)
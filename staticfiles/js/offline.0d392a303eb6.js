@@ -0,0 +1,164 @@
+/*
+ * إدخال البيانات مع اتصال ضعيف: تسجيل الـ service worker، وإرسال النماذج المعلمة بـ data-offline
+ * عبر الطابور (offline-queue.js). بدون اتصال يُحفظ النموذج في الهاتف ويُرسل تلقائياً عند عودة الشبكة.
+ */
+(function () {
+    var script = document.currentScript;
+    var FLASH_KEY = 'store-offline-flash';
+    var LEVELS = { error: 'danger', debug: 'secondary' };
+    var status = document.getElementById('offlineStatus');
+    var replaying = false;
+
+    if (!('indexedDB' in window) || !window.OfflineQueue) return;
+
+    if ('serviceWorker' in navigator && script.dataset.sw) {
+        navigator.serviceWorker.register(script.dataset.sw, { scope: '/' });
+        navigator.serviceWorker.addEventListener('message', function (event) {
+            if (event.data && event.data.type === 'replayed') report(event.data.results);
+        });
+    }
+
+    function toast(level, text) {
+        var box = document.getElementById('offlineToasts');
+        var item = document.createElement('div');
+        item.className = 'alert alert-' + (LEVELS[level] || level) + ' shadow-sm mb-2 py-2 small';
+        item.textContent = text;
+        box.appendChild(item);
+        setTimeout(function () { item.remove(); }, 6000);
+    }
+
+    function csrfToken() {
+        var input = document.querySelector('input[name=csrfmiddlewaretoken]');
+        return input ? input.value : null;
+    }
+
+    function refreshStatus() {
+        if (!status) return;
+        OfflineQueue.all().then(function (entries) {
+            status.classList.toggle('d-none', !entries.length && navigator.onLine);
+            status.querySelector('[data-count]').textContent = entries.length;
+            status.classList.toggle('btn-warning', !navigator.onLine);
+            status.classList.toggle('btn-outline-warning', navigator.onLine);
+            var list = status.parentNode.querySelector('[data-entries]');
+            list.innerHTML = '';
+            entries.forEach(function (entry) {
+                var row = document.createElement('li');
+                row.className = 'dropdown-item d-flex justify-content-between align-items-center gap-2 small';
+                row.textContent = entry.label + ' - ' + new Date(entry.created).toLocaleString('ar-EG');
+                var remove = document.createElement('button');
+                remove.type = 'button';
+                remove.className = 'btn btn-sm btn-link text-danger p-0';
+                remove.innerHTML = '<i class="fas fa-trash-alt"></i>';
+                remove.title = 'حذف من الطابور بدون إرسال';
+                remove.addEventListener('click', function (event) {
+                    event.stopPropagation();
+                    if (confirm('حذف هذه العملية من الهاتف بدون إرسالها؟')) OfflineQueue.remove(entry.key).then(refreshStatus);
+                });
+                row.appendChild(remove);
+                list.appendChild(row);
+            });
+        });
+    }
+
+    function report(results) {
+        results.forEach(function (result) {
+            if (result.done) {
+                (result.data.messages || []).forEach(function (m) { toast(m.level, result.label + ': ' + m.text); });
+            } else if (result.reason === 'login') {
+                toast('warning', 'انتهت الجلسة. سجل الدخول لإرسال العمليات المحفوظة.');
+            }
+        });
+        refreshStatus();
+    }
+
+    function replay() {
+        if (replaying || !navigator.onLine) return;
+        replaying = true;
+        // رمز CSRF الحالي بدلاً من المحفوظ مع النموذج (يتغير بعد إعادة تسجيل الدخول)
+        var token = csrfToken();
+        OfflineQueue.all().then(function (entries) {
+            return Promise.all(entries.map(function (entry) {
+                if (!token) return null;
+                entry.fields = entry.fields.map(function (f) { return f[0] === 'csrfmiddlewaretoken' ? [f[0], token] : f; });
+                return OfflineQueue.add(entry);
+            }));
+        }).then(OfflineQueue.replay).then(function (results) {
+            report(results.map(function (result) {
+                return { done: result.done, reason: result.reason, data: result.data, label: result.entry.label };
+            }));
+        }).finally(function () { replaying = false; });
+    }
+
+    function requestSync() {
+        if ('serviceWorker' in navigator && 'SyncManager' in window) {
+            navigator.serviceWorker.ready.then(function (registration) {
+                return registration.sync.register('store-replay');
+            }).catch(function () {});
+        }
+    }
+
+    function queued(form) {
+        var modal = form.closest('.modal');
+        if (modal && window.bootstrap) bootstrap.Modal.getOrCreateInstance(modal).hide();
+        form.reset();
+        toast('warning', 'لا يوجد اتصال: حُفظت العملية في الهاتف وستُرسل تلقائياً عند عودة الإنترنت.');
+        requestSync();
+        refreshStatus();
+    }
+
+    document.querySelectorAll('form[data-offline]').forEach(function (form) {
+        form.addEventListener('submit', function (event) {
+            event.preventDefault();
+            var button = form.querySelector('[type=submit]');
+            var entry = {
+                key: OfflineQueue.newKey(),
+                url: form.action,
+                page: location.href,
+                label: form.dataset.offline,
+                fields: Array.from(new FormData(form).entries()),
+                created: Date.now(),
+            };
+            if (button) button.disabled = true;
+
+            // الحفظ في الطابور قبل الإرسال: لو انقطع الاتصال أثناء الطلب لا يضيع الإدخال
+            OfflineQueue.add(entry).then(function () {
+                if (!navigator.onLine) throw new Error('offline');
+                return OfflineQueue.send(entry);
+            }).then(function (result) {
+                if (!result.done) {
+                    toast('danger', result.reason === 'login' ? 'انتهت الجلسة. سجل الدخول ثم أعد المحاولة، العملية محفوظة.' : 'رفض السيرفر العملية، وهي محفوظة في الطابور.');
+                    if (button) button.disabled = false;
+                    refreshStatus();
+                    return;
+                }
+                return OfflineQueue.remove(entry.key).then(function () {
+                    sessionStorage.setItem(FLASH_KEY, JSON.stringify(result.data.messages || []));
+                    location.reload();
+                });
+            }).catch(function () {
+                if (button) button.disabled = false;
+                queued(form);
+            });
+        });
+    });
+
+    if (status) {
+        status.parentNode.querySelector('[data-replay]').addEventListener('click', replay);
+    }
+    document.querySelectorAll('form[data-logout]').forEach(function (form) {
+        form.addEventListener('submit', function () {
+            if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+                navigator.serviceWorker.controller.postMessage({ type: 'logout' });
+            }
+        });
+    });
+
+    JSON.parse(sessionStorage.getItem(FLASH_KEY) || '[]').forEach(function (m) { toast(m.level, m.text); });
+    sessionStorage.removeItem(FLASH_KEY);
+
+    window.addEventListener('online', replay);
+    window.addEventListener('online', refreshStatus);
+    window.addEventListener('offline', refreshStatus);
+    refreshStatus();
+    replay();
+})();
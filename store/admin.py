@@ -1,10 +1,16 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import (
     Contact, Product, DailyTransaction, FinancialRecord, 
-    PaymentInstallment, BankLoan, BankInstallment, Capital, 
-    HomeExpense, ContactExpense, IncomeRecord
+    PaymentInstallment, BankLoan, BankInstallment, Capital, CapitalAdjustment,
+    HomeExpense, ContactExpense, IncomeRecord, PeriodClose,
+    ContactBalanceSnapshot, ProductStockSnapshot, Job, Alert,
+    ArchiveRun, ArchivedTransaction, ArchivedPayment, ContactCarryForward, StockMovement
 )
+from .bulk import delete_payments, locked_dates, set_installments_paid
+from .stock import adjust_stock
 
 # --- 1. إعدادات أقساط الموردين والتجار (Inline) ---
 class PaymentInstallmentInline(admin.TabularInline):
@@ -77,12 +83,60 @@ class CapitalAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return not Capital.objects.exists()
 
+    def save_model(self, request, obj, form, change):
+        # تعديل الرصيد يدوياً يُسجل كإيداع / سحب بتاريخ اليوم حتى تطابقه المطابقة وأرصدة "حتى تاريخ"
+        previous = Capital.objects.filter(pk=obj.pk).values_list('initial_amount', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        if previous is not None and obj.initial_amount != previous:
+            CapitalAdjustment.objects.create(
+                amount=obj.initial_amount - previous, user=request.user, notes="تعديل يدوي لرصيد الخزنة من لوحة الإدارة",
+            )
+
+@admin.register(CapitalAdjustment)
+class CapitalAdjustmentAdmin(admin.ModelAdmin):
+    """للعرض فقط: الحركات تُسجل من تعديل الخزنة، وحذف إحداها وحده يفصلها عن الرصيد"""
+    list_display = ['date', 'amount', 'user', 'notes', 'created_at']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(BankLoan)
 class BankLoanAdmin(admin.ModelAdmin):
-    list_display = ['bank_name', 'loan_type', 'total_loan_amount', 'loan_period_months', 'is_active']
+    list_display = ['bank_name', 'loan_type', 'total_loan_amount', 'loan_period_months', 'is_active', 'closed_on']
     list_filter = ['is_active', 'bank_name']
     inlines = [BankInstallmentInline]
 
+@admin.register(BankInstallment)
+class BankInstallmentAdmin(admin.ModelAdmin):
+    list_display = ['due_date', 'loan', 'total_installment_amount', 'interest_component', 'principal_component', 'extra_charges', 'is_paid', 'actual_payment_date']
+    list_filter = ['is_paid', 'loan']
+    date_hierarchy = 'due_date'
+    readonly_fields = ['total_installment_amount', 'actual_payment_date']
+    actions = ['mark_paid', 'mark_unpaid']
+
+    def _set_paid(self, request, queryset, paid):
+        try:
+            count, delta = set_installments_paid(list(queryset), paid)
+        except ValidationError as e:
+            self.message_user(request, e.messages[0], messages.ERROR)
+            return
+        self.message_user(request, f"تم تحديث {count} قسط وتعديل الخزنة بمبلغ {delta:+,.0f}.")
+
+    @admin.action(description="تعليم الأقساط المحددة كمدفوعة (اليوم)")
+    def mark_paid(self, request, queryset):
+        self._set_paid(request, queryset, True)
+
+    @admin.action(description="تعليم الأقساط المحددة كغير مدفوعة")
+    def mark_unpaid(self, request, queryset):
+        self._set_paid(request, queryset, False)
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ['name', 'phone', 'notes']
@@ -90,14 +144,27 @@ class ContactAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'quantity_available_display', 'purchase_price_per_kg', 'selling_price_per_kg']
+    list_display = ['name', 'quantity_available_display', 'low_stock_threshold', 'purchase_price_per_kg', 'selling_price_per_kg']
+    list_editable = ['low_stock_threshold']
     search_fields = ['name']
 
     def quantity_available_display(self, obj):
-        color = "red" if obj.quantity_available < 50 else "green"
+        color = "red" if obj.quantity_available < obj.low_stock_threshold else "green"
         return format_html('<span style="color: {}; font-weight: bold;">{} كيلو</span>', color, obj.quantity_available)
     quantity_available_display.short_description = 'الكمية المتاحة'
 
+    def get_readonly_fields(self, request, obj=None):
+        # بعد الإضافة تتغير الكمية بالفواتير أو بتسوية من صفحة حركة المنتج فقط (حتى تُسجل في الدفتر)
+        return ['quantity_available'] if obj else []
+
+    def save_model(self, request, obj, form, change):
+        opening = None if change else obj.quantity_available
+        if opening:
+            obj.quantity_available = 0
+        super().save_model(request, obj, form, change)
+        if opening:
+            adjust_stock(obj, opening, notes="رصيد افتتاحي عند إضافة المنتج", user=request.user)
+
 @admin.register(DailyTransaction)
 class DailyTransactionAdmin(admin.ModelAdmin):
     list_display = ['date', 'transaction_type_display', 'product', 'contact', 'weight', 'total_price_display']
@@ -162,4 +229,147 @@ class PaymentInstallmentAdmin(admin.ModelAdmin):
 
     def get_product(self, obj): 
         return obj.financial_record.transaction.product.name if obj.financial_record else "---"
-    get_product.short_description = 'المنتج المرتبط'
\ No newline at end of file
+    get_product.short_description = 'المنتج المرتبط'
+
+    def get_deleted_objects(self, objs, request):
+        # الدفعات الواقعة في فترة مغلقة تظهر في صفحة التأكيد كمحمية فلا يُسمح بالحذف
+        deleted, counts, perms_needed, protected = super().get_deleted_objects(objs, request)
+        locked = set(locked_dates([payment.date_paid for payment in objs]))
+        protected += [f"دفعة {p.amount} بتاريخ {p.date_paid} (فترة مغلقة، أعد فتحها أولاً)" for p in objs if p.date_paid in locked]
+        return deleted, counts, perms_needed, protected
+
+    def delete_queryset(self, request, queryset):
+        # "حذف المحدد": DELETE واحد وحركة خزنة واحدة بدلاً من إشارات لكل دفعة
+        delete_payments(queryset)
+
+# --- 4. إقفال الفترات (للعرض فقط، الإقفال وإعادة الفتح عبر أمر close_period) ---
+class ContactBalanceSnapshotInline(admin.TabularInline):
+    model = ContactBalanceSnapshot
+    extra = 0
+    can_delete = False
+    readonly_fields = ['contact', 'net_balance']
+
+class ProductStockSnapshotInline(admin.TabularInline):
+    model = ProductStockSnapshot
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'quantity', 'value']
+
+@admin.register(PeriodClose)
+class PeriodCloseAdmin(admin.ModelAdmin):
+    list_display = ['period_start', 'period_end', 'cash_balance', 'loan_principal_remaining', 'status_badge', 'closed_at']
+    readonly_fields = ['period_start', 'period_end', 'cash_balance', 'loan_principal_remaining', 'is_closed', 'is_checkpoint', 'closed_at']
+    list_filter = ['is_closed', 'is_checkpoint']
+    inlines = [ContactBalanceSnapshotInline, ProductStockSnapshotInline]
+
+    def status_badge(self, obj):
+        if obj.is_closed:
+            return format_html('<span style="color: white; background: #6c757d; padding: 2px 8px; border-radius: 4px;">مغلقة</span>')
+        if obj.is_checkpoint:
+            return format_html('<span style="color: white; background: #17a2b8; padding: 2px 8px; border-radius: 4px;">لقطة تلقائية</span>')
+        return format_html('<span style="color: white; background: #28a745; padding: 2px 8px; border-radius: 4px;">مفتوحة</span>')
+    status_badge.short_description = 'الحالة'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# --- 5. المهام الخلفية ---
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status_badge', 'attempts', 'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['name', 'payload', 'status', 'attempts', 'max_attempts', 'run_after', 'result', 'last_error', 'created_at', 'started_at', 'finished_at']
+    actions = ['retry_jobs']
+
+    def status_badge(self, obj):
+        colors = {'pending': '#ffc107', 'running': '#17a2b8', 'done': '#28a745', 'failed': '#dc3545'}
+        return format_html('<span style="color: white; background: {}; padding: 2px 8px; border-radius: 4px;">{}</span>', colors[obj.status], obj.get_status_display())
+    status_badge.short_description = 'الحالة'
+
+    @admin.action(description="إعادة تشغيل المهام المحددة")
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status='running').update(status='pending', attempts=0, run_after=timezone.now(), last_error='')
+        self.message_user(request, f"تمت إعادة {count} مهمة إلى الطابور.")
+
+    def has_add_permission(self, request):
+        return False
+
+# --- 6. التنبيهات ---
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ['title', 'level_badge', 'message', 'due_date', 'is_active', 'notified_at']
+    list_filter = ['is_active', 'kind', 'level']
+    search_fields = ['title', 'message']
+    readonly_fields = ['key', 'kind', 'level', 'title', 'message', 'amount', 'due_date', 'url', 'created_at', 'updated_at', 'notified_at']
+
+    def level_badge(self, obj):
+        colors = {'danger': '#dc3545', 'warning': '#ffc107'}
+        return format_html('<span style="color: white; background: {}; padding: 2px 8px; border-radius: 4px;">{}</span>', colors[obj.level], obj.get_level_display())
+    level_badge.short_description = 'الأهمية'
+
+    def has_add_permission(self, request):
+        return False
+
+# --- 7. الأرشيف (للعرض فقط، النقل عبر أمر archive_ledger) ---
+@admin.register(ArchiveRun)
+class ArchiveRunAdmin(admin.ModelAdmin):
+    list_display = ['cutoff', 'transactions', 'payments', 'created_at']
+    readonly_fields = ['cutoff', 'transactions', 'payments', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class ArchivedPaymentInline(admin.TabularInline):
+    model = ArchivedPayment
+    extra = 0
+    can_delete = False
+    readonly_fields = ['amount', 'date_paid', 'notes']
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date', 'transaction_type', 'contact', 'product', 'weight', 'total_price', 'amount_paid']
+    list_filter = ['transaction_type', 'date']
+    search_fields = ['contact__name', 'product__name', 'notes']
+    list_select_related = ['contact', 'product']
+    readonly_fields = ['id', 'run', 'date', 'transaction_type', 'product', 'contact', 'weight', 'price_per_kg', 'total_price', 'paid_amount_now', 'notes', 'financial_record_id', 'amount_paid']
+    inlines = [ArchivedPaymentInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ContactCarryForward)
+class ContactCarryForwardAdmin(admin.ModelAdmin):
+    list_display = ['contact', 'sales', 'purchases', 'collected', 'paid', 'balance', 'updated_at']
+    search_fields = ['contact__name']
+    list_select_related = ['contact']
+    readonly_fields = ['contact', 'sales', 'purchases', 'collected', 'paid', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# --- 8. دفتر حركة المخزون (للعرض فقط، التسوية من صفحة حركة المنتج) ---
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'kind', 'quantity', 'balance_after', 'transaction_id', 'user', 'notes']
+    list_filter = ['kind', 'product', 'date']
+    search_fields = ['product__name', 'notes', 'transaction_id']
+    list_select_related = ['product', 'user']
+    readonly_fields = ['product', 'date', 'kind', 'quantity', 'balance_after', 'transaction_id', 'notes', 'user', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
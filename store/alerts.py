@@ -0,0 +1,149 @@
+"""
+حساب التنبيهات (أقساط البنك، الفواتير المتأخرة، المخزون المنخفض) مرة واحدة يومياً.
+
+    python manage.py compute_alerts    # من cron كل صباح
+
+النتيجة تُحفظ في جدول Alert: التنبيه الجديد يُضاف، والموجود يُحدث، والذي زال سببه
+يُعطل. لوحة التحكم تقرأ التنبيهات النشطة فقط، والجديد منها يُرسل بالبريد مرة واحدة.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Alert, BankInstallment, FinancialRecord, Product
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ['kind', 'level', 'title', 'message', 'amount', 'due_date', 'url']
+
+
+def bank_alerts(today):
+    """أقساط القروض النشطة المتأخرة أو المستحقة خلال أيام قليلة"""
+    horizon = today + timedelta(days=getattr(settings, 'STORE_ALERT_BANK_DAYS', 3))
+    installments = BankInstallment.objects.filter(
+        is_paid=False, loan__is_active=True, due_date__lte=horizon
+    ).values('pk', 'loan_id', 'loan__bank_name', 'due_date', 'total_installment_amount')
+    for inst in installments:
+        overdue = inst['due_date'] < today
+        yield Alert(
+            key=f"bank:{inst['pk']}",
+            kind='bank_overdue' if overdue else 'bank_due',
+            level='danger' if overdue else 'warning',
+            title="قسط بنكي متأخر!" if overdue else "موعد استحقاق قريب",
+            message=(
+                f"قسط {inst['loan__bank_name']} {'كان مستحقاً' if overdue else 'يستحق'} بتاريخ "
+                f"{inst['due_date']:%Y-%m-%d} بمبلغ {inst['total_installment_amount']:.0f} ج.م."
+            ),
+            amount=inst['total_installment_amount'],
+            due_date=inst['due_date'],
+            url=reverse('bank_loan_statement', args=[inst['loan_id']]),
+        )
+
+
+def invoice_alerts(today):
+    """فواتير لم تُسدد بالكامل بعد مدة محددة، مجمعة لكل تاجر واتجاه (لينا / علينا)"""
+    cutoff = today - timedelta(days=getattr(settings, 'STORE_ALERT_INVOICE_AGE_DAYS', 30))
+    rows = FinancialRecord.objects.annotate(
+        remaining=ExpressionWrapper(F('transaction__total_price') - F('amount_paid'), output_field=DecimalField())
+    ).filter(remaining__gt=0, transaction__date__lte=cutoff).values(
+        'transaction__contact_id', 'transaction__contact__name', 'transaction__transaction_type'
+    ).annotate(count=Count('pk'), total=Sum('remaining'), oldest=Min('transaction__date')).order_by()
+    for row in rows:
+        receivable = row['transaction__transaction_type'] == 'out'
+        yield Alert(
+            key=f"invoice:{row['transaction__contact_id']}:{row['transaction__transaction_type']}",
+            kind='invoice_overdue',
+            level='danger' if receivable else 'warning',
+            title="فواتير متأخرة التحصيل" if receivable else "فواتير متأخرة السداد",
+            message=(
+                f"{row['count']} فاتورة {'لينا عند' if receivable else 'علينا لـ'} {row['transaction__contact__name']} "
+                f"بإجمالي {row['total']:.0f} ج.م، أقدمها بتاريخ {row['oldest']:%Y-%m-%d}."
+            ),
+            amount=row['total'],
+            due_date=row['oldest'],
+            url=reverse('contact_detail', args=[row['transaction__contact_id']]),
+        )
+
+
+def stock_alerts(today):
+    """منتجات أقل من حد التنبيه الخاص بكل منتج"""
+    for product in Product.objects.filter(quantity_available__lt=F('low_stock_threshold')):
+        yield Alert(
+            key=f"stock:{product.pk}",
+            kind='low_stock',
+            level='warning',
+            title="مخزون منخفض",
+            message=f"المتاح من {product.name} {product.quantity_available:.0f} كجم فقط (حد التنبيه {product.low_stock_threshold:.0f}).",
+            amount=product.quantity_available,
+            url=f"/admin/store/product/{product.pk}/change/",
+        )
+
+
+SOURCES = [bank_alerts, invoice_alerts, stock_alerts]
+
+
+def refresh_alerts(today=None):
+    """مزامنة جدول Alert مع الوضع الحالي، وإرجاع (الجديد، المحدث، المعطل)"""
+    today = today or timezone.now().date()
+    current = {alert.key: alert for source in SOURCES for alert in source(today)}
+
+    with transaction.atomic():
+        existing = Alert.objects.in_bulk(list(current), field_name='key')
+        created, updated = [], []
+        for key, alert in current.items():
+            stored = existing.get(key)
+            if stored is None:
+                created.append(alert)
+                continue
+            changed = not stored.is_active or any(getattr(stored, f) != getattr(alert, f) for f in UPDATE_FIELDS)
+            if changed:
+                for field in UPDATE_FIELDS:
+                    setattr(stored, field, getattr(alert, field))
+                if not stored.is_active:
+                    # التنبيه الذي عاد بعد زواله يُرسل بالبريد من جديد
+                    stored.is_active, stored.notified_at = True, None
+                stored.updated_at = timezone.now()
+                updated.append(stored)
+
+        Alert.objects.bulk_create(created)
+        Alert.objects.bulk_update(updated, UPDATE_FIELDS + ['is_active', 'notified_at', 'updated_at'])
+        resolved = Alert.objects.filter(is_active=True).exclude(key__in=list(current)).update(is_active=False)
+
+    return created, updated, resolved
+
+
+def alert_recipients():
+    return getattr(settings, 'STORE_ALERT_EMAILS', None) or list(
+        User.objects.filter(is_superuser=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    )
+
+
+def notify_pending():
+    """إرسال التنبيهات النشطة التي لم تُرسل بعد في رسالة واحدة، وإرجاع عددها (0 عند فشل الإرسال)"""
+    pending = list(Alert.objects.filter(is_active=True, notified_at__isnull=True))
+    recipients = alert_recipients()
+    if not pending or not recipients:
+        return 0
+
+    lines = [f"[{alert.get_level_display()}] {alert.title}: {alert.message}" for alert in pending]
+    try:
+        send_mail(
+            subject=f"تنبيهات المحل ({len(pending)})",
+            message="\n".join(lines),
+            from_email=None,
+            recipient_list=recipients,
+        )
+    except OSError as e:
+        # خادم البريد غير متاح (smtplib.SMTPException من OSError): التنبيهات نفسها محدثة في الجدول،
+        # وتبقى بدون notified_at فتُرسل في التشغيل التالي
+        logger.warning("تعذر إرسال بريد التنبيهات (%s)، وستُعاد المحاولة في التشغيل التالي", e)
+        return 0
+    Alert.objects.filter(pk__in=[alert.pk for alert in pending]).update(notified_at=timezone.now())
+    return len(pending)
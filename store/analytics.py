@@ -0,0 +1,220 @@
+"""
+تحليلات الربحية ودوران المخزون محسوبة بمصفوفات numpy بدلاً من حلقات Python على Decimal.
+
+كل الأعمدة تُجلب باستعلام واحد بـ values_list، والمبالغ تتحول فوراً إلى أعداد صحيحة
+مضروبة في 100 (قروش) فيبقى الحساب دقيقاً بدون تراكم أخطاء float:
+- الوزن والأسعار والمبالغ: بالقروش (× 100).
+- التكلفة والربح: الوزن × السعر = (× 10000)، وتُقسم عند العرض فقط.
+
+التجميع (لكل منتج / تاجر / شهر) يتم بالفرز ثم np.add.reduceat بدون أي حلقة على الصفوف.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connections
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .archive import archive_boundary
+from .models import ArchivedTransaction, Contact, DailyTransaction, Product
+
+SCALE = 100
+# الناتج من ضرب عمودين مضروبين في 100 يكون مضروباً في 10000
+PRODUCT_DIGITS = 4
+# أطراف فئات توزيع هامش الربح (%)، وما خارجها يُضم لأول أو آخر فئة
+MARGIN_BINS = np.arange(-20, 65, 5)
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def to_cents(values):
+    """
+    أعمدة المبالغ (خانتان عشريتان) كأعداد صحيحة بالقروش. التقريب لأقرب عدد صحيح
+    يعيد القيمة بالضبط طالما المبلغ أقل من ~10^13.
+    """
+    return np.rint(np.array(values, dtype=np.float64) * SCALE).astype(np.int64)
+
+
+def _money(value, digits=2):
+    """عدد صحيح مضروب في 10 ** digits -> Decimal"""
+    return Decimal(int(value)).scaleb(-digits)
+
+
+def group_sum(keys, *columns):
+    """(المفاتيح المختلفة، مجموع كل عمود لكل مفتاح، عدد الصفوف لكل مفتاح)"""
+    if not len(keys):
+        return keys, [column[:0] for column in columns], np.zeros(0, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    return keys[starts], [np.add.reduceat(column[order], starts) for column in columns], counts
+
+
+def fetch_columns(queryset):
+    """
+    نتيجة values_list كقاموس {اسم العمود: قيم}. الـ SQL يُنفذ مباشرة على الـ cursor لأن
+    محولات ORM (Decimal / date لكل خلية) تستهلك أغلب الوقت مع مليون صف، بينما numpy
+    يحول العمود كله مرة واحدة.
+    """
+    query = queryset.query
+    names = [*query.extra_select, *query.values_select, *query.annotation_select]
+    sql, params = query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return dict(zip(names, list(zip(*rows)) or [()] * len(names)))
+
+
+def _transaction_columns(model, start):
+    rows = model.objects.filter(date__gte=start).annotate(
+        # التاريخ كنص ISO يحوله numpy مباشرة، وهو أسرع بكثير من كائنات date لكل صف
+        day=Cast('date', CharField()),
+    ).values_list(
+        'day', 'product_id', 'contact_id', 'transaction_type', 'weight', 'total_price', 'product__purchase_price_per_kg'
+    )
+    return fetch_columns(rows)
+
+
+def load_transactions(start):
+    """
+    كل حركات اليومية من start حتى الآن كأعمدة numpy.
+    الحركات بعد نهاية الفترة مطلوبة أيضاً لحساب المخزون رجوعاً من الرصيد الحالي،
+    والفواتير المؤرشفة تُضاف فقط إذا بدأت الفترة في أو قبل آخر تاريخ قطع.
+    """
+    columns = _transaction_columns(DailyTransaction, start)
+    boundary = archive_boundary()
+    if boundary is not None and start <= boundary:
+        archived = _transaction_columns(ArchivedTransaction, start)
+        columns = {name: tuple(values) + tuple(archived[name]) for name, values in columns.items()}
+
+    return {
+        'date': np.array(columns['day'], dtype='datetime64[D]'),
+        'product': np.array(columns['product_id'], dtype=np.int64),
+        'contact': np.array(columns['contact_id'], dtype=np.int64),
+        'is_sale': np.array(columns['transaction_type'], dtype=object) == 'out',
+        'weight': to_cents(columns['weight']),
+        'total': to_cents(columns['total_price']),
+        'cost_price': to_cents(columns['product__purchase_price_per_kg']),
+    }
+
+
+def _profit_table(keys, sales, names=None):
+    """صفوف جدول الربح لكل مفتاح، مرتبة من الأعلى ربحاً"""
+    keys, (weight, revenue, cost, profit), counts = group_sum(
+        keys, sales['weight'], sales['total'], sales['cost'], sales['profit']
+    )
+    rows = []
+    for index in np.argsort(-profit, kind='stable'):
+        key = keys[index].item()
+        rows.append({
+            'key': names.get(key, key) if names is not None else key,
+            'count': int(counts[index]),
+            'weight': _money(weight[index]),
+            'revenue': _money(revenue[index]),
+            'cost': _money(cost[index], PRODUCT_DIGITS),
+            'profit': _money(profit[index], PRODUCT_DIGITS),
+            'margin': float(profit[index] / (revenue[index] * SCALE) * 100) if revenue[index] else None,
+        })
+    return rows
+
+
+def _margin_distribution(sales):
+    valid = sales['total'] > 0
+    margins = sales['profit'][valid] / (sales['total'][valid] * SCALE) * 100
+    if not len(margins):
+        return {'bins': [], 'percentiles': {}}
+    counts, edges = np.histogram(np.clip(margins, MARGIN_BINS[0], MARGIN_BINS[-1]), bins=MARGIN_BINS)
+    peak = counts.max() or 1
+    return {
+        'bins': [
+            {'low': int(low), 'high': int(high), 'count': int(count), 'percent': float(count / peak * 100)}
+            for low, high, count in zip(edges[:-1], edges[1:], counts)
+        ],
+        'percentiles': dict(zip(PERCENTILES, np.percentile(margins, PERCENTILES).round(1).tolist())),
+    }
+
+
+def _turnover(data, start, end, sold_weight):
+    """
+    متوسط المخزون اليومي لكل منتج في الفترة، ومعدل الدوران وأيام التخزين.
+
+    المخزون في نهاية كل يوم = الرصيد الحالي - صافي الحركات التي بعد ذلك اليوم،
+    محسوباً لكل المنتجات وكل الأيام دفعة واحدة بمصفوفة (منتج × يوم) و cumsum.
+    """
+    products = list(Product.objects.order_by('id').values_list('id', 'name', 'quantity_available', 'purchase_price_per_kg'))
+    if not products:
+        return []
+    ids = np.array([p[0] for p in products], dtype=np.int64)
+    current = to_cents([p[2] for p in products])
+    period_days = (end - start).days + 1
+    day = (data['date'] - np.datetime64(start, 'D')).astype(np.int64)
+    # حتى آخر حركة مسجلة (ولو بتاريخ مستقبلي) لأن الرصيد الحالي يشملها
+    days_total = max(period_days, (timezone.now().date() - start).days + 1, int(day.max()) + 1 if len(day) else 0)
+
+    change = np.zeros((len(ids), days_total), dtype=np.int64)
+    signed = np.where(data['is_sale'], -data['weight'], data['weight'])
+    np.add.at(change, (np.searchsorted(ids, data['product']), day), signed)
+
+    cumulative = np.cumsum(change, axis=1)
+    stock = current[:, None] - (cumulative[:, -1:] - cumulative)
+    average = stock[:, :period_days].mean(axis=1) / SCALE
+
+    rows = []
+    for index, (pid, name, _, price) in enumerate(products):
+        sold = float(sold_weight.get(pid, 0)) / SCALE
+        avg_qty = float(average[index])
+        turnover = sold / avg_qty if avg_qty > 0 else None
+        rows.append({
+            'product': name,
+            'sold': sold,
+            'average_stock': avg_qty,
+            'average_value': avg_qty * float(price),
+            'turnover': turnover,
+            'days_of_inventory': period_days / turnover if turnover else None,
+        })
+    return sorted(rows, key=lambda row: row['turnover'] or 0, reverse=True)
+
+
+def profitability_report(start=None, end=None):
+    """تقرير الفترة [start, end]: ربح لكل منتج وتاجر وشهر، توزيع الهامش، ودوران المخزون"""
+    end = end or timezone.now().date()
+    start = start or end - timedelta(days=364)
+    data = load_transactions(start)
+
+    in_period = data['is_sale'] & (data['date'] <= np.datetime64(end, 'D'))
+    sales = {key: values[in_period] for key, values in data.items()}
+    sales['cost'] = sales['weight'] * sales['cost_price']
+    sales['profit'] = sales['total'] * SCALE - sales['cost']
+
+    product_names = dict(Product.objects.values_list('id', 'name'))
+    contact_ids = np.unique(sales['contact']).tolist()
+    contact_names = dict(Contact.objects.filter(pk__in=contact_ids).values_list('id', 'name'))
+    months = sales['date'].astype('datetime64[M]')
+
+    by_product = _profit_table(sales['product'], sales, product_names)
+    sold_ids, (sold_weight,), _ = group_sum(sales['product'], sales['weight'])
+
+    return {
+        'start': start,
+        'end': end,
+        'totals': {
+            'count': int(len(sales['total'])),
+            'revenue': _money(sales['total'].sum()),
+            'cost': _money(sales['cost'].sum(), PRODUCT_DIGITS),
+            'profit': _money(sales['profit'].sum(), PRODUCT_DIGITS),
+        },
+        'by_product': by_product,
+        'by_contact': _profit_table(sales['contact'], sales, contact_names),
+        'by_month': sorted(_profit_table(months, sales), key=lambda row: row['key']),
+        'margins': _margin_distribution(sales),
+        'turnover': _turnover(data, start, end, dict(zip(sold_ids.tolist(), sold_weight.tolist()))),
+    }
+
+
+def inventory_value():
+    """قيمة البضاعة الحالية بسعر الشراء (بدون حلقة على كائنات Product)"""
+    rows = Product.objects.values_list('quantity_available', 'purchase_price_per_kg')
+    quantities, prices = (to_cents(column) for column in (list(zip(*rows)) or [(), ()]))
+    return _money((quantities * prices).sum(), PRODUCT_DIGITS)
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig
 
 class StoreConfig(AppConfig):
+    default = True  # الملف به أكثر من AppConfig لذلك يجب تحديد الافتراضي صراحة
     default_auto_field = 'django.db.models.BigAutoField' # هذا السطر سيخفي كل التحذيرات
-    name = 'store'
\ No newline at end of file
+    name = 'store'
+
+# ثيمات Bootswatch غير المستخدمة (ثيم لوحة الإدارة ثابت على default) تضاعف حجم الملفات الثابتة بلا فائدة
+UNUSED_BOOTSWATCH_THEMES = [
+    'brite', 'cerulean', 'cosmo', 'cyborg', 'darkly', 'flatly', 'journal', 'litera', 'lumen', 'lux',
+    'materia', 'minty', 'morph', 'pulse', 'quartz', 'sandstone', 'simplex', 'sketchy', 'slate',
+    'solar', 'spacelab', 'superhero', 'united', 'vapor', 'yeti', 'zephyr',
+]
+
+class StoreStaticFilesConfig(StaticFilesConfig):
+    ignore_patterns = StaticFilesConfig.ignore_patterns + [
+        f'vendor/bootswatch/{theme}/*' for theme in UNUSED_BOOTSWATCH_THEMES
+    ]
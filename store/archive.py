@@ -0,0 +1,195 @@
+"""
+أرشفة الفواتير المسددة القديمة.
+
+الفاتورة التي سُددت بالكامل وتاريخها وتاريخ كل دفعاتها في أو قبل تاريخ القطع تنتقل
+(مع سجلها المالي ودفعاتها) من اليومية إلى جداول الأرشيف في معاملة واحدة، فتبقى جداول
+العمل وفهارسها صغيرة. النقل لا يغير أي رصيد: الخزنة والمخزون محسوبان بالفعل، وأثر
+الفواتير المؤرشفة على كل تاجر يُحفظ في ContactCarryForward.
+
+الاستعلامات التاريخية (periods / reports / analytics) تقرأ الأرشيف فقط عندما تبدأ
+الفترة المطلوبة في أو قبل آخر تاريخ قطع (archive_boundary)، وإلا لا تلمسه إطلاقاً.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import (
+    ArchivedPayment, ArchivedTransaction, ArchiveRun, ContactCarryForward, DailyTransaction, PaymentInstallment,
+    bulk_operation,
+)
+
+ZERO = Decimal(0)
+BATCH_SIZE = 500
+
+
+def _sum(field, **filters):
+    return Coalesce(Sum(field, filter=Q(**filters) if filters else None), ZERO, output_field=DecimalField())
+
+
+def default_cutoff(today=None):
+    today = today or timezone.now().date()
+    return today - timedelta(days=getattr(settings, 'STORE_ARCHIVE_AFTER_DAYS', 365))
+
+
+def archive_boundary(using='default'):
+    """آخر تاريخ قطع تمت أرشفته (None = الأرشيف فارغ)"""
+    return ArchiveRun.objects.using(using).aggregate(cutoff=Max('cutoff'))['cutoff']
+
+
+def reaches_archive(after, boundary):
+    """هل الفترة (after, ...] تشمل أي حركة مؤرشفة؟"""
+    return boundary is not None and (after is None or after < boundary)
+
+
+def _date_range(field, after=None, upto=None):
+    q = Q()
+    if after:
+        q &= Q(**{f'{field}__gt': after})
+    if upto:
+        q &= Q(**{f'{field}__lte': upto})
+    return q
+
+
+# --- 1. النقل إلى الأرشيف ---
+
+def archivable(cutoff):
+    """الفواتير المسددة بالكامل (المدفوع = مجموع الدفعات >= الإجمالي) التي لا توجد لها دفعة بعد cutoff"""
+    payments_total = PaymentInstallment.objects.filter(financial_record=OuterRef('financialrecord')).values(
+        'financial_record'
+    ).annotate(total=Sum('amount')).values('total')
+    return DailyTransaction.objects.filter(
+        date__lte=cutoff,
+        financialrecord__amount_paid__gte=F('total_price'),
+    ).exclude(
+        financialrecord__installments__date_paid__gt=cutoff,
+    ).annotate(
+        payments_total=Coalesce(Subquery(payments_total), ZERO, output_field=DecimalField()),
+    ).filter(financialrecord__amount_paid=F('payments_total'))
+
+
+def _move_batch(ids, run):
+    rows = list(DailyTransaction.objects.filter(pk__in=ids).values(
+        'id', 'date', 'transaction_type', 'product_id', 'contact_id', 'weight', 'price_per_kg', 'total_price',
+        'paid_amount_now', 'notes', 'financialrecord__id', 'financialrecord__amount_paid',
+    ))
+    ArchivedTransaction.objects.bulk_create([
+        ArchivedTransaction(
+            run=run,
+            financial_record_id=row.pop('financialrecord__id'),
+            amount_paid=row.pop('financialrecord__amount_paid'),
+            **row,
+        )
+        for row in rows
+    ])
+
+    payments = PaymentInstallment.objects.filter(financial_record__transaction_id__in=ids)
+    archived_payments = ArchivedPayment.objects.bulk_create([
+        ArchivedPayment(id=pk, transaction_id=transaction_id, amount=amount, date_paid=date_paid, notes=notes)
+        for pk, transaction_id, amount, date_paid, notes in payments.values_list(
+            'pk', 'financial_record__transaction_id', 'amount', 'date_paid', 'notes'
+        )
+    ])
+
+    # الحذف يمر على الإشارات (الخزنة / إقفال الفترات / إجمالي المدفوع) فتُعطل هنا: الأرصدة لا تتغير بالنقل
+    with bulk_operation():
+        payments.delete()
+        DailyTransaction.objects.filter(pk__in=ids).delete()
+    return len(rows), len(archived_payments)
+
+
+def update_carry_forward(contact_ids):
+    """إعادة حساب الرصيد المرحل للتجار المحددين من جداول الأرشيف (استعلام تجميع واحد)"""
+    rows = ArchivedTransaction.objects.filter(contact_id__in=contact_ids).values('contact_id').annotate(
+        sales=_sum('total_price', transaction_type='out'),
+        purchases=_sum('total_price', transaction_type='in'),
+        collected=_sum('amount_paid', transaction_type='out'),
+        paid=_sum('amount_paid', transaction_type='in'),
+    ).order_by()
+    ContactCarryForward.objects.bulk_create(
+        [ContactCarryForward(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=['contact'],
+        update_fields=['sales', 'purchases', 'collected', 'paid', 'updated_at'],
+    )
+
+
+def archive_ledger(cutoff, dry_run=False):
+    """
+    نقل كل الفواتير القابلة للأرشفة حتى cutoff (شامل) وإرجاع ArchiveRun. لا يُحفظ التشغيل
+    إذا لم توجد فواتير، ومع dry_run يُرجع عددها فقط بدون نقل.
+    """
+    if cutoff >= timezone.now().date():
+        raise ValueError("تاريخ القطع يجب أن يكون في الماضي.")
+
+    candidates = archivable(cutoff)
+    if dry_run:
+        return ArchiveRun(cutoff=cutoff, transactions=candidates.count())
+
+    with transaction.atomic():
+        ids = list(candidates.values_list('pk', flat=True))
+        if not ids:
+            return ArchiveRun(cutoff=cutoff)
+        contact_ids = set(DailyTransaction.objects.filter(pk__in=ids).values_list('contact_id', flat=True).distinct())
+        run = ArchiveRun.objects.create(cutoff=cutoff)
+        for start in range(0, len(ids), BATCH_SIZE):
+            moved, payments = _move_batch(ids[start:start + BATCH_SIZE], run)
+            run.transactions += moved
+            run.payments += payments
+        run.save(update_fields=['transactions', 'payments'])
+        update_carry_forward(contact_ids)
+    bump_data_version()
+    return run
+
+
+# --- 2. القراءة من الأرشيف (عندما تصل الفترة إليه فقط) ---
+
+def archived_cash_flow(after=None, upto=None, using='default'):
+    """(المحصل من العملاء، المسدد للموردين) من الدفعات المؤرشفة في الفترة (after, upto]"""
+    if not reaches_archive(after, archive_boundary(using)):
+        return ZERO, ZERO
+    totals = ArchivedPayment.objects.using(using).filter(_date_range('date_paid', after, upto)).aggregate(
+        collected=_sum('amount', transaction__transaction_type='out'),
+        paid=_sum('amount', transaction__transaction_type='in'),
+    )
+    return totals['collected'], totals['paid']
+
+
+def archived_contact_deltas(after=None, upto=None):
+    """
+    تغير رصيد كل تاجر (لنا + / علينا -) من الأرشيف في الفترة (after, upto]. إذا كانت
+    الفترة تغطي الأرشيف كله تُقرأ الأرصدة المرحلة بدلاً من صفوف الأرشيف.
+    """
+    boundary = archive_boundary()
+    if not reaches_archive(after, boundary):
+        return {}
+    if after is None and (upto is None or upto >= boundary):
+        return {row.contact_id: row.balance for row in ContactCarryForward.objects.all() if row.balance}
+
+    deltas = {}
+    invoices = ArchivedTransaction.objects.filter(_date_range('date', after, upto)).values('contact_id').annotate(
+        sold=_sum('total_price', transaction_type='out'),
+        bought=_sum('total_price', transaction_type='in'),
+    ).order_by()
+    for row in invoices:
+        deltas[row['contact_id']] = deltas.get(row['contact_id'], ZERO) + row['sold'] - row['bought']
+
+    payments = ArchivedPayment.objects.filter(_date_range('date_paid', after, upto)).values(
+        'transaction__contact_id'
+    ).annotate(
+        collected=_sum('amount', transaction__transaction_type='out'),
+        paid=_sum('amount', transaction__transaction_type='in'),
+    ).order_by()
+    for row in payments:
+        cid = row['transaction__contact_id']
+        deltas[cid] = deltas.get(cid, ZERO) + row['paid'] - row['collected']
+    return deltas
+
+
+def first_archived_date():
+    return ArchivedTransaction.objects.order_by('date').values_list('date', flat=True).first()
@@ -0,0 +1,199 @@
+"""
+نسخ احتياطي لقاعدة البيانات أثناء التشغيل بـ backup API الخاص بـ SQLite.
+
+نسخ ملف db.sqlite3 مباشرة قد يلتقط ملفاً نصف مكتوب، ونسخه في خطوة واحدة يحجز قفل
+القراءة طوال النسخ فيتوقف كل من يحاول الكتابة. هنا يتم النسخ على دفعات من الصفحات مع
+استراحة بينها:
+
+- في وضع WAL (الافتراضي في الإعدادات) تبقى معاملة قراءة مفتوحة على المصدر طوال النسخ،
+  فتُنسخ لقطة متسقة من لحظة البداية والكتابة مستمرة بدون انتظار.
+- في وضع journal العادي لا ينتظر الكاتب أكثر من دفعة واحدة، لكن أي كتابة تعيد النسخ
+  من البداية، فبعد عدد محدد من الإعادات تُنسخ القاعدة في دفعة واحدة حتى لا يتكرر النسخ
+  بلا نهاية.
+
+النسخة تُضغط بـ gzip ويُحفظ بجوارها ملف sha256 (بصيغة sha256sum)، والتحقق يفك النسخة
+في مجلد مؤقت ويشغل integrity_check ثم فحوص المطابقة (reconcile) عليها.
+"""
+import gzip
+import hashlib
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+PREFIX = 'db-'
+SUFFIX = '.sqlite3.gz'
+CHUNK_SIZE = 1024 * 1024
+VERIFY_ALIAS = 'backup_verify'
+
+
+def database_path(using='default'):
+    return Path(connections[using].settings_dict['NAME'])
+
+
+def backup_dir():
+    return Path(getattr(settings, 'STORE_BACKUP_DIR', settings.BASE_DIR / 'backups'))
+
+
+def list_backups(directory=None):
+    """النسخ الموجودة من الأقدم للأحدث (الاسم يبدأ بالتاريخ والوقت)"""
+    return sorted((directory or backup_dir()).glob(f'{PREFIX}*{SUFFIX}'))
+
+
+# --- 1. النسخ ---
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def online_backup(source, target, pages=256, pause=0.05, max_restarts=3):
+    """
+    نسخ source إلى ملف target بدفعات من pages صفحة واستراحة pause ثانية بينها.
+    إذا أُعيد النسخ max_restarts مرة بسبب كتابة في القاعدة، تُنسخ في دفعة واحدة.
+    يرجع {'steps', 'restarts', 'pages', 'single_step', 'wal', 'seconds'}.
+    """
+    stats = {'steps': 0, 'restarts': 0, 'pages': 0, 'single_step': pages < 0}
+    last_remaining = [None]
+
+    def progress(status, remaining, total):
+        stats['steps'] += 1
+        stats['pages'] = total
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            stats['restarts'] += 1
+            if stats['restarts'] >= max_restarts:
+                # الاستثناء داخل progress يوقف النسخ الحالي (sqlite3_backup_finish)
+                raise _TooManyRestarts
+        last_remaining[0] = remaining
+        # في وضع journal تحرر كل دفعة قفل القراءة قبل استدعاء progress، فالكاتب يعمل أثناء الاستراحة
+        if remaining:
+            time.sleep(pause)
+
+    start = time.perf_counter()
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        stats['wal'] = src.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if stats['wal']:
+            # معاملة القراءة تثبت اللقطة: الكتابة لا تُوقف ولا تعيد النسخ
+            src.execute('BEGIN')
+            src.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        try:
+            src.backup(dst, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            stats['single_step'] = True
+            src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checksum_path(path):
+    return path.with_name(path.name + '.sha256')
+
+
+def create_backup(directory=None, using='default', pages=256, pause=0.05, now=None):
+    """
+    نسخة مضغوطة جديدة في directory. الملف يظهر باسمه النهائي فقط بعد اكتمال الضغط وحساب
+    البصمة، فلا توجد أبداً نسخة ناقصة باسم صحيح. يرجع (المسار، إحصائيات النسخ).
+    """
+    directory = directory or backup_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = now or timezone.localtime()
+    final = directory / f"{PREFIX}{now:%Y%m%d-%H%M%S}{SUFFIX}"
+
+    with tempfile.TemporaryDirectory(dir=directory, prefix='.backup-') as workdir:
+        raw = Path(workdir) / 'db.sqlite3'
+        stats = online_backup(database_path(using), raw, pages=pages, pause=pause)
+        # الضغط والبصمة على النسخة المؤقتة، بدون أي قفل على القاعدة الأصلية
+        partial = Path(workdir) / final.name
+        with open(raw, 'rb') as source, gzip.open(partial, 'wb', compresslevel=6) as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+        stats['raw_size'] = raw.stat().st_size
+        stats['size'] = partial.stat().st_size
+        stats['sha256'] = file_sha256(partial)
+        partial.replace(final)
+    checksum_path(final).write_text(f"{stats['sha256']}  {final.name}\n")
+    return final, stats
+
+
+# --- 2. التدوير ---
+
+def backups_to_delete(paths, keep, keep_monthly):
+    """
+    الاحتفاظ بأحدث keep نسخة، وبأقدم نسخة في كل شهر لآخر keep_monthly شهراً،
+    وإرجاع الباقي للحذف (paths مرتبة من الأقدم للأحدث).
+    """
+    kept = set(paths[-keep:]) if keep else set()
+    first_of_month = {}
+    for path in paths:
+        month = path.name[len(PREFIX):len(PREFIX) + 6]
+        first_of_month.setdefault(month, path)
+    for month in sorted(first_of_month)[-keep_monthly:] if keep_monthly else []:
+        kept.add(first_of_month[month])
+    return [path for path in paths if path not in kept]
+
+
+def rotate(directory=None, keep=None, keep_monthly=None):
+    directory = directory or backup_dir()
+    keep = getattr(settings, 'STORE_BACKUP_KEEP', 7) if keep is None else keep
+    keep_monthly = getattr(settings, 'STORE_BACKUP_KEEP_MONTHLY', 12) if keep_monthly is None else keep_monthly
+    removed = backups_to_delete(list_backups(directory), keep, keep_monthly)
+    for path in removed:
+        path.unlink()
+        checksum_path(path).unlink(missing_ok=True)
+    return removed
+
+
+# --- 3. التحقق (استعادة تجريبية) ---
+
+def verify_backup(path):
+    """
+    التحقق من البصمة، ثم فك النسخة في مجلد مؤقت وتشغيل integrity_check وفحوص المطابقة عليها.
+    يرجع {'integrity': 'ok' أو الخطأ، 'reconcile': {اسم الفحص: الفروقات}}، ويرفع ValueError
+    إذا لم تطابق البصمة (الملف تالف أو معدل).
+    """
+    from .reconcile import reconcile
+
+    path = Path(path)
+    checksum = checksum_path(path)
+    if checksum.exists():
+        expected = checksum.read_text().split()[0]
+        if file_sha256(path) != expected:
+            raise ValueError(f"بصمة {path.name} لا تطابق {checksum.name}: الملف تالف أو معدل.")
+
+    with tempfile.TemporaryDirectory(prefix='backup-verify-') as workdir:
+        restored = Path(workdir) / 'db.sqlite3'
+        with gzip.open(path, 'rb') as source, open(restored, 'wb') as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+        with closing(sqlite3.connect(restored)) as db:
+            rows = [row[0] for row in db.execute('PRAGMA integrity_check')]
+        result = {'integrity': ', '.join(rows), 'reconcile': None}
+        if rows != ['ok']:
+            return result
+
+        # اتصال مؤقت بنفس إعدادات القاعدة الأصلية يشير إلى النسخة المستعادة
+        connections.settings[VERIFY_ALIAS] = {**connections.settings['default'], 'NAME': str(restored)}
+        try:
+            result['reconcile'] = reconcile(using=VERIFY_ALIAS)
+        finally:
+            connections[VERIFY_ALIAS].close()
+            del connections[VERIFY_ALIAS]
+            del connections.settings[VERIFY_ALIAS]
+    return result
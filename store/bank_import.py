@@ -0,0 +1,342 @@
+"""
+استيراد كشف حساب البنك (CSV) ومطابقة كل سطر بالفواتير المفتوحة.
+
+الإيداع (دائن) يُطابق بفواتير البيع غير المحصلة، والسحب (مدين) بفواتير الشراء غير المسددة.
+كل الفواتير المفتوحة والتجار والأسطر المستوردة من قبل تُحمل مرة واحدة في فهرس بالذاكرة
+(حسب المبلغ بالقروش، وحسب التاجر، وأرقام التليفونات والأسماء)، فالمطابقة لا تنفذ أي
+استعلام لكل سطر مهما كان طول الكشف.
+
+ترتيب المرشحين: ذكر التاجر في البيان (تليفون أو اسم) ثم تطابق المبلغ مع المتبقي ثم التاريخ
+(الأقرب للمبلغ المطابق والأقدم للدفعة الجزئية). الأسطر المؤكدة تُكتب كدفعات بعملية جماعية
+واحدة (store/bulk.py: create_payments)، وكل دفعة تحمل في ملاحظاتها بصمة السطر [bank:...]
+حتى لا يُستورد نفس السطر مرتين.
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import Counter, defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import CharField, DecimalField, F
+from django.db.models.functions import Cast, Coalesce
+
+from .analytics import fetch_columns
+from .bulk import create_payments
+from .models import Contact, FinancialRecord, PaymentInstallment, Product
+
+MAX_CANDIDATES = 3
+# التحويل قد يسبق تسجيل الفاتورة بأيام قليلة
+DAYS_BEFORE_INVOICE = 7
+KEY_PATTERN = re.compile(r'\[bank:([0-9a-f]{12}(?:#\d+)?)\]')
+
+HEADERS = {
+    'date': ['date', 'value date', 'posting date', 'transaction date', 'التاريخ', 'تاريخ', 'تاريخ الحركة', 'تاريخ القيد', 'تاريخ الحق'],
+    'amount': ['amount', 'المبلغ', 'القيمة'],
+    'credit': ['credit', 'deposit', 'دائن', 'إيداع', 'ايداع', 'وارد'],
+    'debit': ['debit', 'withdrawal', 'مدين', 'سحب', 'صادر'],
+    'description': ['description', 'details', 'narrative', 'memo', 'البيان', 'الوصف', 'التفاصيل'],
+    'reference': ['reference', 'ref', 'المرجع', 'رقم المرجع', 'رقم العملية'],
+}
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d.%m.%Y', '%d/%m/%y']
+ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬', '01234567890123456789.,')
+
+StatementLine = namedtuple('StatementLine', ['number', 'date', 'amount', 'description', 'reference', 'key'])
+
+
+# --- 1. قراءة الكشف ---
+
+def normalize(text):
+    """توحيد الكتابة العربية للمقارنة: الهمزات والتاء المربوطة والياء والتشكيل والمسافات"""
+    text = re.sub(r'[ً-ْـ]', '', (text or '').translate(ARABIC_DIGITS).lower())
+    text = text.translate(str.maketrans('أإآىة', 'ااييه'))
+    return ' '.join(text.split())
+
+
+def parse_amount(value):
+    """'1,250.50' و'(300)' و'300-' و'١٢٥٠' -> Decimal، والخلية الفارغة -> 0"""
+    text = (value or '').translate(ARABIC_DIGITS).strip()
+    negative = text.startswith('(') and text.endswith(')') or text.endswith('-') or text.startswith('-')
+    text = re.sub(r'[^\d.]', '', text)
+    if not text:
+        return Decimal(0)
+    amount = Decimal(text)
+    return -amount if negative else amount
+
+
+def parse_date(value):
+    text = (value or '').translate(ARABIC_DIGITS).strip().split(' ')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"تاريخ غير مفهوم: {value}")
+
+
+def _decode(data):
+    # تصدير البنوك المصرية إما UTF-8 (مع BOM أحياناً) أو Windows-1256
+    for encoding in ('utf-8-sig', 'cp1256'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("ترميز الملف غير مدعوم (UTF-8 أو Windows-1256 فقط).")
+
+
+def _header_columns(header):
+    """رقم العمود لكل حقل من عناوين الكشف (بالعربي أو الإنجليزي)"""
+    names = [normalize(name) for name in header]
+    found = {}
+    for field, aliases in HEADERS.items():
+        aliases = [normalize(alias) for alias in aliases]
+        for index, name in enumerate(names):
+            if name in aliases and index not in found.values():
+                found[field] = index
+                break
+    if 'date' not in found or not ({'amount', 'credit', 'debit'} & set(found)):
+        raise ValueError("لم يتم العثور على عمودي التاريخ والمبلغ (أو دائن / مدين) في أول سطر من الكشف.")
+    return found
+
+
+def line_key(line_date, amount, description, reference):
+    raw = f"{line_date.isoformat()}|{amount}|{normalize(description)}|{reference.strip()}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def parse_statement(data):
+    """
+    bytes ملف CSV -> (الأسطر، الأخطاء). المبلغ موجب للإيداع وسالب للسحب.
+    الأسطر التي لا يمكن قراءتها تُرجع كأخطاء (رقم السطر، السبب) بدلاً من إيقاف الاستيراد كله.
+    """
+    text = _decode(data)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(io.StringIO(text), dialect)
+    header = next(rows, None)
+    if not header:
+        raise ValueError("الملف فارغ.")
+    columns = _header_columns(header)
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    lines, errors, seen = [], [], Counter()
+    for number, row in enumerate(rows, start=2):
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            line_date = parse_date(cell(row, 'date'))
+            if 'amount' in columns:
+                amount = parse_amount(cell(row, 'amount'))
+            else:
+                amount = parse_amount(cell(row, 'credit')) - abs(parse_amount(cell(row, 'debit')))
+        except (ValueError, InvalidOperation) as e:
+            errors.append((number, str(e) if isinstance(e, ValueError) else "مبلغ غير مفهوم"))
+            continue
+        if not amount:
+            continue
+        description, reference = cell(row, 'description'), cell(row, 'reference')
+        key = line_key(line_date, amount, description, reference)
+        # سطران متطابقان تماماً في نفس الكشف (تحويلان بنفس المبلغ في نفس اليوم) لهما بصمتان مختلفتان
+        seen[key] += 1
+        if seen[key] > 1:
+            key = f"{key}#{seen[key]}"
+        lines.append(StatementLine(number, line_date, amount, description, reference, key))
+    return lines, errors
+
+
+# --- 2. فهرس الفواتير المفتوحة ---
+
+def imported_keys(start=None, end=None):
+    """
+    بصمات الأسطر المستوردة من قبل (من ملاحظات الدفعات). الدفعة المستوردة تحمل تاريخ سطرها،
+    فيكفي البحث في مدى تواريخ الكشف بدلاً من ملاحظات كل الدفعات.
+    """
+    payments = PaymentInstallment.objects.filter(notes__contains='[bank:')
+    if start:
+        payments = payments.filter(date_paid__gte=start)
+    if end:
+        payments = payments.filter(date_paid__lte=end)
+    keys = set()
+    for notes in payments.values_list('notes', flat=True).order_by():
+        keys.update(KEY_PATTERN.findall(notes))
+    return keys
+
+
+def _cents(amount):
+    return int((amount * 100).to_integral_value())
+
+
+class OpenInvoiceIndex:
+    """
+    كل ما تحتاجه المطابقة، بأربعة استعلامات عند الإنشاء ثم بدون أي استعلام.
+    start / end يحددان تواريخ الفواتير المحملة (مدى الكشف مع نافذة المطابقة) بدلاً من كل الفواتير المفتوحة.
+    """
+
+    def __init__(self, start=None, end=None):
+        self.records = {}
+        self.by_amount = defaultdict(list)
+        self.by_contact = defaultdict(list)
+        rows = FinancialRecord.objects.annotate(
+            remaining=F('transaction__total_price') - Coalesce(F('amount_paid'), 0, output_field=DecimalField()),
+            day=Cast('transaction__date', CharField()),
+        ).filter(remaining__gt=0)
+        if start:
+            rows = rows.filter(transaction__date__gte=start)
+        if end:
+            rows = rows.filter(transaction__date__lte=end)
+        # بدون محولات الـ ORM لكل خلية (مثل analytics): مئات الآلاف من الفواتير المفتوحة في ثوانٍ قليلة
+        fields = [
+            'id', 'transaction_id', 'day', 'transaction__transaction_type', 'transaction__contact_id',
+            'transaction__product_id', 'remaining',
+        ]
+        data = fetch_columns(rows.values_list(*fields).order_by())
+        for pk, tid, day, t_type, cid, pid, remaining in zip(*(data[field] for field in fields)):
+            cents = round(float(remaining) * 100)
+            record = {
+                'id': pk, 'transaction_id': tid, 'date': date.fromisoformat(day), 'type': t_type,
+                'contact_id': cid, 'product_id': pid, 'remaining': Decimal(cents) / 100,
+                # ما لم يُحجز بعد لسطر سابق في نفس الاستيراد
+                'available': cents,
+            }
+            self.records[pk] = record
+            self.by_amount[(t_type, cents)].append(record)
+            self.by_contact[(t_type, cid)].append(record)
+        self.product_names = dict(Product.objects.values_list('pk', 'name'))
+        self.contact_names = {}
+
+        self.phones = defaultdict(set)
+        self.names = []
+        for cid, name, phone in Contact.objects.values_list('pk', 'name', 'phone'):
+            self.contact_names[cid] = name
+            digits = re.sub(r'\D', '', (phone or '').translate(ARABIC_DIGITS))
+            if len(digits) >= 8:
+                self.phones[digits[-9:]].add(cid)
+            name = normalize(name)
+            if len(name) >= 3:
+                self.names.append((name, cid))
+        # الأطول أولاً: "محمد علي حسن" قبل "محمد علي"، والاسم كلمات كاملة ("تاجر 2" لا يطابق "تاجر 27")
+        self.names.sort(key=lambda item: -len(item[0]))
+        self.names = [(re.compile(rf'(?<!\w){re.escape(name)}(?!\w)'), cid) for name, cid in self.names]
+
+        self.imported = imported_keys(start, end)
+
+    def contacts_in(self, description):
+        """التجار المذكورون في بيان التحويل بالتليفون أو بالاسم"""
+        text = normalize(description)
+        found = set()
+        for digits in re.findall(r'\d{8,}', text.replace(' ', '')):
+            found |= self.phones.get(digits[-9:], set())
+        for pattern, cid in self.names:
+            if pattern.search(text):
+                found.add(cid)
+                text = pattern.sub(' ', text)
+        return found
+
+    def candidates(self, line, window_days):
+        """أفضل الفواتير المرشحة للسطر مرتبة بالدرجة: [(الدرجة، الفاتورة، التاجر مذكور؟)]"""
+        t_type = 'out' if line.amount > 0 else 'in'
+        cents = _cents(abs(line.amount))
+        earliest = line.date - timedelta(days=window_days)
+        latest = line.date + timedelta(days=DAYS_BEFORE_INVOICE)
+        contacts = self.contacts_in(line.description)
+
+        pool = {r['id']: r for r in self.by_amount.get((t_type, cents), [])}
+        for cid in contacts:
+            pool.update((r['id'], r) for r in self.by_contact.get((t_type, cid), []))
+
+        scored = []
+        for record in pool.values():
+            if not earliest <= record['date'] <= latest or record['available'] < cents:
+                continue
+            named = record['contact_id'] in contacts
+            exact = record['available'] == cents
+            # بدون ذكر التاجر لا يُقبل إلا مبلغ مطابق تماماً للمتبقي
+            if not (named or exact):
+                continue
+            days = abs((line.date - record['date']).days) / window_days
+            score = (50 if named else 0) + (40 if exact else 0)
+            # المبلغ المطابق غالباً لأقرب فاتورة، والدفعة الجزئية تسدد الأقدم أولاً
+            score += 10 * (1 - days if exact else days)
+            scored.append((round(score, 1), record, named))
+        scored.sort(key=lambda item: (-item[0], item[1]['date'], item[1]['id']))
+        for _, record, _ in scored[:MAX_CANDIDATES]:
+            record['contact'] = self.contact_names.get(record['contact_id'])
+            record['product'] = self.product_names.get(record['product_id'])
+        return scored[:MAX_CANDIDATES]
+
+    def reserve(self, record, amount):
+        record['available'] -= _cents(abs(amount))
+
+
+# --- 3. المطابقة ---
+
+def match_statement(lines, window_days=None, index=None):
+    """
+    لكل سطر: {'line', 'candidates', 'selected' (رقم السجل المالي المقترح أو None), 'confirm' (مؤكد؟),
+    'duplicate' (مستورد من قبل؟)}. الاقتراح يحجز المبلغ من الفاتورة حتى لا يقترحها سطر آخر لنفس المبلغ.
+    """
+    window_days = window_days or getattr(settings, 'STORE_BANK_IMPORT_WINDOW_DAYS', 90)
+    if index is None and lines:
+        index = OpenInvoiceIndex(
+            start=min(line.date for line in lines) - timedelta(days=window_days),
+            end=max(line.date for line in lines) + timedelta(days=DAYS_BEFORE_INVOICE),
+        )
+    results = []
+    for line in sorted(lines, key=lambda line: (line.date, line.number)):
+        result = {'line': line, 'candidates': [], 'selected': None, 'confirm': False, 'duplicate': False}
+        results.append(result)
+        if line.key in index.imported:
+            result['duplicate'] = True
+            continue
+        result['candidates'] = index.candidates(line, window_days)
+        if result['candidates']:
+            score, record, named = result['candidates'][0]
+            result['selected'] = record['id']
+            # التأكيد التلقائي فقط للتاجر المذكور بالاسم أو التليفون، وغير ذلك يختاره المستخدم
+            result['confirm'] = named
+            index.reserve(record, line.amount)
+    return sorted(results, key=lambda result: result['line'].number)
+
+
+def payment_notes(line, transaction_type):
+    direction = "تحصيل" if transaction_type == 'out' else "سداد"
+    detail = ' '.join(part for part in (line.reference, line.description) if part)[:120]
+    return f"{direction} بتحويل بنكي - {detail} [bank:{line.key}]" if detail else f"{direction} بتحويل بنكي [bank:{line.key}]"
+
+
+def import_lines(confirmed):
+    """
+    confirmed = [(رقم السجل المالي، StatementLine)] كما أكدها المستخدم في المعاينة.
+    يتحقق من نوع الفاتورة مقابل اتجاه المبلغ ومن عدم استيراد السطر من قبل، ثم يكتب كل
+    الدفعات بعملية جماعية واحدة. يُرجع (عدد الدفعات، صافي حركة الخزنة).
+    """
+    if not confirmed:
+        return 0, Decimal(0)
+    keys = [line.key for _, line in confirmed]
+    if len(set(keys)) != len(keys):
+        raise ValidationError("نفس السطر مكرر في التأكيد.")
+    dates = [line.date for _, line in confirmed]
+    already = imported_keys(min(dates), max(dates)) & set(keys)
+    if already:
+        raise ValidationError(f"{len(already)} سطر مستورد من قبل. أعد رفع الكشف لتحديث المعاينة.")
+
+    types = dict(FinancialRecord.objects.filter(pk__in={rid for rid, _ in confirmed}).values_list(
+        'pk', 'transaction__transaction_type'
+    ))
+    payments = []
+    for record_id, line in confirmed:
+        if record_id not in types:
+            raise ValidationError(f"السطر {line.number}: الفاتورة غير موجودة.")
+        expected = 'out' if line.amount > 0 else 'in'
+        if types[record_id] != expected:
+            raise ValidationError(f"السطر {line.number}: الإيداع يُطابق بفاتورة بيع والسحب بفاتورة شراء.")
+        payments.append((record_id, abs(line.amount), line.date, payment_notes(line, expected)))
+    return create_payments(payments)
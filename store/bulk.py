@@ -0,0 +1,155 @@
+"""
+عمليات جماعية على أقساط البنك ودفعات التجار بحركة خزنة واحدة.
+
+تعديل الأقساط واحداً واحداً يعني قراءة الخزنة وحفظها مع كل قسط. هنا تتغير كل الصفوف
+باستعلام واحد (bulk_update أو DELETE) وتتعدل الخزنة مرة واحدة بالصافي، والكل داخل
+معاملة واحدة: إما أن ينجح كاملاً أو لا يتغير شيء.
+
+ما كانت تفعله الإشارات لكل صف (إقفال الفترات، اللقطات، الكاش، التنبيهات، إجمالي المدفوع)
+يُنفذ هنا مرة واحدة للمجموعة كلها.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .cache import bump_data_version
+from .jobs import recalculate_amount_paid
+from .models import (
+    Alert, BankInstallment, Capital, FinancialRecord, PaymentInstallment, PeriodClose, bulk_operation,
+    invalidate_checkpoints,
+)
+
+ZERO = Decimal(0)
+
+
+def locked_dates(dates):
+    """التواريخ الواقعة داخل فترات مغلقة، باستعلام واحد مهما كان عددها"""
+    dates = sorted({d for d in dates if d})
+    if not dates:
+        return []
+    closed = PeriodClose.objects.filter(
+        is_closed=True, period_start__lte=dates[-1], period_end__gte=dates[0]
+    ).values_list('period_start', 'period_end')
+    return [d for d in dates if any(start <= d <= end for start, end in closed)]
+
+
+def ensure_dates_open(dates):
+    """نفس تحقق ensure_period_open لمجموعة تواريخ"""
+    locked = locked_dates(dates)
+    if locked:
+        raise ValidationError(f"لا يمكن تعديل حركة بتاريخ {locked[0]} لأن الفترة مغلقة. أعد فتح الفترة أولاً.")
+
+
+def adjust_capital(delta):
+    """حركة خزنة واحدة (يجب أن تُستدعى داخل معاملة)"""
+    if not delta:
+        return
+    capital = Capital.objects.select_for_update().first()
+    if capital:
+        capital.initial_amount += delta
+        capital.save()
+
+
+def set_installments_paid(installments, paid, on_date=None):
+    """
+    تعليم أقساط البنك كمدفوعة (بتاريخ on_date، الافتراضي اليوم) أو غير مدفوعة.
+    الأقساط التي حالتها مطابقة بالفعل لا تتغير. يُرجع (عدد الأقساط المعدلة، صافي حركة الخزنة).
+    """
+    on_date = on_date or timezone.now().date()
+    changed = [inst for inst in installments if inst.is_paid != paid]
+    if not changed:
+        return 0, ZERO
+
+    # تاريخ الدفع القديم (عند الإلغاء) والجديد (عند الدفع) كلاهما يجب أن يقع في فترة مفتوحة
+    dates = [inst.actual_payment_date for inst in changed] + ([on_date] if paid else [])
+    total = sum((inst.total_installment_amount for inst in changed), ZERO)
+    delta = -total if paid else total
+
+    with transaction.atomic():
+        ensure_dates_open(dates)
+        for inst in changed:
+            inst.is_paid = paid
+            inst.actual_payment_date = on_date if paid else None
+        BankInstallment.objects.bulk_update(changed, ['is_paid', 'actual_payment_date'])
+        metrics.inc('store_model_writes_total', len(changed), model='bankinstallment', action='update')
+        adjust_capital(delta)
+        invalidate_checkpoints(dates)
+        if paid:
+            # نفس resolve_bank_alert_on_payment: القسط المدفوع يختفي من لوحة التحكم فوراً
+            Alert.objects.filter(key__in=[f"bank:{inst.pk}" for inst in changed], is_active=True).update(is_active=False)
+    bump_data_version()
+    return len(changed), delta
+
+
+def delete_payments(queryset):
+    """
+    حذف دفعات التجار المحددة وعكس أثرها على الخزنة بحركة واحدة، ثم إعادة حساب
+    إجمالي المدفوع للسجلات المالية المتأثرة بـ UPDATE واحد. يُرجع (عدد الدفعات، صافي حركة الخزنة).
+    """
+    rows = list(queryset.values_list('pk', 'amount', 'date_paid', 'financial_record_id',
+                                     'financial_record__transaction__transaction_type'))
+    if not rows:
+        return 0, ZERO
+
+    # حذف تحصيل من عميل (صادر) يُنقص الخزنة، وحذف سداد لمورد (وارد) يعيده إليها
+    delta = sum((-amount if t_type == 'out' else amount for _, amount, _, _, t_type in rows), ZERO)
+    dates = [row[2] for row in rows]
+    record_ids = sorted({row[3] for row in rows})
+
+    with transaction.atomic():
+        ensure_dates_open(dates)
+        with bulk_operation():
+            PaymentInstallment.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        recalculate_amount_paid(record_ids=record_ids)
+        adjust_capital(delta)
+        invalidate_checkpoints(dates)
+    bump_data_version()
+    return len(rows), delta
+
+
+def create_payments(payments):
+    """
+    إضافة دفعات تجار [(رقم السجل المالي، المبلغ، تاريخ الدفع، ملاحظات)] بـ bulk_create واحد
+    (مثل استيراد كشف البنك). مجموع الدفعات لكل فاتورة لا يتجاوز المتبقي منها. يُرجع
+    (عدد الدفعات، صافي حركة الخزنة).
+    """
+    if not payments:
+        return 0, ZERO
+    record_ids = sorted({row[0] for row in payments})
+    dates = [row[2] for row in payments]
+
+    with transaction.atomic():
+        ensure_dates_open(dates)
+        # المتبقي يُقرأ داخل المعاملة حتى لا تسبقه دفعة مسجلة في نفس اللحظة
+        records = {
+            pk: (total - paid, t_type)
+            for pk, total, paid, t_type in FinancialRecord.objects.select_for_update().filter(pk__in=record_ids).values_list(
+                'pk', 'transaction__total_price', 'amount_paid', 'transaction__transaction_type'
+            )
+        }
+        requested = {}
+        for record_id, amount, _, _ in payments:
+            if amount <= 0:
+                raise ValidationError("مبلغ الدفعة يجب أن يكون أكبر من الصفر.")
+            requested[record_id] = requested.get(record_id, ZERO) + amount
+        for record_id, amount in requested.items():
+            remaining = records.get(record_id, (ZERO, None))[0]
+            if amount > remaining:
+                raise ValidationError(f"الدفعات على السجل المالي #{record_id} ({amount}) أكبر من المتبقي ({remaining}).")
+
+        # تحصيل من عميل (صادر) يزيد الخزنة، وسداد لمورد (وارد) ينقصها
+        delta = sum((amount if records[record_id][1] == 'out' else -amount for record_id, amount in requested.items()), ZERO)
+        with bulk_operation():
+            PaymentInstallment.objects.bulk_create([
+                PaymentInstallment(financial_record_id=record_id, amount=amount, date_paid=date_paid, notes=notes)
+                for record_id, amount, date_paid, notes in payments
+            ])
+        metrics.inc('store_model_writes_total', len(payments), model='paymentinstallment', action='create')
+        recalculate_amount_paid(record_ids=record_ids)
+        adjust_capital(delta)
+        invalidate_checkpoints(dates)
+    bump_data_version()
+    return len(payments), delta
@@ -0,0 +1,58 @@
+"""
+رقم إصدار للبيانات يزيد مع أي حفظ أو حذف في الدفاتر.
+
+النتائج المخزنة مؤقتاً (منشئ التقارير وغيره) تضيفه لمفتاحها، فأي تعديل يجعل كل
+النسخ القديمة غير مستخدمة فوراً بدون البحث عنها وحذفها واحدة واحدة.
+
+الرقم في صف واحد بقاعدة البيانات (DataVersion) وليس في الكاش نفسه: FileBasedCache.incr
+قراءة ثم كتابة فتضيع زيادات العمليات المتزامنة، والكاش يحذف مفاتيح عشوائية عند امتلائه
+(MAX_ENTRIES) فيعود الرقم لقيمة قديمة وتظهر نتائج قديمة. الزيادة تتم بعد نجاح المعاملة
+(on_commit): قبلها قد تُحسب نتيجة من البيانات القديمة وتُخزن تحت الرقم الجديد.
+
+MeteredFileBasedCache (في CACHES) يعد الإصابات والإخفاقات لكل نوع مفتاح في /metrics.
+"""
+import threading
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import transaction
+from django.db.models import F
+
+from . import metrics
+
+_pending = threading.local()
+
+
+def data_version():
+    from .models import DataVersion
+    version = DataVersion.objects.filter(pk=1).values_list('value', flat=True).first()
+    if version is None:
+        version = DataVersion.objects.get_or_create(pk=1)[0].value
+    return version
+
+
+def _apply_bump():
+    if not getattr(_pending, 'bump', False):
+        return
+    _pending.bump = False
+    from .models import DataVersion
+    if not DataVersion.objects.filter(pk=1).update(value=F('value') + 1):
+        DataVersion.objects.get_or_create(pk=1, defaults={'value': 2})
+
+
+def bump_data_version():
+    # كل حفظ يسجل callback والأول بعد النجاح يزيد الرقم مرة واحدة للمعاملة كلها؛ وخارج
+    # أي معاملة (autocommit) ينفذ on_commit فوراً
+    _pending.bump = True
+    transaction.on_commit(_apply_bump)
+
+
+class MeteredFileBasedCache(FileBasedCache):
+    """FileBasedCache يعد قراءات الكاش بأول جزء من المفتاح قبل ':' (report، forecast، store...)"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing_key, version)
+        # incr() يقرأ القيمة بـ _missing_key قبل زيادتها، وهذه ليست قراءة كاش حقيقية
+        if default is not self._missing_key:
+            result = 'miss' if value is self._missing_key else 'hit'
+            metrics.inc('store_cache_requests_total', cache=key.split(':', 1)[0], result=result)
+        return default if value is self._missing_key else value
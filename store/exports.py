@@ -0,0 +1,227 @@
+"""
+تصدير الدفاتر إلى ملفات Parquet للتحليل (pandas / DuckDB / Excel Power Query).
+
+    python manage.py export_analytics               # يضيف الصفوف الجديدة فقط
+    python manage.py export_analytics --full        # إعادة تصدير كل شيء
+
+كل جدول مجلد مستقل (analytics/transactions/part-00001.parquet ...) يُقرأ كاملاً بـ
+pd.read_parquet('analytics/transactions'). الأنواع تُحفظ كما هي: المبالغ decimal128
+بنفس دقة الحقل، والتواريخ date32، بدلاً من نصوص CSV.
+
+الصفوف تُقرأ على دفعات بـ values_list().iterator() وكل دفعة تُكتب كـ row group،
+فلا يُحمل الجدول كله في الذاكرة. التصدير التزايدي يعتمد على أكبر id تم تصديره؛
+تعديل صف قديم لا يظهر إلا بعد --full.
+
+الفواتير والدفعات المؤرشفة تحتفظ بأرقامها، فتُقرأ من جداول الأرشيف (إن وُجد أرشيف) وتُدمج
+مع صفوف اليومية بترتيب id: التصدير الكامل بعد الأرشفة يعطي نفس الصفوف التي كانت قبلها.
+"""
+import heapq
+import json
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.db import models
+
+from .archive import archive_boundary
+from .models import (
+    DailyTransaction, PaymentInstallment, ContactExpense, HomeExpense, IncomeRecord, BankInstallment,
+    ArchivedTransaction, ArchivedPayment,
+)
+
+STATE_NAME = 'export_state.json'
+ROW_GROUP_SIZE = 50_000
+
+# اسم الجدول: (الموديل، [(اسم العمود، مسار الحقل)])
+TABLES = {
+    'transactions': (DailyTransaction, [
+        ('id', 'id'),
+        ('date', 'date'),
+        ('transaction_type', 'transaction_type'),
+        ('contact_id', 'contact_id'),
+        ('contact_name', 'contact__name'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product__name'),
+        ('purchase_price_per_kg', 'product__purchase_price_per_kg'),
+        ('selling_price_per_kg', 'product__selling_price_per_kg'),
+        ('weight', 'weight'),
+        ('price_per_kg', 'price_per_kg'),
+        ('total_price', 'total_price'),
+        ('paid_amount_now', 'paid_amount_now'),
+        ('financial_record_id', 'financialrecord__id'),
+        ('amount_paid', 'financialrecord__amount_paid'),
+    ]),
+    'payments': (PaymentInstallment, [
+        ('id', 'id'),
+        ('date_paid', 'date_paid'),
+        ('amount', 'amount'),
+        ('financial_record_id', 'financial_record_id'),
+        ('transaction_id', 'financial_record__transaction_id'),
+        ('transaction_type', 'financial_record__transaction__transaction_type'),
+        ('contact_id', 'financial_record__transaction__contact_id'),
+    ]),
+    'contact_expenses': (ContactExpense, [
+        ('id', 'id'),
+        ('date', 'date'),
+        ('contact_id', 'contact_id'),
+        ('contact_name', 'contact__name'),
+        ('payer_type', 'payer_type'),
+        ('amount', 'amount'),
+        ('notes', 'notes'),
+    ]),
+    'home_expenses': (HomeExpense, [
+        ('id', 'id'),
+        ('date', 'date'),
+        ('description', 'description'),
+        ('amount', 'amount'),
+    ]),
+    'income': (IncomeRecord, [
+        ('id', 'id'),
+        ('date', 'date'),
+        ('source', 'source'),
+        ('amount', 'amount'),
+    ]),
+    'bank_installments': (BankInstallment, [
+        ('id', 'id'),
+        ('loan_id', 'loan_id'),
+        ('bank_name', 'loan__bank_name'),
+        ('due_date', 'due_date'),
+        ('principal_component', 'principal_component'),
+        ('interest_component', 'interest_component'),
+        ('extra_charges', 'extra_charges'),
+        ('total_installment_amount', 'total_installment_amount'),
+        ('is_paid', 'is_paid'),
+        ('actual_payment_date', 'actual_payment_date'),
+    ]),
+}
+
+
+# جداول لها أرشيف: (موديل الأرشيف، {اسم العمود: مسار الحقل فيه})، وباقي الأعمدة بنفس المسار
+ARCHIVE_TABLES = {
+    'transactions': (ArchivedTransaction, {
+        'financial_record_id': 'financial_record_id',
+        'amount_paid': 'amount_paid',
+    }),
+    'payments': (ArchivedPayment, {
+        'financial_record_id': 'transaction__financial_record_id',
+        'transaction_id': 'transaction_id',
+        'transaction_type': 'transaction__transaction_type',
+        'contact_id': 'transaction__contact_id',
+    }),
+}
+
+
+def _model_field(model, path):
+    """الحقل الأخير في مسار مثل product__purchase_price_per_kg"""
+    parts = path.split('__')
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    name = parts[-1]
+    if name.endswith('_id') and name != 'id':
+        return model._meta.get_field(name[:-3]).target_field
+    return model._meta.get_field(name)
+
+
+def arrow_type(field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def table_schema(name):
+    model, columns = TABLES[name]
+    return pa.schema([(column, arrow_type(_model_field(model, path))) for column, path in columns])
+
+
+def read_state(output_dir):
+    path = Path(output_dir) / STATE_NAME
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def write_state(output_dir, state):
+    (Path(output_dir) / STATE_NAME).write_text(json.dumps(state, indent=2))
+
+
+def export_table(name, output_dir, after_id=0, part=1, row_group_size=ROW_GROUP_SIZE):
+    """
+    كتابة الصفوف ذات id > after_id في ملف part جديد، وإرجاع (عدد الصفوف، آخر id).
+    لا يُنشأ ملف إذا لم توجد صفوف جديدة.
+    """
+    model, columns = TABLES[name]
+    schema = table_schema(name)
+    rows = model.objects.filter(pk__gt=after_id).order_by('pk').values_list(
+        *[path for _, path in columns]
+    ).iterator(chunk_size=row_group_size)
+    if name in ARCHIVE_TABLES and archive_boundary() is not None:
+        archive_model, paths = ARCHIVE_TABLES[name]
+        archived = archive_model.objects.filter(pk__gt=after_id).order_by('pk').values_list(
+            *[paths.get(column, path) for column, path in columns]
+        ).iterator(chunk_size=row_group_size)
+        # الأرقام لا تتكرر بين الجدولين (الأرشفة تنقل الصف بنفس id)
+        rows = heapq.merge(rows, archived, key=lambda row: row[0])
+
+    table_dir = Path(output_dir) / name
+    target = table_dir / f'part-{part:05d}.parquet'
+    temp = target.with_suffix('.tmp')
+    writer, count, last_id = None, 0, after_id
+
+    def flush(batch):
+        nonlocal writer
+        if writer is None:
+            table_dir.mkdir(parents=True, exist_ok=True)
+            writer = pq.ParquetWriter(temp, schema, compression='zstd')
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=len(batch))
+
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == row_group_size:
+                flush(batch)
+                count, last_id, batch = count + len(batch), batch[-1][0], []
+        if batch:
+            flush(batch)
+            count, last_id = count + len(batch), batch[-1][0]
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # الملف يظهر باسمه النهائي بعد اكتماله فقط، فلا يقرأ أحد ملفاً نصف مكتوب
+    if count:
+        temp.replace(target)
+    return count, last_id
+
+
+def export_all(output_dir, full=False, tables=None, row_group_size=ROW_GROUP_SIZE):
+    """تصدير الجداول المطلوبة (الكل افتراضياً)، وإرجاع {الجدول: عدد الصفوف المضافة}"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = read_state(output_dir)
+    exported = {}
+
+    for name in tables or TABLES:
+        if full:
+            shutil.rmtree(output_dir / name, ignore_errors=True)
+            state.pop(name, None)
+        table_state = state.get(name, {'last_id': 0, 'parts': 0})
+        count, last_id = export_table(
+            name, output_dir, after_id=table_state['last_id'], part=table_state['parts'] + 1,
+            row_group_size=row_group_size,
+        )
+        if count:
+            state[name] = {'last_id': last_id, 'parts': table_state['parts'] + 1}
+        # حفظ الحالة بعد كل جدول حتى لا يُكرر التصدير التالي جدولاً اكتمل
+        write_state(output_dir, state)
+        exported[name] = count
+
+    return exported
@@ -0,0 +1,167 @@
+"""
+توقع رصيد الخزنة يوماً بيوم للأشهر القادمة.
+
+البداية من رصيد الخزنة الحالي (Capital.initial_amount)، ثم على شبكة أيام (numpy) تُضاف:
+- أقساط البنك غير المدفوعة للقروض النشطة في تاريخ استحقاقها.
+- المتبقي من فواتير البيع (تحصيل) والشراء (سداد) في التاريخ المتوقع للدفع: تاريخ الفاتورة
+  + متوسط تأخير هذا التاجر في الدفع (مرجح بالمبلغ) من دفعات آخر سنة، ولنوع الفاتورة نفسه.
+  التاجر بلا تاريخ دفع يأخذ متوسط كل التجار، وما تأخر عن موعده المتوقع يُحسب في أول يوم.
+- مصاريف البيت بمعدلها اليومي خلال آخر STORE_FORECAST_HOME_DAYS يوماً.
+
+المبالغ بالقروش (أعداد صحيحة) مثل analytics، والتجميع على الأيام بـ np.add.at ثم cumsum
+بدون أي حلقة على الفواتير. النتيجة تُخزن مؤقتاً حتى أول تعديل في الدفاتر (store/cache.py)،
+ومتوسطات التأخير (أبطأ جزء مع ملايين الدفعات) تُحسب مرة واحدة في اليوم.
+"""
+from datetime import timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, DecimalField, F, Sum
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .analytics import SCALE, fetch_columns, group_sum, to_cents
+from .cache import data_version
+from .models import BankInstallment, Capital, FinancialRecord, HomeExpense, PaymentInstallment
+
+HISTORY_DAYS = 365
+MAX_MONTHS = 24
+COMPONENTS = ['collections', 'payments', 'bank', 'home']
+
+
+def _day_index(days, start, size):
+    """أرقام الأيام على الشبكة، وما قبل البداية يُحسب في أول يوم"""
+    index = (np.array(days, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+    return np.clip(index, 0, size)
+
+
+def _as_money(values):
+    return (values / SCALE).round(2).tolist()
+
+
+def payment_delays(today):
+    """
+    متوسط التأخير بالأيام (من تاريخ الفاتورة إلى تاريخ الدفعة) مرجحاً بالمبلغ لكل
+    (تاجر، نوع فاتورة)، ولكل نوع فاتورة على مستوى كل التجار.
+    يرجع (مفاتيح تاجر × 2 + بيع؟ مرتبة، التأخير لكل مفتاح، {بيع؟: التأخير العام}).
+    """
+    data = fetch_columns(PaymentInstallment.objects.filter(
+        date_paid__gte=today - timedelta(days=HISTORY_DAYS),
+    ).annotate(
+        invoice_day=Cast('financial_record__transaction__date', CharField()),
+        paid_day=Cast('date_paid', CharField()),
+    ).values_list(
+        'financial_record__transaction__contact_id', 'financial_record__transaction__transaction_type',
+        'invoice_day', 'paid_day', 'amount',
+    ).order_by())
+    contacts = np.array(data['financial_record__transaction__contact_id'], dtype=np.int64)
+    is_sale = np.array(data['financial_record__transaction__transaction_type'], dtype=object) == 'out'
+    delay = np.maximum(
+        (np.array(data['paid_day'], dtype='datetime64[D]') - np.array(data['invoice_day'], dtype='datetime64[D]')).astype(np.int64),
+        0,
+    )
+    amount = to_cents(data['amount'])
+
+    keys, (weighted, total), _ = group_sum(contacts * 2 + is_sale, delay * amount, amount)
+    per_key = np.divide(weighted, total, out=np.zeros(len(keys)), where=total > 0)
+    overall = {}
+    for sale in (False, True):
+        paid = amount[is_sale == sale].sum()
+        overall[sale] = float((delay * amount)[is_sale == sale].sum() / paid) if paid else 0.0
+    return keys, per_key, overall
+
+
+def _open_invoices(today, size):
+    """(يوم التحصيل / السداد المتوقع، المتبقي بالقروش، بيع؟، متأخرة؟) لكل فاتورة لم تُسدد بالكامل"""
+    data = fetch_columns(FinancialRecord.objects.annotate(
+        remaining=F('transaction__total_price') - Coalesce(F('amount_paid'), 0, output_field=DecimalField()),
+        invoice_day=Cast('transaction__date', CharField()),
+    ).filter(remaining__gt=0).values_list(
+        'invoice_day', 'transaction__contact_id', 'transaction__transaction_type', 'remaining',
+    ).order_by())
+    is_sale = np.array(data['transaction__transaction_type'], dtype=object) == 'out'
+    remaining = to_cents(data['remaining'])
+    if not len(remaining):
+        return np.zeros(0, dtype=np.int64), remaining, is_sale, np.zeros(0, dtype=bool)
+
+    # عادات الدفع تتغير ببطء: تُحسب مرة في اليوم وليس مع كل تعديل في الدفاتر
+    delays_key = f'forecast:delays:{today.isoformat()}'
+    delays = cache.get(delays_key)
+    if delays is None:
+        delays = payment_delays(today)
+        cache.set(delays_key, delays, 24 * 60 * 60)
+    keys, per_key, overall = delays
+    wanted = np.array(data['transaction__contact_id'], dtype=np.int64) * 2 + is_sale
+    position = np.minimum(np.searchsorted(keys, wanted), max(len(keys) - 1, 0))
+    known = (keys[position] == wanted) if len(keys) else np.zeros(len(wanted), dtype=bool)
+    fallback = np.where(is_sale, overall[True], overall[False])
+    delay = np.rint(np.where(known, per_key[position] if len(keys) else 0, fallback)).astype(np.int64)
+
+    expected = np.array(data['invoice_day'], dtype='datetime64[D]') + delay
+    return _day_index(expected, today, size), remaining, is_sale, expected < np.datetime64(today, 'D')
+
+
+def build_forecast(today, months):
+    end = today + relativedelta(months=months)
+    days = np.arange(np.datetime64(today, 'D'), np.datetime64(end, 'D') + 1)
+    size = len(days)
+    # خانة زيادة في الآخر لما بعد نهاية الفترة، وتُحذف قبل الجمع
+    flows = {name: np.zeros(size + 1, dtype=np.int64) for name in COMPONENTS}
+
+    day, remaining, is_sale, overdue = _open_invoices(today, size)
+    np.add.at(flows['collections'], day[is_sale], remaining[is_sale])
+    np.add.at(flows['payments'], day[~is_sale], -remaining[~is_sale])
+
+    bank = fetch_columns(BankInstallment.objects.filter(
+        loan__is_active=True, is_paid=False, due_date__lte=end,
+    ).annotate(day=Cast('due_date', CharField())).values_list('day', 'total_installment_amount').order_by())
+    np.add.at(flows['bank'], _day_index(bank['day'], today, size), -to_cents(bank['total_installment_amount']))
+
+    home_days = getattr(settings, 'STORE_FORECAST_HOME_DAYS', 90)
+    home_total = HomeExpense.objects.filter(date__gt=today - timedelta(days=home_days), date__lte=today).aggregate(
+        total=Sum('amount')
+    )['total'] or 0
+    home_rate = int(round(float(home_total) * SCALE / home_days))
+    flows['home'][:size] = -home_rate
+
+    capital = Capital.objects.first()
+    opening = to_cents([capital.initial_amount if capital else 0])[0]
+    daily = {name: values[:size] for name, values in flows.items()}
+    net = sum(daily.values())
+    balance = opening + np.cumsum(net)
+
+    lowest = int(np.argmin(balance))
+    negative = np.flatnonzero(balance < 0)
+    return {
+        'start': today.isoformat(),
+        'end': end.isoformat(),
+        'months': months,
+        'opening': int(opening) / SCALE,
+        'days': np.datetime_as_string(days).tolist(),
+        'balance': _as_money(balance),
+        'flows': {name: _as_money(values) for name, values in daily.items()},
+        'totals': {name: int(values.sum()) / SCALE for name, values in daily.items()},
+        # المتأخر عن موعده المتوقع (محسوب ضمن أول يوم)
+        'overdue': {
+            'collections': int(remaining[is_sale & overdue].sum()) / SCALE,
+            'payments': int(remaining[~is_sale & overdue].sum()) / SCALE,
+        },
+        'home_daily_rate': home_rate / SCALE,
+        'closing': int(balance[-1]) / SCALE,
+        'lowest': {'date': str(days[lowest]), 'balance': int(balance[lowest]) / SCALE},
+        'first_negative': str(days[negative[0]]) if len(negative) else None,
+    }
+
+
+def cash_forecast(months=None, today=None):
+    """توقع الخزنة لـ months شهراً من اليوم، من الكاش إن لم تتغير الدفاتر منذ آخر حساب"""
+    today = today or timezone.now().date()
+    months = min(max(int(months or getattr(settings, 'STORE_FORECAST_MONTHS', 3)), 1), MAX_MONTHS)
+    key = f'forecast:{data_version()}:{today.isoformat()}:{months}'
+    result = cache.get(key)
+    if result is None:
+        result = build_forecast(today, months)
+        cache.set(key, result, 24 * 60 * 60)
+    return result
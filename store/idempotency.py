@@ -0,0 +1,88 @@
+"""
+منع تكرار تنفيذ النماذج المرسلة أكثر من مرة (إعادة الإرسال بعد انقطاع الاتصال، أو الضغط مرتين).
+
+المتصفح يولد مفتاحاً عشوائياً لكل نموذج ويرسله في الرأس X-Idempotency-Key (من طابور
+static/js/offline-queue.js) أو في حقل idempotency_key. أول طلب بالمفتاح يُنفذ ويُحفظ
+المفتاح في نفس المعاملة، وأي طلب لاحق بنفس المفتاح يُرجع النتيجة بدون تنفيذ:
+
+    @user_passes_test(lambda u: u.is_superuser)
+    @idempotent
+    def add_contact_expense(request): ...
+
+الطلبات القادمة من الطابور (بالرأس) تأخذ رداً JSON فيه رسائل العملية بدلاً من التحويل لصفحة.
+"""
+import re
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_X_IDEMPOTENCY_KEY'
+FIELD = 'idempotency_key'
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9-]{16,64}$')
+
+
+def _replay_response(request, response, duplicate):
+    # الرسائل تُعرض في الصفحة من الـ JSON، فتُستهلك هنا حتى لا تظهر مرة أخرى
+    return JsonResponse({
+        'ok': response.status_code < 400,
+        'duplicate': duplicate,
+        'messages': [{'level': m.level_tag, 'text': str(m)} for m in messages.get_messages(request)],
+    })
+
+
+def purge_expired():
+    days = getattr(settings, 'STORE_IDEMPOTENCY_DAYS', 30)
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
+
+
+def idempotent(view):
+    """ينفذ طلب POST مرة واحدة لكل مفتاح. يوضع بعد مزخرفات الصلاحيات حتى لا يُحفظ مفتاح لطلب مرفوض."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+        key = request.META.get(HEADER) or request.POST.get(FIELD)
+        if not key:
+            return view(request, *args, **kwargs)
+        if not KEY_PATTERN.match(key):
+            return HttpResponseBadRequest("مفتاح منع التكرار غير صالح.")
+
+        with transaction.atomic():
+            try:
+                # المفتاح يُحجز أولاً: الطلب المتزامن بنفس المفتاح ينتظر القفل ثم يفشل هنا
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(key=key, user=request.user, path=request.path)
+            except IntegrityError:
+                record = None
+            else:
+                # خطأ غير متوقع داخل الـ View يلغي حجز المفتاح أيضاً فتنجح إعادة المحاولة،
+                # وخطأ قاعدة بيانات تعالجه الـ View بنفسها لا يفسد المعاملة الخارجية
+                with transaction.atomic():
+                    response = view(request, *args, **kwargs)
+                record.response_status = response.status_code
+                record.response_location = response.get('Location', '')[:500]
+                record.save(update_fields=['response_status', 'response_location'])
+
+        if record is None:
+            record = IdempotencyKey.objects.filter(key=key).first()
+            messages.info(request, "هذه العملية سُجلت من قبل ولم تُكرر.")
+            response = redirect(
+                (record and record.response_location) or request.META.get('HTTP_REFERER') or 'dashboard'
+            )
+            duplicate = True
+        else:
+            duplicate = False
+            purge_expired()
+
+        if HEADER in request.META:
+            return _replay_response(request, response, duplicate)
+        return response
+    return wrapper
@@ -0,0 +1,149 @@
+"""
+طابور مهام خفيف مخزن في قاعدة البيانات.
+
+    enqueue('export_analytics', full=True)         # من أي View أو موديل
+    python manage.py enqueue_job generate_statements pdf=true   # من cron
+    python manage.py run_worker                    # عملية منفصلة على نفس السيرفر
+
+لا يحتاج إلى Redis أو أي وسيط خارجي: العامل يحجز المهمة بعملية UPDATE مشروطة،
+فلا تُنفذ نفس المهمة مرتين حتى لو عمل أكثر من عامل في نفس الوقت.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Sum, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+TASKS = {}
+
+
+def task(name):
+    """تسجيل دالة كمهمة يمكن وضعها في الطابور باسمها"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, run_after=None, max_attempts=3, **payload):
+    if name not in TASKS:
+        raise ValueError(f"مهمة غير معروفة: {name}")
+    job = Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+    # في بيئة التطوير يمكن تنفيذ المهام فوراً بدون تشغيل العامل (بنفس خطوات الحجز في claim_next)
+    if getattr(settings, 'STORE_JOBS_EAGER', False):
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.attempts = 1
+        job.save(update_fields=['status', 'started_at', 'attempts'])
+        run_job(job)
+    return job
+
+
+def claim_next():
+    """حجز أقدم مهمة مستحقة للتنفيذ، أو None إذا كان الطابور فارغاً"""
+    now = timezone.now()
+    while True:
+        job_id = Job.objects.filter(status='pending', run_after__lte=now).order_by('run_after', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+
+
+def run_job(job):
+    try:
+        result = TASKS[job.name](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        else:
+            # إعادة المحاولة بعد مهلة تتضاعف مع كل فشل
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+    else:
+        job.status = 'done'
+        job.result = result
+        job.last_error = ''
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'last_error', 'run_after', 'finished_at'])
+    return job
+
+
+def requeue_stale(older_than=timedelta(minutes=30)):
+    """إرجاع المهام التي توقف عاملها أثناء التنفيذ (مثلاً إعادة تشغيل السيرفر) إلى الطابور"""
+    return Job.objects.filter(status='running', started_at__lt=timezone.now() - older_than).update(status='pending')
+
+
+# --- المهام المسجلة ---
+
+@task('recalculate_amount_paid')
+def recalculate_amount_paid(record_ids=None):
+    """إعادة حساب إجمالي المدفوع للسجلات المالية بجملة UPDATE واحدة"""
+    from .models import FinancialRecord, PaymentInstallment
+    paid = PaymentInstallment.objects.filter(financial_record=OuterRef('pk')).values('financial_record').annotate(
+        total=Sum('amount')
+    ).values('total')
+    records = FinancialRecord.objects.all()
+    if record_ids is not None:
+        records = records.filter(pk__in=record_ids)
+    updated = records.update(amount_paid=Coalesce(Subquery(paid), 0, output_field=DecimalField()))
+    return {'updated': updated}
+
+
+@task('close_period')
+def close_period_task(month):
+    from .periods import month_bounds, close_period
+    year, month_num = (int(part) for part in month.split('-'))
+    period = close_period(*month_bounds(year, month_num))
+    return {'period_id': period.pk, 'cash_balance': str(period.cash_balance)}
+
+
+@task('export_analytics')
+def export_analytics_task(full=False, tables=None, output=None):
+    from .exports import export_all
+    exported = export_all(output or settings.BASE_DIR / 'analytics', full=full, tables=tables)
+    return {'exported': exported}
+
+
+@task('generate_statements')
+def generate_statements_task(contacts=None, pdf=False, force=False, output=None):
+    """نفس أمر generate_statements (يتخطى التجار الذين لم تتغير بياناتهم)"""
+    from io import StringIO
+    from django.core.management import call_command
+    out = StringIO()
+    options = {'pdf': pdf, 'force': force, 'stdout': out, 'stderr': out}
+    if contacts:
+        options['contacts'] = contacts
+    if output:
+        options['output'] = output
+    call_command('generate_statements', **options)
+    return {'output': out.getvalue().strip()}
+
+
+@task('precompute_reports')
+def precompute_reports(reports=None):
+    """
+    تجهيز الكاش لتوقع الخزنة وتقارير منشئ التقارير (الافتراضي: STORE_PRECOMPUTE_REPORTS)،
+    فتفتح الصفحات من الكاش حتى أول تعديل في الدفاتر.
+    """
+    from .forecast import cash_forecast
+    from .report_builder import parse_spec, run_report
+    cash_forecast()
+    reports = getattr(settings, 'STORE_PRECOMPUTE_REPORTS', []) if reports is None else reports
+    for params in reports:
+        run_report(parse_spec(params))
+    return {'reports': len(reports)}
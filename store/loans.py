@@ -0,0 +1,204 @@
+"""
+ملخص محفظة القروض البنكية النشطة.
+
+كل الأرقام (المتبقي من الأصل والفائدة، القسط القادم، الأقساط المتأخرة) لكل القروض
+تخرج من استعلام مجمع واحد على BankInstallment مهما كان عدد القروض.
+
+السداد المبكر وإعادة الجدولة تُحسب أولاً كخطة للمعاينة (قبل/بعد) ثم تُنفذ بـ
+bulk_update واحد وحركة خزنة واحدة.
+"""
+import math
+from decimal import Decimal, ROUND_FLOOR
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Count, DecimalField, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import BankLoan, BankInstallment, Capital
+
+ZERO = Decimal(0)
+
+
+def _sum(field, condition=None):
+    return Coalesce(Sum(f'installments__{field}', filter=condition), ZERO, output_field=DecimalField())
+
+
+def active_loans(today=None):
+    """القروض النشطة مع أرقام جدول أقساط كل قرض محسوبة داخل نفس الاستعلام"""
+    today = today or timezone.now().date()
+    unpaid = Q(installments__is_paid=False)
+    overdue = unpaid & Q(installments__due_date__lt=today)
+    next_installment = BankInstallment.objects.filter(
+        loan=OuterRef('pk'), is_paid=False, due_date__gte=today
+    ).order_by('due_date').values('total_installment_amount')[:1]
+
+    return BankLoan.objects.filter(is_active=True).annotate(
+        installments_count=Count('installments'),
+        total_flow=_sum('total_installment_amount'),
+        total_interest=_sum('interest_component'),
+        total_paid=_sum('total_installment_amount', Q(installments__is_paid=True)),
+        remaining_total=_sum('total_installment_amount', unpaid),
+        remaining_principal=_sum('principal_component', unpaid),
+        remaining_interest=_sum('interest_component', unpaid),
+        overdue_count=Count('installments', filter=overdue),
+        overdue_amount=_sum('total_installment_amount', overdue),
+        next_due_date=Min('installments__due_date', filter=unpaid & Q(installments__due_date__gte=today)),
+        next_due_amount=Subquery(next_installment, output_field=DecimalField()),
+    ).order_by('start_date', 'pk')
+
+
+def portfolio_summary(today=None):
+    """{'loans': [...], 'totals': {...}} لكل القروض النشطة"""
+    loans = list(active_loans(today))
+    totals = {
+        field: sum((getattr(loan, field) for loan in loans), ZERO)
+        for field in ('total_loan_amount', 'total_flow', 'total_paid', 'remaining_total',
+                      'remaining_principal', 'remaining_interest', 'overdue_amount')
+    }
+    totals['overdue_count'] = sum(loan.overdue_count for loan in loans)
+
+    upcoming = [loan for loan in loans if loan.next_due_date]
+    next_loan = min(upcoming, key=lambda loan: loan.next_due_date) if upcoming else None
+    totals['next_due_date'] = next_loan.next_due_date if next_loan else None
+    # قد يستحق أكثر من قرض في نفس اليوم
+    totals['next_due_amount'] = sum(
+        (loan.next_due_amount or ZERO for loan in upcoming if loan.next_due_date == totals['next_due_date']), ZERO
+    )
+    return {'loans': loans, 'totals': totals}
+
+
+# --- السداد المبكر وإعادة الجدولة ---
+
+def _amounts(principal, interest, extra):
+    return {'principal': principal, 'interest': interest, 'extra': extra, 'total': principal + interest + extra}
+
+
+def _totals(amounts, due_dates):
+    return {
+        'count': len(amounts),
+        'principal': sum((a['principal'] for a in amounts), ZERO),
+        'interest': sum((a['interest'] for a in amounts), ZERO),
+        'total': sum((a['total'] for a in amounts), ZERO),
+        'last_due': max(due_dates) if due_dates else None,
+    }
+
+
+def plan_reschedule(loan, prepayment=ZERO, mode='installment', rate=None, months=None, on_date=None):
+    """
+    حساب الجدول الجديد للأقساط غير المدفوعة بدون حفظ أي شيء (للمعاينة ثم التنفيذ).
+
+    mode='installment': نفس عدد الأقساط بقسط أقل.
+    mode='term': نفس قسط الأصل الحالي بعدد أقساط أقل.
+    months: عدد أقساط جديد يحدده البنك (يتجاهل mode)، rate: نسبة فائدة جديدة.
+    """
+    on_date = on_date or timezone.now().date()
+    prepayment = Decimal(round(prepayment))
+    rate = loan.interest_rate_percentage if rate is None else Decimal(rate)
+    unpaid = list(loan.installments.filter(is_paid=False).order_by('due_date', 'pk'))
+
+    if not unpaid:
+        raise ValueError("لا توجد أقساط متبقية لإعادة جدولتها.")
+    if prepayment < 0 or rate < 0 or (months is not None and months < 1):
+        raise ValueError("القيم المدخلة يجب أن تكون موجبة.")
+    if mode not in ('installment', 'term'):
+        raise ValueError("طريقة إعادة الجدولة غير معروفة.")
+
+    remaining = sum((i.principal_component for i in unpaid), ZERO) - prepayment
+    if remaining < 0:
+        raise ValueError(f"السداد المبكر أكبر من المتبقي من أصل القرض ({remaining + prepayment}).")
+
+    if months:
+        count = months
+    elif mode == 'term' and prepayment:
+        per_month = unpaid[0].principal_component or remaining
+        count = max(1, math.ceil(remaining / per_month)) if per_month else 1
+    else:
+        count = len(unpaid)
+
+    if mode == 'term' and not months and prepayment:
+        principals = [per_month] * (count - 1)
+    else:
+        principals = [(remaining / count).to_integral_value(ROUND_FLOOR)] * (count - 1)
+    principals.append(remaining - sum(principals, ZERO))
+    # نفس معادلة generate_schedule: الفائدة الشهرية ثابتة على الأصل المتبقي
+    interest = Decimal(round(remaining * rate / 100 / loan.loan_period_months))
+
+    rows = []
+    last_due = unpaid[-1].due_date
+    for index in range(max(count, len(unpaid))):
+        installment = unpaid[index] if index < len(unpaid) else None
+        if installment:
+            due_date = installment.due_date
+            old = _amounts(installment.principal_component, installment.interest_component, installment.extra_charges)
+            extra = installment.extra_charges
+        else:
+            due_date = last_due + relativedelta(months=index - len(unpaid) + 1)
+            old, extra = None, ZERO
+        new = _amounts(principals[index], interest, extra) if index < count else None
+        rows.append({
+            'installment': installment, 'due_date': due_date, 'old': old, 'new': new,
+            'changed': old != new,
+        })
+
+    return {
+        'loan': loan,
+        'prepayment': prepayment,
+        'mode': mode,
+        'rate': rate,
+        'months': months,
+        'on_date': on_date,
+        'rows': rows,
+        'before': _totals([r['old'] for r in rows if r['old']], [r['due_date'] for r in rows if r['old']]),
+        'after': _totals([r['new'] for r in rows if r['new']], [r['due_date'] for r in rows if r['new']]),
+    }
+
+
+def apply_reschedule(plan):
+    """تنفيذ الخطة: قيد السداد المبكر، bulk_update واحد للأقساط، وحركة خزنة واحدة"""
+    loan = plan['loan']
+    updated, created, deleted = [], [], []
+    for row in plan['rows']:
+        installment, new = row['installment'], row['new']
+        if installment and new is None:
+            deleted.append(installment.pk)
+        elif installment is None:
+            created.append(BankInstallment(
+                loan=loan, due_date=row['due_date'], principal_component=new['principal'],
+                interest_component=new['interest'], extra_charges=new['extra'],
+                total_installment_amount=new['total'],
+            ))
+        elif row['changed']:
+            installment.principal_component = new['principal']
+            installment.interest_component = new['interest']
+            installment.total_installment_amount = new['total']
+            updated.append(installment)
+
+    with transaction.atomic():
+        if plan['prepayment']:
+            # السداد المبكر قسط مدفوع (أصل فقط) حتى تبقى حركة الخزنة وأصل القرض قابلين للمطابقة
+            BankInstallment.objects.create(
+                loan=loan, due_date=plan['on_date'], principal_component=plan['prepayment'],
+                interest_component=0, extra_charges=0, total_installment_amount=plan['prepayment'],
+                is_paid=True, actual_payment_date=plan['on_date'],
+            )
+            capital = Capital.objects.select_for_update().first()
+            if capital:
+                capital.initial_amount -= plan['prepayment']
+                capital.save()
+
+        BankInstallment.objects.bulk_update(
+            updated, ['principal_component', 'interest_component', 'total_installment_amount']
+        )
+        if deleted:
+            BankInstallment.objects.filter(pk__in=deleted).delete()
+        if created:
+            BankInstallment.objects.bulk_create(created)
+        if plan['rate'] != loan.interest_rate_percentage:
+            loan.interest_rate_percentage = plan['rate']
+            loan.save(update_fields=['interest_rate_percentage'])
+    # bulk_update و bulk_create لا يرسلان إشارات، فالكاش (التوقع، المقاييس...) يُبطل هنا مرة واحدة
+    bump_data_version()
+    return {'updated': len(updated), 'created': len(created), 'deleted': len(deleted)}
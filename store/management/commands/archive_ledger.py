@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.archive import archive_ledger, default_cutoff
+from store.models import ArchiveRun
+
+
+class Command(BaseCommand):
+    help = "نقل الفواتير المسددة القديمة (مع دفعاتها) إلى الأرشيف وتحديث الأرصدة المرحلة للتجار"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="تاريخ القطع بصيغة YYYY-MM-DD (الافتراضي: قبل STORE_ARCHIVE_AFTER_DAYS يوماً)")
+        parser.add_argument('--dry-run', action='store_true', help="عرض عدد الفواتير القابلة للأرشفة بدون نقلها")
+        parser.add_argument('--list', action='store_true', help="عرض عمليات الأرشفة السابقة")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for run in ArchiveRun.objects.order_by('created_at'):
+                self.stdout.write(f"حتى {run.cutoff} | {run.transactions} فاتورة | {run.payments} دفعة | {run.created_at:%Y-%m-%d %H:%M}")
+            return
+
+        if options['before']:
+            try:
+                cutoff = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError("صيغة التاريخ غير صحيحة، استخدم YYYY-MM-DD")
+        else:
+            cutoff = default_cutoff()
+
+        try:
+            run = archive_ledger(cutoff, dry_run=options['dry_run'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            self.stdout.write(f"{run.transactions} فاتورة مسددة حتى {cutoff} قابلة للأرشفة.")
+        elif not run.pk:
+            self.stdout.write(f"لا توجد فواتير مسددة حتى {cutoff} لأرشفتها.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"تمت أرشفة {run.transactions} فاتورة و{run.payments} دفعة حتى {cutoff}."
+            ))
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.backup import backup_dir, create_backup, list_backups, rotate, verify_backup
+
+
+class Command(BaseCommand):
+    help = (
+        "نسخة احتياطية مضغوطة من قاعدة البيانات أثناء التشغيل (SQLite backup API على دفعات)، "
+        "مع بصمة sha256 وتدوير النسخ القديمة، والتحقق اختيارياً باستعادة تجريبية وفحوص المطابقة"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="مجلد النسخ (الافتراضي: STORE_BACKUP_DIR)")
+        parser.add_argument('--pages', type=int, default=256, help="عدد الصفحات في كل دفعة نسخ (-1 = دفعة واحدة)")
+        parser.add_argument('--pause', type=float, default=50, help="الاستراحة بين الدفعات بالمللي ثانية")
+        parser.add_argument('--keep', type=int, help="عدد أحدث النسخ المحتفظ بها (الافتراضي: STORE_BACKUP_KEEP)")
+        parser.add_argument('--keep-monthly', type=int, help="عدد الأشهر التي تبقى منها أول نسخة (الافتراضي: STORE_BACKUP_KEEP_MONTHLY)")
+        parser.add_argument('--verify', action='store_true', help="استعادة النسخة الجديدة تجريبياً وتشغيل فحوص المطابقة عليها")
+        parser.add_argument(
+            '--verify-only', nargs='?', const='latest', metavar='FILE',
+            help="التحقق من نسخة موجودة (الافتراضي: أحدث نسخة) بدون إنشاء نسخة جديدة",
+        )
+        parser.add_argument('--list', action='store_true', help="عرض النسخ الموجودة")
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else backup_dir()
+
+        if options['list']:
+            for path in list_backups(directory):
+                self.stdout.write(f"{path.name} | {path.stat().st_size / 1024:,.0f} KB")
+            return
+
+        if options['verify_only']:
+            if options['verify_only'] == 'latest':
+                backups = list_backups(directory)
+                if not backups:
+                    raise CommandError(f"لا توجد نسخ في {directory}")
+                path = backups[-1]
+            else:
+                path = Path(options['verify_only'])
+                if not path.exists():
+                    raise CommandError(f"الملف غير موجود: {path}")
+            self.verify(path)
+            return
+
+        path, stats = create_backup(directory, pages=options['pages'], pause=options['pause'] / 1000)
+        steps = f"{stats['steps']} دفعة، {stats['restarts']} إعادة"
+        if stats['single_step'] and options['pages'] > 0:
+            steps += "، ثم دفعة واحدة بسبب الكتابة المستمرة"
+        self.stdout.write(self.style.SUCCESS(
+            f"تم إنشاء {path.name}: {stats['raw_size'] / 1024:,.0f} KB -> {stats['size'] / 1024:,.0f} KB "
+            f"في {stats['seconds']:.2f} ثانية ({steps})"
+        ))
+        self.stdout.write(f"sha256: {stats['sha256']}")
+
+        for removed in rotate(directory, options['keep'], options['keep_monthly']):
+            self.stdout.write(f"حذف النسخة القديمة {removed.name}")
+
+        if options['verify']:
+            self.verify(path)
+
+    def verify(self, path):
+        try:
+            result = verify_backup(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if result['integrity'] != 'ok':
+            raise CommandError(f"{path.name}: فشل integrity_check: {result['integrity']}")
+
+        failed = 0
+        for name, found in result['reconcile'].items():
+            if found is None:
+                self.stdout.write(self.style.WARNING(f"[{name}] تم التخطي (لا توجد فترة مغلقة كنقطة مرجعية)."))
+            elif found:
+                failed += len(found)
+                self.stdout.write(self.style.ERROR(f"[{name}] {len(found)} فرق في النسخة."))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[{name}] مطابق."))
+        if failed:
+            raise CommandError(f"{path.name}: النسخة سليمة لكن بها {failed} قيمة غير مطابقة (شغل reconcile على القاعدة الأصلية).")
+        self.stdout.write(self.style.SUCCESS(f"{path.name}: البصمة وintegrity_check وفحوص المطابقة سليمة."))
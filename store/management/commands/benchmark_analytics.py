@@ -0,0 +1,79 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncMonth
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from store.analytics import profitability_report
+from store.models import DailyTransaction
+
+
+class Command(BaseCommand):
+    help = "مقارنة زمن تقرير الربحية (numpy) بحلقة Python على كائنات ORM وبالتجميع داخل قاعدة البيانات"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="عدد الحركات في البيانات التجريبية")
+        parser.add_argument('--contacts', type=int, default=500, help="عدد التجار")
+        parser.add_argument('--months', type=int, default=24, help="عدد الشهور التي تتوزع عليها الحركات")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            start = time.perf_counter()
+            call_command('seed_demo', contacts=options['contacts'], transactions=options['rows'],
+                         months=options['months'], stdout=self.stdout)
+            self.stdout.write(f"(التعبئة: {time.perf_counter() - start:.0f} ثانية)")
+            self.benchmark(options['months'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def timed(self, label, func):
+        start = time.perf_counter()
+        result = func()
+        self.stdout.write(f"{label:<28}{(time.perf_counter() - start) * 1000:>12,.0f} ms")
+        return result
+
+    def benchmark(self, months):
+        end = timezone.localdate()
+        start = end.replace(year=end.year - (months // 12) - 1)
+
+        def python_loop():
+            # الطريقة المعتادة: كائن لكل فاتورة وجمع Decimal في قواميس
+            by_product, by_contact, by_month = defaultdict(Decimal), defaultdict(Decimal), defaultdict(Decimal)
+            sales = DailyTransaction.objects.filter(transaction_type='out', date__gte=start, date__lte=end).select_related('product')
+            for t in sales:
+                profit = t.total_price - t.weight * t.product.purchase_price_per_kg
+                by_product[t.product.name] += profit
+                by_contact[t.contact_id] += profit
+                by_month[t.date.replace(day=1)] += profit
+            return by_product
+
+        def database_group_by():
+            profit = ExpressionWrapper(F('total_price') - F('weight') * F('product__purchase_price_per_kg'), output_field=DecimalField())
+            sales = DailyTransaction.objects.filter(transaction_type='out', date__gte=start, date__lte=end)
+            by_product = dict(sales.values('product__name').annotate(p=Sum(profit)).order_by().values_list('product__name', 'p'))
+            list(sales.values('contact_id').annotate(p=Sum(profit)).order_by())
+            list(sales.annotate(m=TruncMonth('date')).values('m').annotate(p=Sum(profit)).order_by())
+            return by_product
+
+        self.stdout.write(f"\n{'الطريقة':<28}{'الزمن':>12}")
+        looped = self.timed('حلقة Python على ORM', python_loop)
+        grouped = self.timed('GROUP BY في قاعدة البيانات', database_group_by)
+        report = self.timed('numpy (التقرير كاملاً)', lambda: profitability_report(start, end))
+
+        vectorized = {row['key']: row['profit'] for row in report['by_product']}
+        exact = all(vectorized.get(name) == profit for name, profit in looped.items())
+        self.stdout.write(
+            self.style.SUCCESS("النتائج متطابقة مع الحلقة (بدقة القرش).") if exact
+            else self.style.ERROR("اختلاف بين نتائج numpy والحلقة!")
+        )
+        drift = max((abs(float(grouped[name]) - float(profit)) for name, profit in looped.items()), default=0)
+        self.stdout.write(f"أقصى فرق في GROUP BY (حساب float داخل SQLite): {drift:.6f}")
@@ -0,0 +1,113 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from store.backup import database_path, online_backup
+
+
+class Writer(threading.Thread):
+    """يكتب صفاً في معاملة مستقلة كل interval ثانية ويسجل زمن كل كتابة (مثل حفظ فاتورة)"""
+
+    def __init__(self, path, interval):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.stop = threading.Event()
+        self.samples = []
+
+    def run(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("CREATE TABLE IF NOT EXISTS benchmark_writes (id INTEGER PRIMARY KEY, payload TEXT)")
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT INTO benchmark_writes (payload) VALUES (?)", ('x' * 200,))
+            db.execute("COMMIT")
+            self.samples.append((start, (time.perf_counter() - start) * 1000))
+            self.stop.wait(self.interval)
+        db.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "أثر النسخ الاحتياطي على زمن الكتابة: كاتب بمعدل ثابت على نسخة مؤقتة من القاعدة أثناء "
+        "النسخ في دفعة واحدة وعلى دفعات (في وضعي journal وWAL)، مقارنة بالكتابة بدون نسخ"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source-db', help="القاعدة المنسوخة للقياس (الافتراضي: القاعدة الحالية، ولا تُعدل)")
+        parser.add_argument('--size-mb', type=int, default=100, help="تكبير النسخة المؤقتة إلى هذا الحجم حتى يظهر أثر النسخ")
+        parser.add_argument('--interval', type=float, default=20, help="الزمن بين كل كتابتين بالمللي ثانية")
+        parser.add_argument('--pages', type=int, default=256, help="عدد الصفحات في كل دفعة")
+        parser.add_argument('--pause', type=float, default=50, help="الاستراحة بين الدفعات بالمللي ثانية")
+        parser.add_argument('--idle', type=float, default=2, help="مدة قياس الكتابة بدون نسخ بالثواني")
+
+    def handle(self, *args, **options):
+        source = options['source_db'] or database_path()
+        modes = [
+            ('بدون نسخ', None),
+            ('دفعة واحدة', {'pages': -1, 'pause': 0}),
+            (f"دفعات {options['pages']} صفحة", {'pages': options['pages'], 'pause': options['pause'] / 1000}),
+        ]
+        with tempfile.TemporaryDirectory(prefix='benchmark-backup-') as workdir:
+            path = Path(workdir) / 'db.sqlite3'
+            online_backup(source, path, pages=-1)
+            self.inflate(path, options['size_mb'])
+            self.stdout.write(f"حجم القاعدة المؤقتة: {path.stat().st_size / 1024 / 1024:,.0f} MB")
+
+            rows = []
+            # نفس القياس في وضعي journal العادي وWAL (الافتراضي في الإعدادات)
+            for journal in ('delete', 'wal'):
+                with closing(sqlite3.connect(path)) as db:
+                    db.execute(f"PRAGMA journal_mode={journal}")
+                for label, backup in modes:
+                    target = Path(workdir) / 'backup.sqlite3'
+                    target.unlink(missing_ok=True)
+                    rows.append((f"{journal}: {label}", *self.measure(path, target, backup, options)))
+        self.report(rows)
+
+    def inflate(self, path, size_mb):
+        with closing(sqlite3.connect(path)) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS benchmark_padding (data BLOB)")
+            missing = size_mb * 1024 * 1024 - path.stat().st_size
+            if missing > 0:
+                db.executemany(
+                    "INSERT INTO benchmark_padding VALUES (randomblob(65536))", [()] * (missing // 65536)
+                )
+
+    def measure(self, path, target, backup, options):
+        writer = Writer(path, options['interval'] / 1000)
+        writer.start()
+        time.sleep(0.5)
+        start = time.perf_counter()
+        stats = None
+        if backup is None:
+            time.sleep(options['idle'])
+        else:
+            stats = online_backup(path, target, **backup)
+        end = time.perf_counter()
+        writer.stop.set()
+        writer.join()
+
+        # الكتابات التي بدأت أثناء النسخ فقط
+        timings = [ms for started, ms in writer.samples if start <= started <= end] or [0.0]
+        return timings, stats
+
+    def report(self, rows):
+        self.stdout.write(
+            f"\n{'':<28}{'كتابات':>8}{'p50 ms':>10}{'p95 ms':>10}{'أقصى ms':>10}{'زمن النسخ':>12}{'إعادات':>8}"
+        )
+        for label, timings, stats in rows:
+            p95 = statistics.quantiles(timings, n=20, method='inclusive')[-1] if len(timings) > 1 else timings[0]
+            backup = f"{stats['seconds']:>11.2f}s{stats['restarts']:>8}" if stats else f"{'-':>12}{'-':>8}"
+            if stats and stats['single_step'] and stats['restarts']:
+                backup += "  (انتهى بدفعة واحدة)"
+            self.stdout.write(
+                f"{label:<28}{len(timings):>8}{statistics.median(timings):>10.1f}{p95:>10.1f}{max(timings):>10.1f}{backup}"
+            )
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from store.models import Contact
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+class Command(BaseCommand):
+    help = "قياس حجم الرد وزمن وصول آخر بايت لصفحات التقارير على قاعدة بيانات تجريبية مؤقتة"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contacts', type=int, default=50, help="عدد التجار في البيانات التجريبية")
+        parser.add_argument('--transactions', type=int, default=5000, help="عدد الحركات في البيانات التجريبية")
+        parser.add_argument('--repeat', type=int, default=5, help="عدد مرات تكرار كل طلب (يُعرض الوسيط)")
+
+    def handle(self, *args, **options):
+        # القياس على نسخة اختبار مؤقتة حتى لا تُلمس قاعدة البيانات الحقيقية
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command('seed_demo', contacts=options['contacts'], transactions=options['transactions'], stdout=self.stdout)
+            self.benchmark(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def pages(self):
+        busiest = Contact.objects.annotate(n=Count('dailytransaction')).order_by('-n').first()
+        return {
+            'dashboard': reverse('dashboard'),
+            'transactions': reverse('transactions_list'),
+            'admin_logs': reverse('admin_logs'),
+            'contact_detail': reverse('contact_detail', args=[busiest.pk]),
+            'bank_statement': reverse('bank_statement'),
+        }
+
+    def benchmark(self, repeat):
+        client = Client()
+        client.force_login(User.objects.get(username='admin'))
+
+        self.stdout.write(f"\n{'الصفحة':<16}{'الترميز':<10}{'الحجم (بايت)':>14}{'النسبة':>9}{'آخر بايت (ms)':>16}")
+        for name, url in self.pages().items():
+            raw_size = None
+            for encoding in ENCODINGS:
+                timings, size = [], 0
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                    body = b''.join(response) if response.streaming else response.content
+                    timings.append((time.perf_counter() - start) * 1000)
+                    size = len(body)
+                if response.status_code != 200:
+                    self.stderr.write(self.style.ERROR(f"{name}: HTTP {response.status_code}"))
+                    break
+                raw_size = raw_size or size
+                served = response.get('Content-Encoding', 'identity')
+                self.stdout.write(
+                    f"{name:<16}{served:<10}{size:>14,}{size / raw_size:>9.1%}{statistics.median(timings):>16.1f}"
+                )
@@ -0,0 +1,106 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from store.models import BankLoan, Contact, ContactExpense, FinancialRecord
+from store.reports import outstanding_balances
+
+
+class Command(BaseCommand):
+    help = "عدد الاستعلامات وزمن صفحات التقارير مع أحجام بيانات مختلفة (العدد يجب أن يبقى ثابتاً)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="أعداد الحركات المطلوب مقارنتها")
+        parser.add_argument('--contacts', type=int, default=50, help="عدد التجار في البيانات التجريبية")
+        parser.add_argument('--repeat', type=int, default=3, help="عدد مرات تكرار كل طلب (يُعرض الوسيط)")
+
+    def handle(self, *args, **options):
+        results = {}
+        # القياس على نسخة اختبار مؤقتة حتى لا تُلمس قاعدة البيانات الحقيقية، وتُفرغ قبل كل حجم
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for size in options['sizes']:
+                call_command('flush', interactive=False, verbosity=0)
+                call_command('seed_demo', contacts=options['contacts'], transactions=size, stdout=self.stdout)
+                results[size] = self.benchmark(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+
+    def pages(self):
+        busiest = Contact.objects.annotate(n=Count('dailytransaction')).order_by('-n').first()
+        pages = {
+            'dashboard': reverse('dashboard'),
+            'transactions': reverse('transactions_list') + '?period=all',
+            'contact_detail': reverse('contact_detail', args=[busiest.pk]),
+            'admin_logs': reverse('admin_logs'),
+            'bank_statement': reverse('bank_statement'),
+        }
+        loan = BankLoan.objects.first()
+        if loan:
+            pages['loan_statement'] = reverse('bank_loan_statement', args=[loan.pk])
+        return pages
+
+    def measure(self, func, repeat):
+        """(عدد الاستعلامات، وسيط الزمن بالملي ثانية)"""
+        timings = []
+        for _ in range(repeat):
+            # عداد بدلاً من CaptureQueriesContext لأن سجل الاستعلامات لا يحتفظ إلا بآخر 9000
+            count = [0]
+
+            def counter(execute, sql, params, many, context):
+                count[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+        return count[0], statistics.median(timings)
+
+    def benchmark(self, repeat):
+        client = Client()
+        client.force_login(User.objects.get(username='admin'))
+
+        def get(url):
+            response = client.get(url)
+            assert response.status_code == 200, f"{url}: HTTP {response.status_code}"
+
+        rows = {name: self.measure(lambda url=url: get(url), repeat) for name, url in self.pages().items()}
+
+        # للمقارنة: المقاصة بالطريقة السابقة (كائن لكل فاتورة ومصروف) ضد التجميع داخل قاعدة البيانات
+        rows['netting (loop)'] = self.measure(netting_loop, repeat)
+        rows['netting (aggregate)'] = self.measure(outstanding_balances, repeat)
+        return rows
+
+    def report(self, results):
+        sizes = list(results)
+        self.stdout.write('\n' + f"{'':<22}" + ''.join(f"{f'{size:,} حركة':>24}" for size in sizes))
+        self.stdout.write(f"{'':<22}" + ''.join(f"{'استعلام':>12}{'ms':>12}" for _ in sizes))
+        for name in results[sizes[0]]:
+            cells = ''.join(f"{results[size][name][0]:>12,}{results[size][name][1]:>12,.1f}" for size in sizes)
+            self.stdout.write(f"{name:<22}{cells}")
+
+
+def netting_loop():
+    balances = {}
+    for rec in FinancialRecord.objects.all():
+        if rec.remaining_amount > 0:
+            cid = rec.transaction.contact.id
+            sign = 1 if rec.transaction.transaction_type == 'out' else -1
+            balances[cid] = balances.get(cid, Decimal(0)) + sign * rec.remaining_amount
+    for exp in ContactExpense.objects.all():
+        cid = exp.contact.id
+        balances[cid] = balances.get(cid, Decimal(0)) + (exp.amount if exp.payer_type == 'us' else -exp.amount)
+    return balances
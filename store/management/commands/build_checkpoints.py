@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.periods import build_checkpoints
+
+
+class Command(BaseCommand):
+    help = "بناء اللقطات التلقائية الناقصة لنهاية كل شهر مكتمل (لتسريع أرصدة \"حتى تاريخ\"). يُشغل يومياً من cron"
+
+    def handle(self, *args, **options):
+        built = build_checkpoints()
+        self.stdout.write(self.style.SUCCESS(f"تم بناء {built} لقطة."))
@@ -0,0 +1,100 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ICON_PATTERN = re.compile(r'\bfa-[a-z0-9-]+')
+OUTPUT_DIR = settings.BASE_DIR / 'static' / 'vendor' / 'fontawesome'
+FONTS = {
+    # (ملف الخط الأصلي، الوزن)
+    'fa-solid-900.woff2': 900,
+    'fa-regular-400.woff2': 400,
+}
+
+
+def top_level_blocks(css):
+    """تقسيم ملف CSS إلى قواعد المستوى الأعلى (selector, body) مع تجاهل ما بداخل @keyframes و @media"""
+    blocks, depth, start = [], 0, 0
+    for i, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                block = css[start:i + 1].strip()
+                selector, body = block.split('{', 1)
+                blocks.append((selector.strip(), body[:-1].strip()))
+                start = i + 1
+    return blocks
+
+
+class Command(BaseCommand):
+    help = "توليد نسخة مصغرة من Font Awesome تحتوي فقط الأيقونات المستخدمة في القوالب (أعد تشغيله عند إضافة أيقونة جديدة)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help="مجلد fontawesome-free (الافتراضي: من حزمة fontawesomefree)")
+
+    def handle(self, *args, **options):
+        try:
+            from fontTools import subset
+        except ImportError:
+            raise CommandError("الأمر يتطلب: pip install fonttools brotli fontawesomefree")
+
+        source = Path(options['source']) if options['source'] else self.default_source()
+        used = self.used_classes()
+
+        css = re.sub(r'/\*.*?\*/', '', (source / 'css' / 'fontawesome.css').read_text(), flags=re.S)
+        kept, codepoints = [], set()
+        for selector, body in top_level_blocks(css):
+            if selector.startswith('@'):
+                continue
+            selectors = [s.strip() for s in selector.split(',')]
+            selectors = [s for s in selectors if set(ICON_PATTERN.findall(s)) <= used]
+            if not selectors:
+                continue
+            kept.append(f"{','.join(selectors)}{{{' '.join(body.split())}}}")
+            codepoints.update(int(cp, 16) for cp in re.findall(r'content:\s*"\\([0-9a-f]+)"', body))
+
+        (OUTPUT_DIR / 'css').mkdir(parents=True, exist_ok=True)
+        (OUTPUT_DIR / 'webfonts').mkdir(parents=True, exist_ok=True)
+
+        font_faces = []
+        for font_file, weight in FONTS.items():
+            subset_options = subset.Options()
+            subset_options.flavor = 'woff2'
+            subset_options.layout_features = []
+            font = subset.load_font(str(source / 'webfonts' / font_file), subset_options)
+            subsetter = subset.Subsetter(subset_options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(font)
+            subset.save_font(font, str(OUTPUT_DIR / 'webfonts' / font_file), subset_options)
+            font_faces.append(
+                "@font-face{font-family:'Font Awesome 6 Free';font-style:normal;font-weight:%d;font-display:block;"
+                "src:url(\"../webfonts/%s\") format(\"woff2\")}" % (weight, font_file)
+            )
+
+        header = (
+            "/*! Font Awesome Free 6 | https://fontawesome.com/license/free (Icons: CC BY 4.0, Fonts: SIL OFL 1.1, Code: MIT License)\n"
+            " * نسخة مولدة بأمر build_icons تحتوي فقط الأيقونات المستخدمة. لا تعدلها يدوياً. */\n"
+        )
+        weights = ".fas,.fa-solid{font-weight:900}.far,.fa-regular{font-weight:400}"
+        (OUTPUT_DIR / 'css' / 'icons.min.css').write_text(header + ''.join(font_faces) + weights + ''.join(kept) + '\n')
+
+        self.stdout.write(self.style.SUCCESS(f"تم توليد {len(codepoints)} أيقونة في {OUTPUT_DIR}"))
+
+    def default_source(self):
+        try:
+            import fontawesomefree
+        except ImportError:
+            raise CommandError("حدد --source أو ثبت الحزمة: pip install fontawesomefree")
+        return Path(fontawesomefree.__file__).parent / 'static' / 'fontawesomefree'
+
+    def used_classes(self):
+        used = set()
+        roots = [settings.BASE_DIR / 'templates', settings.BASE_DIR / 'store', settings.BASE_DIR / 'static' / 'js']
+        for root in roots:
+            for path in root.rglob('*'):
+                if path.suffix in ('.html', '.py', '.js') and path.is_file():
+                    used.update(ICON_PATTERN.findall(path.read_text(encoding='utf-8')))
+        return used
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import PeriodClose
+from store.periods import month_bounds, close_period, reopen_period
+
+
+class Command(BaseCommand):
+    help = "إقفال شهر (تجميد أرصدة الخزنة والتجار والمخزون والقروض) أو إعادة فتحه. مثال: close_period 2026-01"
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', nargs='?', help="الشهر بصيغة YYYY-MM")
+        parser.add_argument('--reopen', action='store_true', help="إعادة فتح الشهر للسماح بتعديل حركاته")
+        parser.add_argument('--list', action='store_true', help="عرض الفترات المقفلة")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for period in PeriodClose.objects.order_by('period_end'):
+                self.stdout.write(f"{period} | خزنة: {period.cash_balance} | أصل القروض: {period.loan_principal_remaining}")
+            return
+
+        if not options['month']:
+            raise CommandError("يجب تحديد الشهر بصيغة YYYY-MM")
+        try:
+            year, month = (int(part) for part in options['month'].split('-'))
+            period_start, period_end = month_bounds(year, month)
+        except ValueError:
+            raise CommandError("صيغة الشهر غير صحيحة، استخدم YYYY-MM")
+
+        if options['reopen']:
+            period = PeriodClose.objects.filter(period_end=period_end, is_closed=True).first()
+            if not period:
+                raise CommandError("هذه الفترة غير مغلقة.")
+            try:
+                reopen_period(period)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.WARNING(f"تمت إعادة فتح الفترة {period_start} - {period_end}."))
+            return
+
+        if PeriodClose.objects.filter(period_end=period_end, is_closed=True).exists():
+            raise CommandError("هذه الفترة مغلقة بالفعل. استخدم --reopen أولاً لإعادة الإقفال.")
+
+        period = close_period(period_start, period_end)
+        self.stdout.write(self.style.SUCCESS(
+            f"تم إقفال الفترة {period_start} - {period_end}: "
+            f"خزنة {period.cash_balance}، {period.contact_balances.count()} تاجر، {period.product_stocks.count()} منتج."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from store.alerts import refresh_alerts, notify_pending
+
+
+class Command(BaseCommand):
+    help = "حساب التنبيهات اليومية (أقساط البنك، الفواتير المتأخرة، المخزون المنخفض) وإرسال الجديد منها بالبريد"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-email', action='store_true', help="تحديث جدول التنبيهات فقط بدون إرسال بريد")
+
+    def handle(self, *args, **options):
+        created, updated, resolved = refresh_alerts()
+        self.stdout.write(self.style.SUCCESS(
+            f"تنبيهات جديدة: {len(created)}، محدثة: {len(updated)}، انتهت: {resolved}."
+        ))
+
+        if options['no_email']:
+            return
+        sent = notify_pending()
+        if sent:
+            self.stdout.write(self.style.SUCCESS(f"تم إرسال {sent} تنبيه بالبريد."))
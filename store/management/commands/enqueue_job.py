@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.jobs import TASKS, enqueue
+
+
+class Command(BaseCommand):
+    help = "وضع مهمة في طابور المهام الخلفية (للجدولة من cron)، مثلاً: enqueue_job export_analytics full=true"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="اسم المهمة")
+        parser.add_argument('payload', nargs='*', help="معاملات المهمة بصيغة key=value (القيمة JSON أو نص)")
+
+    def handle(self, *args, **options):
+        if options['name'] not in TASKS:
+            raise CommandError(f"مهمة غير معروفة: {options['name']}. المتاح: {', '.join(sorted(TASKS))}")
+
+        payload = {}
+        for item in options['payload']:
+            key, sep, value = item.partition('=')
+            if not sep or not key:
+                raise CommandError(f"معامل غير صحيح: {item} (الصيغة key=value)")
+            try:
+                payload[key] = json.loads(value)
+            except ValueError:
+                payload[key] = value
+
+        job = enqueue(options['name'], **payload)
+        self.stdout.write(self.style.SUCCESS(f"تمت إضافة المهمة {job.name} #{job.pk} إلى الطابور."))
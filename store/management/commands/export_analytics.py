@@ -0,0 +1,36 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "تصدير الحركات والدفعات والمصروفات والإيرادات وأقساط البنك إلى ملفات Parquet للتحليل"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'analytics'), help="مجلد الحفظ")
+        parser.add_argument('--full', action='store_true', help="حذف التصدير السابق وإعادة تصدير كل الصفوف")
+        parser.add_argument('--tables', nargs='+', help="جداول محددة (الافتراضي: الكل)")
+        parser.add_argument('--row-group-size', type=int, default=50_000, help="عدد الصفوف في كل دفعة / row group")
+
+    def handle(self, *args, **options):
+        try:
+            from store.exports import TABLES, export_all
+        except ImportError:
+            raise CommandError("التصدير إلى Parquet يتطلب تثبيت pyarrow: pip install pyarrow")
+
+        unknown = set(options['tables'] or []) - set(TABLES)
+        if unknown:
+            raise CommandError(f"جداول غير معروفة: {', '.join(sorted(unknown))}. المتاح: {', '.join(TABLES)}")
+
+        start = time.perf_counter()
+        exported = export_all(
+            options['output'], full=options['full'], tables=options['tables'],
+            row_group_size=options['row_group_size'],
+        )
+        for name, count in exported.items():
+            self.stdout.write(f"{name}: {count} صف جديد")
+        self.stdout.write(self.style.SUCCESS(
+            f"تم التصدير إلى {Path(options['output'])} في {time.perf_counter() - start:.1f} ثانية."
+        ))
@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from store.models import Contact
+from store.statements import (
+    fingerprints, load_statements, render_statement, read_manifest, write_manifest, init_worker,
+)
+
+
+class Command(BaseCommand):
+    help = "توليد كشوف حساب (HTML و PDF اختيارياً) لكل التجار أو لتجار محددين باستخدام عدة عمليات"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contacts', nargs='+', type=int, help="أرقام التجار (الافتراضي: الكل)")
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'statements'), help="مجلد الحفظ")
+        parser.add_argument('--pdf', action='store_true', help="توليد PDF أيضاً (يتطلب مكتبة weasyprint)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="عدد العمليات")
+        parser.add_argument('--force', action='store_true', help="إعادة توليد كل الكشوف حتى غير المتغيرة")
+
+    def handle(self, *args, **options):
+        if options['pdf']:
+            try:
+                import weasyprint  # noqa: F401
+            except ImportError:
+                raise CommandError("توليد PDF يتطلب تثبيت weasyprint: pip install weasyprint")
+
+        output_dir = Path(options['output'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        contact_ids = options['contacts'] or list(Contact.objects.values_list('pk', flat=True))
+        current = fingerprints(contact_ids)
+        manifest = read_manifest(output_dir)
+
+        # تخطي التجار الذين لم تتغير بياناتهم منذ آخر تشغيل
+        changed = [
+            cid for cid in contact_ids
+            if options['force'] or manifest.get(str(cid)) != current[cid]
+            or not (output_dir / f"statement_{cid}.html").exists()
+        ]
+        skipped = len(contact_ids) - len(changed)
+        if not changed:
+            self.stdout.write(self.style.SUCCESS(f"لا يوجد تغيير. تم تخطي {skipped} كشف."))
+            return
+
+        statements = load_statements(changed)
+        generated_at = timezone.localtime()
+
+        # العمليات الفرعية لا تحتاج اتصالاً بقاعدة البيانات، ولا يجوز توريث اتصال مفتوح
+        connections.close_all()
+
+        done, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+            futures = {
+                pool.submit(render_statement, statement, str(output_dir), generated_at, options['pdf']): cid
+                for cid, statement in statements.items()
+            }
+            for future in as_completed(futures):
+                cid = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(self.style.ERROR(f"فشل كشف التاجر #{cid}: {e}"))
+                else:
+                    done += 1
+                    manifest[str(cid)] = current[cid]
+
+        write_manifest(output_dir, manifest)
+        self.stdout.write(self.style.SUCCESS(
+            f"تم توليد {done} كشف في {output_dir} (تم تخطي {skipped} بدون تغيير{f'، فشل {failed}' if failed else ''})."
+        ))
@@ -0,0 +1,304 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# (اسم الطلب، الوزن النسبي): أغلب الاستخدام قراءة الصفحات، مع إدخال حركات ودفعات
+MIX = [
+    ('dashboard', 3),
+    ('transactions_list', 3),
+    ('contact_detail', 3),
+    ('add_transaction_direct', 1),
+    ('update_paid_amount', 1),
+]
+# القيم المقارنة مع الـ baseline: الزمن يتراجع إذا زاد، والإنتاجية إذا قلت
+LATENCY_KEYS = ['p50', 'p95', 'p99']
+
+
+def percentiles(timings):
+    if len(timings) < 2:
+        value = timings[0] if timings else 0.0
+        return {key: value for key in LATENCY_KEYS}
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def summarize(samples, seconds):
+    """samples: [(الزمن بالمللي ثانية، نجح؟)] -> عدد الطلبات والأخطاء والإنتاجية والزمن"""
+    timings = [ms for ms, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok in samples if not ok),
+        'rps': round(len(samples) / seconds, 2) if seconds else 0.0,
+        **{key: round(value, 1) for key, value in percentiles(timings).items()},
+    }
+
+
+class Worker(threading.Thread):
+    """مستخدم افتراضي بجلسة دخول مستقلة يرسل طلبات من MIX حتى انتهاء الوقت"""
+
+    def __init__(self, base_url, credentials, ids, clock, seed):
+        super().__init__(daemon=True)
+        self.session = requests.Session()
+        self.base_url = base_url
+        self.credentials = credentials
+        self.ids = ids
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.samples = defaultdict(list)
+        self.error = None
+
+    def login(self):
+        url = f"{self.base_url}/login/"
+        self.session.get(url)
+        response = self.session.post(url, data={
+            'username': self.credentials[0],
+            'password': self.credentials[1],
+            'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+        }, headers={'Referer': url}, allow_redirects=False)
+        if response.status_code != 302:
+            raise CommandError("فشل تسجيل الدخول: تحقق من --username و --password")
+
+    def request(self, name):
+        contact = self.rng.choice(self.ids['contacts'])
+        page = f"{self.base_url}/contact/{contact}/"
+        if name == 'dashboard':
+            return self.session.get(f"{self.base_url}/")
+        if name == 'transactions_list':
+            return self.session.get(f"{self.base_url}/transactions/", params={'page': self.rng.randint(1, 20)})
+        if name == 'contact_detail':
+            return self.session.get(page)
+
+        token = self.session.cookies.get('csrftoken', '')
+        headers = {'Referer': page}
+        if name == 'add_transaction_direct':
+            # شراء (وارد) حتى لا يرفض الطلب لنقص المخزون
+            data = {
+                'contact_id': contact, 'product_id': self.rng.choice(self.ids['products']),
+                'transaction_type': 'in', 'date': timezone.localdate().isoformat(),
+                'weight': self.rng.randint(1, 50), 'price_per_kg': self.rng.randint(10, 30), 'amount_paid_now': 0,
+            }
+            url = f"{self.base_url}/contact/add-transaction/"
+        else:
+            data = {'amount_paid': 1, 'date': timezone.localdate().isoformat()}
+            url = f"{self.base_url}/update-paid/{self.rng.choice(self.ids['records'])}/"
+        data['csrfmiddlewaretoken'] = token
+        # قياس الطلب نفسه فقط بدون تحميل الصفحة التي يحول إليها
+        return self.session.post(url, data=data, headers=headers, allow_redirects=False)
+
+    def run(self):
+        names, weights = zip(*MIX)
+        try:
+            self.login()
+        except Exception as e:
+            self.error = e
+        # يبدأ الوقت بعد دخول كل المستخدمين (تشفير كلمة المرور بطيء عمداً ولا يُحسب في القياس)
+        self.clock.wait()
+        if self.error:
+            return
+        try:
+            while True:
+                name = self.rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                if start >= self.clock.deadline:
+                    break
+                try:
+                    response = self.request(name)
+                    ok = response.status_code < 400 and not response.headers.get('Location', '').startswith('/login/')
+                except OSError:
+                    ok = False
+                if start >= self.clock.record_after:
+                    self.samples[name].append(((time.perf_counter() - start) * 1000, ok))
+        except Exception as e:
+            self.error = e
+
+
+class Command(BaseCommand):
+    help = (
+        "اختبار تحميل: تشغيل السيرفر على نسخة من قاعدة بيانات تجريبية وإرسال طلبات متزامنة، ثم قياس "
+        "الطلبات/ثانية وزمن الاستجابة (p50/p95/p99) لكل صفحة ومقارنتها بملف baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="عدد المستخدمين المتزامنين")
+        parser.add_argument('--duration', type=float, default=30, help="مدة القياس بالثواني")
+        parser.add_argument('--warmup', type=float, default=3, help="ثوان أولى لا تُحسب في النتائج")
+        parser.add_argument('--source-db', help="نسخ قاعدة بيانات موجودة بدلاً من تعبئة بيانات تجريبية (لا تُعدل الأصلية)")
+        parser.add_argument('--contacts', type=int, default=50, help="عدد التجار في البيانات التجريبية")
+        parser.add_argument('--transactions', type=int, default=20000, help="عدد الحركات في البيانات التجريبية")
+        parser.add_argument('--username', default='admin', help="مستخدم superuser للدخول (البيانات التجريبية: admin)")
+        parser.add_argument('--password', default='admin')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--baseline', default=str(settings.BASE_DIR / 'loadtest_baseline.json'),
+            help="ملف النتائج المرجعية للمقارنة",
+        )
+        parser.add_argument('--save', action='store_true', help="حفظ نتائج هذا التشغيل كـ baseline جديد")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="نسبة التراجع المسموحة قبل اعتبار النتيجة تراجعاً (0.25 = 25%%)",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+            env = {
+                **os.environ,
+                'STORE_DB_PATH': str(Path(workdir) / 'db.sqlite3'),
+                'STORE_CACHE_DIR': str(Path(workdir) / 'cache'),
+            }
+            self.prepare_database(env, options)
+            ids = self.load_ids(env['STORE_DB_PATH'])
+            server = self.start_server(env, options['port'])
+            try:
+                results = self.run_load(f"http://127.0.0.1:{options['port']}", ids, options)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+        self.print_results(results)
+        self.compare(results, options)
+
+    def manage(self, env, *args):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"فشل {' '.join(args[:1])}:\n{completed.stderr[-2000:]}")
+
+    def prepare_database(self, env, options):
+        target = env['STORE_DB_PATH']
+        if options['source_db']:
+            # backup API ينسخ نسخة متسقة حتى لو كانت القاعدة الأصلية مستخدمة
+            source = sqlite3.connect(f"file:{options['source_db']}?mode=ro", uri=True)
+            with sqlite3.connect(target) as copy:
+                source.backup(copy)
+            source.close()
+            self.manage(env, 'migrate', '--noinput', '-v0')
+            return
+        self.stdout.write(f"تجهيز قاعدة بيانات تجريبية ({options['transactions']:,} حركة)...")
+        self.manage(env, 'migrate', '--noinput', '-v0')
+        self.manage(env, 'seed_demo', '--contacts', str(options['contacts']), '--transactions', str(options['transactions']))
+
+    def load_ids(self, path):
+        with sqlite3.connect(path) as db:
+            ids = {
+                'contacts': [row[0] for row in db.execute("SELECT id FROM store_contact")],
+                'products': [row[0] for row in db.execute("SELECT id FROM store_product")],
+                'records': [row[0] for row in db.execute("SELECT id FROM store_financialrecord ORDER BY id DESC LIMIT 5000")],
+            }
+        empty = [name for name, values in ids.items() if not values]
+        if empty:
+            raise CommandError(f"قاعدة البيانات لا تحتوي: {', '.join(empty)}")
+        return ids
+
+    def start_server(self, env, port):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'127.0.0.1:{port}', '--noreload']
+        # سجل الطلبات في ملف وليس PIPE: امتلاء الـ PIPE بدون قراءة يوقف السيرفر في منتصف القياس
+        log = Path(env['STORE_DB_PATH']).with_name('server.log')
+        with open(log, 'wb') as output:
+            server = subprocess.Popen(command, env=env, stdout=output, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"توقف السيرفر:\n{log.read_text()[-2000:]}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"السيرفر لم يبدأ على المنفذ {port} خلال 30 ثانية")
+
+    def run_load(self, base_url, ids, options):
+        self.stdout.write(
+            f"تشغيل {options['workers']} مستخدم لمدة {options['duration']:.0f} ثانية "
+            f"(+{options['warmup']:.0f} تسخين) على {base_url}..."
+        )
+        def start_clock():
+            clock.record_after = time.perf_counter() + options['warmup']
+            clock.deadline = clock.record_after + options['duration']
+
+        clock = threading.Barrier(options['workers'], action=start_clock)
+        workers = [
+            Worker(base_url, (options['username'], options['password']), ids, clock, seed)
+            for seed in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        failed = [worker.error for worker in workers if worker.error]
+        if failed:
+            raise CommandError(f"فشل {len(failed)} من المستخدمين: {failed[0]}")
+
+        samples = defaultdict(list)
+        for worker in workers:
+            for name, values in worker.samples.items():
+                samples[name].extend(values)
+        seconds = options['duration']
+        return {
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'config': {
+                key: options[key] for key in ('workers', 'duration', 'source_db', 'contacts', 'transactions')
+            },
+            'total': summarize([s for values in samples.values() for s in values], seconds),
+            'endpoints': {name: summarize(samples[name], seconds) for name, _ in MIX if samples[name]},
+        }
+
+    def print_results(self, results):
+        self.stdout.write(f"\n{'الطلب':<26}{'العدد':>8}{'أخطاء':>8}{'طلب/ث':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+        rows = [*results['endpoints'].items(), ('الإجمالي', results['total'])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:<26}{row['requests']:>8,}{row['errors']:>8,}{row['rps']:>9.1f}"
+                f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+            )
+        if results['total']['errors']:
+            self.stdout.write(self.style.WARNING(f"تحذير: {results['total']['errors']} طلب فشل."))
+
+    def compare(self, results, options):
+        path = Path(options['baseline'])
+        if options['save']:
+            path.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"تم حفظ النتائج كمرجع في {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(f"لا يوجد ملف مرجعي ({path}). شغل الأمر مع --save لإنشائه.")
+            return
+
+        baseline = json.loads(path.read_text())
+        if baseline.get('config') != results['config']:
+            self.stdout.write(self.style.WARNING("إعدادات التشغيل تختلف عن الملف المرجعي، المقارنة تقريبية."))
+
+        tolerance = options['tolerance']
+        regressions = []
+        rows = [*results['endpoints'].items(), ('الإجمالي', results['total'])]
+        for name, row in rows:
+            old = baseline['total'] if name == 'الإجمالي' else baseline.get('endpoints', {}).get(name)
+            if not old:
+                continue
+            for key in LATENCY_KEYS:
+                if old[key] and row[key] > old[key] * (1 + tolerance):
+                    regressions.append(f"{name} {key}: {old[key]:.1f} -> {row[key]:.1f} ms")
+            if old['rps'] and row['rps'] < old['rps'] * (1 - tolerance):
+                regressions.append(f"{name} طلب/ث: {old['rps']:.1f} -> {row['rps']:.1f}")
+
+        if regressions:
+            raise CommandError("تراجع في الأداء مقارنة بـ {} ({}):\n{}".format(
+                path.name, baseline.get('created', ''), '\n'.join(regressions)
+            ))
+        self.stdout.write(self.style.SUCCESS(f"لا يوجد تراجع مقارنة بـ {path.name} (السماحية {tolerance:.0%})."))
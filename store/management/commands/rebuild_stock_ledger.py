@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.reconcile import reconcile
+from store.stock import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "إعادة بناء دفتر حركة المخزون من اليومية والأرشيف (بعد إدخال فواتير بـ bulk_create أو استيراد). "
+        "التسويات اليدوية تبقى، وتفاصيل التعديل والحذف السابقة تُدمج في حركة واحدة لكل فاتورة"
+    )
+
+    def handle(self, *args, **options):
+        result = rebuild_ledger()
+        self.stdout.write(self.style.SUCCESS(
+            f"تم بناء {result['movements']} حركة فواتير و{result['adjusted']} تسوية لفرق الكمية المتاحة."
+        ))
+        found = reconcile(['stock', 'ledger'])
+        for name, rows in found.items():
+            if rows:
+                self.stdout.write(self.style.ERROR(f"[{name}] {len(rows)} فرق بعد البناء."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.reconcile import CHECKS, reconcile
+
+
+class Command(BaseCommand):
+    help = "مطابقة الأرصدة المشتقة (المدفوع، المخزون ودفتر حركته، الخزنة) مع مصادرها وتصحيحها اختيارياً"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="تصحيح الفروقات بدلاً من عرضها فقط")
+        parser.add_argument('--only', nargs='+', choices=list(CHECKS), help="تشغيل فحوص محددة فقط")
+        parser.add_argument('--database', default='default', help="قاعدة البيانات المستهدفة")
+        parser.add_argument('--limit', type=int, default=20, help="عدد الأمثلة المعروضة لكل فحص")
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options['database']):
+            results = reconcile(options['only'], apply=options['fix'], using=options['database'])
+
+        total = 0
+        for name, found in results.items():
+            if found is None:
+                self.stdout.write(self.style.WARNING(f"[{name}] تم التخطي (لا توجد فترة مغلقة كنقطة مرجعية)."))
+                continue
+            if not found:
+                self.stdout.write(self.style.SUCCESS(f"[{name}] مطابق."))
+                continue
+            total += len(found)
+            self.stdout.write(self.style.ERROR(f"[{name}] {len(found)} فرق:"))
+            for d in found[:options['limit']]:
+                self.stdout.write(f"    {d.label}: المسجل {d.stored} | الصحيح {d.expected} | الفرق {d.expected - d.stored}")
+
+        if total and options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"تم تصحيح {total} قيمة."))
+        elif total:
+            raise CommandError(f"توجد {total} قيمة غير مطابقة. أعد التشغيل مع --fix لتصحيحها.")
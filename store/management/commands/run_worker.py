@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.jobs import claim_next, run_job, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "تشغيل عامل المهام الخلفية (إعادة الحسابات الثقيلة، التصدير، تجهيز التقارير)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=2, help="ثواني الانتظار عندما يكون الطابور فارغاً")
+        parser.add_argument('--burst', action='store_true', help="تنفيذ كل المهام المستحقة ثم الخروج (مناسب لـ cron)")
+        parser.add_argument('--stale-minutes', type=int, default=30, help="إرجاع المهام العالقة أطول من هذه المدة إلى الطابور")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        requeued = requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"تمت إعادة {requeued} مهمة عالقة إلى الطابور."))
+
+        self.stdout.write("العامل يعمل... (Ctrl+C للإيقاف)")
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next()
+                if job is None:
+                    if options['burst']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                started = time.monotonic()
+                job = run_job(job)
+                elapsed = time.monotonic() - started
+                style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+                self.stdout.write(style(f"[{job.get_status_display()}] {job.name} #{job.pk} ({elapsed:.2f}s)"))
+        except KeyboardInterrupt:
+            self.stdout.write("تم إيقاف العامل.")
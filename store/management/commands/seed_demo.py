@@ -0,0 +1,114 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import (
+    Contact, Product, DailyTransaction, FinancialRecord, PaymentInstallment,
+    ContactExpense, HomeExpense, IncomeRecord, Capital, BankLoan,
+)
+from store.reconcile import reconcile
+from store.stock import rebuild_ledger
+
+PRODUCTS = ['بطاطس', 'طماطم', 'بصل', 'ثوم', 'خيار', 'فلفل', 'جزر', 'كوسة', 'باذنجان', 'ليمون']
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "تعبئة قاعدة بيانات فارغة ببيانات تجريبية بحجم محدد (لقياس الأداء فقط)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contacts', type=int, default=50, help="عدد التجار")
+        parser.add_argument('--transactions', type=int, default=5000, help="عدد حركات اليومية")
+        parser.add_argument('--months', type=int, default=12, help="عدد الشهور التي تتوزع عليها الحركات")
+        parser.add_argument('--seed', type=int, default=1, help="بذرة الأرقام العشوائية (نفس البذرة = نفس البيانات)")
+
+    def handle(self, *args, **options):
+        if DailyTransaction.objects.exists():
+            raise CommandError("قاعدة البيانات تحتوي حركات بالفعل. هذا الأمر للقواعد الفارغة فقط.")
+
+        rng = random.Random(options['seed'])
+        today = timezone.localdate()
+        days = options['months'] * 30
+
+        def random_date():
+            return today - timedelta(days=rng.randrange(days))
+
+        def money(low, high):
+            return Decimal(rng.randrange(low * 100, high * 100)) / 100
+
+        with transaction.atomic():
+            if not User.objects.filter(username='admin').exists():
+                User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+            Capital.objects.get_or_create(defaults={'initial_amount': Decimal(500000)})
+
+            contacts = Contact.objects.bulk_create([
+                Contact(name=f"تاجر {i + 1}", phone=f"01{rng.randrange(10**8, 10**9)}")
+                for i in range(options['contacts'])
+            ])
+            products = Product.objects.bulk_create([
+                Product(name=name, purchase_price_per_kg=Decimal(10 + i), selling_price_per_kg=Decimal(14 + i))
+                for i, name in enumerate(PRODUCTS)
+            ])
+
+            # الحفظ الجماعي يتخطى save() والإشارات، لذلك تُحسب القيم المشتقة هنا ثم بالمطابقة
+            transactions = []
+            for _ in range(options['transactions']):
+                product = rng.choice(products)
+                tx_type = rng.choice(['in', 'out'])
+                weight = Decimal(rng.randrange(50, 2000))
+                price = product.purchase_price_per_kg if tx_type == 'in' else product.selling_price_per_kg
+                transactions.append(DailyTransaction(
+                    date=random_date(), transaction_type=tx_type, product=product, contact=rng.choice(contacts),
+                    weight=weight, price_per_kg=price, total_price=weight * price,
+                ))
+            transactions = DailyTransaction.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+            records = FinancialRecord.objects.bulk_create(
+                [FinancialRecord(transaction=t) for t in transactions], batch_size=BATCH_SIZE
+            )
+
+            payments = []
+            for record, t in zip(records, transactions):
+                remaining = t.total_price
+                for _ in range(rng.randrange(0, 4)):
+                    amount = min(remaining, money(100, 5000))
+                    if amount <= 0:
+                        break
+                    remaining -= amount
+                    payments.append(PaymentInstallment(
+                        financial_record=record, amount=amount,
+                        date_paid=min(today, t.date + timedelta(days=rng.randrange(30))),
+                    ))
+            PaymentInstallment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+
+            ContactExpense.objects.bulk_create([
+                ContactExpense(contact=rng.choice(contacts), date=random_date(), amount=money(50, 1000),
+                               payer_type=rng.choice(['us', 'them']), notes=rng.choice(['نقل', 'عمالة', 'تعبئة']))
+                for _ in range(options['transactions'] // 10)
+            ], batch_size=BATCH_SIZE)
+            HomeExpense.objects.bulk_create([
+                HomeExpense(date=random_date(), description=rng.choice(['كهرباء', 'طعام', 'مواصلات']), amount=money(50, 2000))
+                for _ in range(options['transactions'] // 20)
+            ], batch_size=BATCH_SIZE)
+            IncomeRecord.objects.bulk_create([
+                IncomeRecord(date=random_date(), source=rng.choice(['إيجار', 'عمولة']), amount=money(500, 5000))
+                for _ in range(options['transactions'] // 50)
+            ], batch_size=BATCH_SIZE)
+
+            loan = BankLoan.objects.bulk_create([BankLoan(
+                bank_name='البنك الأهلي', total_loan_amount=Decimal(240000), interest_rate_percentage=Decimal(12),
+                loan_period_months=24, start_date=today - timedelta(days=days),
+            )])[0]
+            loan.generate_schedule()
+
+            reconcile(['amount_paid', 'stock'], apply=True)
+            # الفواتير أُضيفت بـ bulk_create بدون حركات مخزون
+            rebuild_ledger()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"تمت التعبئة: {len(contacts)} تاجر، {len(transactions)} حركة، {len(payments)} دفعة (المستخدم admin / admin)."
+        ))
@@ -0,0 +1,335 @@
+"""
+مقاييس التشغيل على /metrics بصيغة Prometheus النصية، بدون مكتبة أو خدمة خارجية.
+
+    store_http_request_duration_seconds{view="dashboard"}   زمن الطلب لكل صفحة (histogram)
+    store_db_queries_total / store_db_query_seconds_total     عدد ووقت استعلامات كل صفحة
+    store_cache_requests_total{cache, result}                 إصابة / إخفاق الكاش لكل نوع مفتاح
+    store_model_writes_total{model, action}                   الكتابات لكل دفتر
+    store_treasury_balance, store_open_invoices_amount ...    أرقام العمل وقت القراءة
+
+كل عملية (عمال gunicorn، run_worker، أوامر cron) تجمع عداداتها في الذاكرة، وتكتبها كل
+STORE_METRICS_FLUSH_SECONDS ثانية (وعند الخروج) في ملف باسم رقمها ووقت بدئها (<pid>-<start>.json)
+داخل STORE_METRICS_DIR بكتابة ذرية (os.replace)، فلا تتضارب العمليات على ملف واحد ولا يختلط ملف
+عملية انتهت بعملية جديدة أخذت نفس الرقم. الأمر الذي لا يسجل أي عداد (migrate، shell...) لا يكتب ملفاً.
+
+/metrics يضيف ملفات العمليات المنتهية إلى aggregate.json ويحذفها، ثم يجمع الملف المجمع مع ملفات
+العمليات الحية: المجلد لا يكبر مع كل إعادة تشغيل للعمال، والعدادات لا تنقص عند انتهاء عامل.
+كل القيم المخزنة عدادات (حتى خانات الـ histogram) فجمعها صحيح، وأرقام العمل (gauges) تُحسب من
+قاعدة البيانات عند القراءة فقط. حذف المجلد كله يبدأ العدادات من الصفر، وPrometheus يتعامل مع ذلك.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+# حدود خانات زمن الطلب بالثواني
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'store_http_requests_total': ('counter', "عدد الطلبات لكل صفحة وطريقة ورمز رد"),
+    'store_http_request_duration_seconds': ('histogram', "زمن الطلب لكل صفحة بالثواني"),
+    'store_db_queries_total': ('counter', "عدد استعلامات قاعدة البيانات لكل صفحة"),
+    'store_db_query_seconds_total': ('counter', "وقت استعلامات قاعدة البيانات لكل صفحة بالثواني"),
+    'store_cache_requests_total': ('counter', "قراءات الكاش لكل نوع مفتاح (hit / miss)"),
+    'store_model_writes_total': ('counter', "الحفظ والحذف لكل دفتر"),
+    'store_treasury_balance': ('gauge', "رصيد الخزنة الحالي"),
+    'store_open_invoices': ('gauge', "عدد الفواتير غير المسددة بالكامل (receivable بيع / payable شراء)"),
+    'store_open_invoices_amount': ('gauge', "المتبقي من الفواتير غير المسددة بالكامل"),
+    'store_overdue_installments': ('gauge', "أقساط البنك المتأخرة غير المدفوعة للقروض النشطة"),
+    'store_overdue_installments_amount': ('gauge', "مبلغ أقساط البنك المتأخرة"),
+}
+SUFFIXES = ('_bucket', '_sum', '_count')
+
+AGGREGATE = 'aggregate.json'
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_values = defaultdict(float)
+_flushed = [time.monotonic()]
+_exit_flush = [False]
+
+
+def _process_start(pid='self'):
+    """وقت بدء العملية من /proc (clock ticks منذ تشغيل الجهاز)، أو None خارج Linux"""
+    try:
+        stat = Path(f'/proc/{pid}/stat').read_text()
+    except OSError:
+        return None
+    # الحقل 22 (starttime)، والعد بعد اسم البرنامج بين القوسين لأنه قد يحتوي مسافات
+    return stat.rsplit(')', 1)[1].split()[19]
+
+
+def _process_name():
+    return f'{os.getpid()}-{_process_start() or time.time_ns()}'
+
+
+_name = [_process_name()]
+
+
+def _reset_in_child():
+    # العملية الجديدة (fork من gunicorn) تبدأ عداداتها من الصفر في ملفها الخاص
+    global _lock, _flush_lock
+    _lock, _flush_lock = threading.Lock(), threading.Lock()
+    _values.clear()
+    _flushed[0] = time.monotonic()
+    _name[0] = _process_name()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _add(entries):
+    with _lock:
+        for key, amount in entries:
+            _values[key] += amount
+        if not _exit_flush[0]:
+            # يُسجل مع أول عداد فقط، والعملية الابنة (fork) ترث التسجيل مع باقي الذاكرة
+            _exit_flush[0] = True
+            atexit.register(flush)
+    if time.monotonic() - _flushed[0] >= getattr(settings, 'STORE_METRICS_FLUSH_SECONDS', 2):
+        flush()
+
+
+def inc(name, amount=1, **labels):
+    _add([((name, _labels(labels)), amount)])
+
+
+def observe(name, value, **labels):
+    """تسجيل قيمة في histogram: كل خانة حدها >= القيمة، و +Inf، والمجموع والعدد"""
+    base = _labels(labels)
+    entries = [((f'{name}_bucket', base + (('le', repr(le)),)), 1) for le in BUCKETS if value <= le]
+    entries += [
+        ((f'{name}_bucket', base + (('le', '+Inf'),)), 1),
+        ((f'{name}_sum', base), value),
+        ((f'{name}_count', base), 1),
+    ]
+    _add(entries)
+
+
+def metrics_dir():
+    directory = getattr(settings, 'STORE_METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def flush():
+    """كتابة عدادات هذه العملية في ملفها (خيط واحد يكتب في كل مرة، والباقي يتخطى)"""
+    directory = metrics_dir()
+    if directory is None or not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        with _lock:
+            snapshot = [[name, labels, value] for (name, labels), value in _values.items()]
+            _flushed[0] = time.monotonic()
+        if not snapshot:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        _write(directory / f'{_name[0]}.json', snapshot)
+    except OSError:
+        # تعذر الكتابة (القرص ممتلئ مثلاً) لا يجب أن يوقف أي طلب، والمحاولة تتكرر مع الطلب التالي
+        pass
+    finally:
+        _flush_lock.release()
+
+
+def _write(path, data):
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def _read(path, default):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return default
+
+
+def _is_alive(stem):
+    """هل العملية صاحبة الملف <pid>-<start> ما زالت تعمل (وليست عملية جديدة أخذت نفس الرقم)؟"""
+    pid, _, started = stem.partition('-')
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = _process_start(pid)
+    return current is None or not started or current == started
+
+
+def _fold_dead(directory, aggregate):
+    """
+    إضافة ملفات العمليات المنتهية إلى الملف المجمع ثم حذفها. أسماؤها تُحفظ معه (folded) قبل الحذف،
+    فإذا توقف الأمر بين الكتابة والحذف لا يُضاف الملف مرة ثانية في القراءة التالية.
+    """
+    dead = [path for path in directory.glob('*.json') if path.name != AGGREGATE and not _is_alive(path.stem)]
+    folded = set(aggregate['folded'])
+    fresh = [path for path in dead if path.name not in folded]
+    if fresh:
+        totals = {(name, tuple(map(tuple, labels))): value for name, labels, value in aggregate['samples']}
+        for path in fresh:
+            for name, labels, value in _read(path, []):
+                key = (name, tuple(map(tuple, labels)))
+                totals[key] = totals.get(key, 0.0) + value
+        aggregate = {
+            # أسماء الملفات التي ما زالت موجودة فقط، فلا تكبر القائمة
+            'folded': sorted(name for name in folded if (directory / name).exists()) + [path.name for path in fresh],
+            'samples': [[name, labels, value] for (name, labels), value in totals.items()],
+        }
+        _write(directory / AGGREGATE, aggregate)
+    for path in dead:
+        path.unlink(missing_ok=True)
+    return aggregate
+
+
+def collect():
+    """{(الاسم، labels): مجموع القيمة في كل العمليات، الحية والمنتهية}"""
+    directory = metrics_dir()
+    if directory is None:
+        with _lock:
+            return dict(_values)
+    flush()
+    totals = defaultdict(float)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # قراءتان متزامنتان لـ /metrics لا تضيفان نفس الملف المنتهي مرتين
+        with open(directory / '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            aggregate = _fold_dead(directory, _read(directory / AGGREGATE, {'folded': [], 'samples': []}))
+            files = [_read(path, []) for path in directory.glob('*.json') if path.name != AGGREGATE]
+    except OSError:
+        return totals
+    for samples in files + [aggregate['samples']]:
+        for name, labels, value in samples:
+            totals[(name, tuple(tuple(label) for label in labels))] += value
+    return totals
+
+
+def business_gauges(today=None):
+    """رصيد الخزنة، الفواتير المفتوحة، وأقساط البنك المتأخرة؛ من الكاش حتى أول تعديل في الدفاتر"""
+    from django.core.cache import cache
+    from django.db.models import Count, F, Q
+    from django.utils import timezone
+
+    from .cache import data_version
+    from .models import BankInstallment, Capital, FinancialRecord
+    from .reports import _sum
+
+    today = today or timezone.now().date()
+    key = f'metrics:gauges:{data_version()}:{today.isoformat()}'
+    gauges = cache.get(key)
+    if gauges is not None:
+        return gauges
+
+    capital = Capital.objects.first()
+    invoices = FinancialRecord.objects.annotate(
+        remaining=F('transaction__total_price') - F('amount_paid'),
+    ).filter(remaining__gt=0).aggregate(
+        receivable=Count('pk', filter=Q(transaction__transaction_type='out')),
+        payable=Count('pk', filter=Q(transaction__transaction_type='in')),
+        receivable_amount=_sum(F('remaining'), Q(transaction__transaction_type='out')),
+        payable_amount=_sum(F('remaining'), Q(transaction__transaction_type='in')),
+    )
+    overdue = BankInstallment.objects.filter(is_paid=False, loan__is_active=True, due_date__lt=today).aggregate(
+        count=Count('pk'), amount=_sum('total_installment_amount'),
+    )
+    gauges = {
+        ('store_treasury_balance', ()): float(capital.initial_amount if capital else 0),
+        ('store_open_invoices', (('kind', 'payable'),)): invoices['payable'],
+        ('store_open_invoices', (('kind', 'receivable'),)): invoices['receivable'],
+        ('store_open_invoices_amount', (('kind', 'payable'),)): round(float(invoices['payable_amount']), 2),
+        ('store_open_invoices_amount', (('kind', 'receivable'),)): round(float(invoices['receivable_amount']), 2),
+        ('store_overdue_installments', ()): overdue['count'],
+        ('store_overdue_installments_amount', ()): float(overdue['amount']),
+    }
+    cache.set(key, gauges, 24 * 60 * 60)
+    return gauges
+
+
+class QueryCounter:
+    """execute_wrapper يعد استعلامات الطلب ووقتها"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """زمن كل طلب وعدد استعلاماته، مجمعة باسم الصفحة في urls.py (dashboard، contact_detail...)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.view_name if match else '') or 'unmatched'
+        inc('store_http_requests_total', view=view, method=request.method, status=response.status_code)
+        observe('store_http_request_duration_seconds', elapsed, view=view)
+        inc('store_db_queries_total', queries.count, view=view)
+        inc('store_db_query_seconds_total', queries.seconds, view=view)
+        return response
+
+
+def _family(name):
+    for suffix in SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _sample_order(sample):
+    # لكل مجموعة labels: الخانات بترتيب حدودها ثم المجموع ثم العدد
+    name, labels, _ = sample
+    le = dict(labels).get('le')
+    rest = tuple(label for label in labels if label[0] != 'le')
+    suffix = next((i for i, s in enumerate(SUFFIXES) if name.endswith(s)), 0)
+    return rest, suffix, float(le) if le else 0.0
+
+
+def render(values):
+    """نص /metrics (text/plain; version=0.0.4) من {(الاسم، labels): القيمة}"""
+    families = defaultdict(list)
+    for (name, labels), value in values.items():
+        families[_family(name)].append((name, labels, value))
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        if family not in families:
+            continue
+        lines += [f'# HELP {family} {help_text}', f'# TYPE {family} {kind}']
+        for name, labels, value in sorted(families[family], key=_sample_order):
+            text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+            lines.append(f'{name}{{{text}}} {_number(value)}' if text else f'{name} {_number(value)}')
+    return '\n'.join(lines) + '\n'
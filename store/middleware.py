@@ -0,0 +1,64 @@
+"""
+ضغط ردود الصفحات (brotli إن توفرت المكتبة، وإلا gzip).
+
+صفحات التقارير جداول طويلة متكررة الوسوم فتنضغط لأقل من عُشر حجمها.
+للحماية من هجوم BREACH على الصفحات التي تحتوي أسراراً (مثل رمز CSRF):
+- رمز CSRF نفسه يتغير (masked) مع كل رد في Django.
+- gzip: حشو عشوائي في رأس الملف المضغوط (نفس GZipMiddleware).
+- brotli: تعليق HTML بطول عشوائي في آخر الصفحة حتى لا يكشف حجم الرد شيئاً عن محتواه.
+"""
+import secrets
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r'\bbr\b')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    # مستوى 5 أسرع بكثير من 11 مع فرق حجم بسيط، ومناسب لصفحات تُولد مع كل طلب
+    brotli_quality = 5
+
+    @property
+    def min_length(self):
+        return getattr(settings, 'STORE_COMPRESS_MIN_LENGTH', 1024)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        # الردود الصغيرة لا يستحق ضغطها الوقت المستهلك
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        ae = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or response.streaming or not re_accepts_br.search(ae):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        content = response.content
+        # رمز CSRF موجود في كل صفحة (نموذج تسجيل الخروج في base.html) لذلك نحشو كل صفحات HTML
+        if response['Content-Type'].startswith('text/html'):
+            content += b'<!-- %s -->' % secrets.token_hex(secrets.randbelow(self.max_random_bytes) + 1).encode()
+
+        compressed = brotli.compress(content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
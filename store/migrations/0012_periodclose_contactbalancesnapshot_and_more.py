@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_alter_dailytransaction_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='بداية الفترة')),
+                ('period_end', models.DateField(unique=True, verbose_name='نهاية الفترة')),
+                ('cash_balance', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='رصيد الخزنة في نهاية الفترة')),
+                ('loan_principal_remaining', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='أصل القروض المتبقي')),
+                ('is_closed', models.BooleanField(default=True, verbose_name='فترة مغلقة')),
+                ('closed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الإقفال')),
+            ],
+            options={
+                'verbose_name': 'إقفال فترة',
+                'verbose_name_plural': 'إقفال الفترات الشهرية',
+                'ordering': ['-period_end'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContactBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('net_balance', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='صافي الرصيد (لنا + / علينا -)')),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.contact', verbose_name='التاجر')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contact_balances', to='store.periodclose', verbose_name='الفترة')),
+            ],
+            options={
+                'verbose_name': 'رصيد تاجر مجمد',
+                'verbose_name_plural': 'أرصدة التجار المجمدة',
+                'unique_together': {('period', 'contact')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='الكمية (كيلو)')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='قيمة المخزون')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_stocks', to='store.periodclose', verbose_name='الفترة')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product', verbose_name='المنتج')),
+            ],
+            options={
+                'verbose_name': 'مخزون مجمد',
+                'verbose_name_plural': 'أرصدة المخزون المجمدة',
+                'unique_together': {('period', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_periodclose_contactbalancesnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='اسم المهمة')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='المدخلات')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'تمت'), ('failed', 'فشلت')], default='pending', max_length=10, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='أقصى عدد محاولات')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تنفذ بعد')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='النتيجة')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدأت في')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهت في')),
+            ],
+            options={
+                'verbose_name': 'مهمة خلفية',
+                'verbose_name_plural': 'المهام الخلفية',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='store_job_status_b8638a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='low_stock_threshold',
+            field=models.DecimalField(decimal_places=2, default=50, max_digits=10, verbose_name='حد التنبيه (كيلو)'),
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='المعرف')),
+                ('kind', models.CharField(choices=[('bank_overdue', 'قسط بنكي متأخر'), ('bank_due', 'قسط بنكي قريب'), ('invoice_overdue', 'فواتير متأخرة'), ('low_stock', 'مخزون منخفض')], max_length=20, verbose_name='النوع')),
+                ('level', models.CharField(choices=[('danger', 'عاجل'), ('warning', 'تنبيه')], default='warning', max_length=10, verbose_name='الأهمية')),
+                ('title', models.CharField(max_length=200, verbose_name='العنوان')),
+                ('message', models.TextField(verbose_name='التفاصيل')),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True, verbose_name='المبلغ')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='تاريخ الاستحقاق')),
+                ('url', models.CharField(blank=True, default='', max_length=200, verbose_name='الرابط')),
+                ('is_active', models.BooleanField(default=True, verbose_name='نشط')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('notified_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الإرسال بالبريد')),
+            ],
+            options={
+                'verbose_name': 'تنبيه',
+                'verbose_name_plural': 'التنبيهات',
+                'ordering': ['level', 'due_date'],
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['level', 'due_date'], name='store_alert_active_idx')],
+            },
+        ),
+    ]
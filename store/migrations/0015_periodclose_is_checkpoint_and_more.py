@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_low_stock_threshold_alert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='periodclose',
+            name='is_checkpoint',
+            field=models.BooleanField(default=False, verbose_name='لقطة تلقائية'),
+        ),
+        migrations.AlterField(
+            model_name='bankinstallment',
+            name='actual_payment_date',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='تاريخ الدفع الفعلي'),
+        ),
+        migrations.AlterField(
+            model_name='contactexpense',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='التاريخ'),
+        ),
+        migrations.AlterField(
+            model_name='dailytransaction',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='التاريخ'),
+        ),
+        migrations.AlterField(
+            model_name='homeexpense',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='التاريخ'),
+        ),
+        migrations.AlterField(
+            model_name='incomerecord',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='التاريخ'),
+        ),
+        migrations.AlterField(
+            model_name='paymentinstallment',
+            name='date_paid',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='تاريخ الدفع'),
+        ),
+    ]
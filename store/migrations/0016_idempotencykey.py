@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_periodclose_is_checkpoint_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='المفتاح')),
+                ('path', models.CharField(max_length=200, verbose_name='المسار')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='كود الرد')),
+                ('response_location', models.CharField(blank=True, default='', max_length=500, verbose_name='التحويل إلى')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاريخ الإنشاء')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مفتاح منع تكرار',
+                'verbose_name_plural': 'مفاتيح منع التكرار',
+            },
+        ),
+    ]
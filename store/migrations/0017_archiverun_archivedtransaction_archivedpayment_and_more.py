@@ -0,0 +1,84 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateField(verbose_name='أرشفة ما قبل (شامل)')),
+                ('transactions', models.PositiveIntegerField(default=0, verbose_name='عدد الفواتير')),
+                ('payments', models.PositiveIntegerField(default=0, verbose_name='عدد الدفعات')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ التشغيل')),
+            ],
+            options={
+                'verbose_name': 'تشغيل أرشفة',
+                'verbose_name_plural': 'سجل الأرشفة',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='رقم الحركة')),
+                ('date', models.DateField(db_index=True, verbose_name='التاريخ')),
+                ('transaction_type', models.CharField(choices=[('in', 'وارد'), ('out', 'صادر')], max_length=3, verbose_name='النوع (وارد/صادر)')),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='الوزن')),
+                ('price_per_kg', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='السعر للكيلو')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='السعر المستحق الكلى')),
+                ('paid_amount_now', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='المبلغ المدفوع الآن')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='ملاحظات')),
+                ('financial_record_id', models.BigIntegerField(verbose_name='رقم السجل المالي')),
+                ('amount_paid', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='إجمالي المبلغ المدفوع')),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.contact', verbose_name='اسم التاجر')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product', verbose_name='اسم المنتج')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='store.archiverun', verbose_name='تشغيل الأرشفة')),
+            ],
+            options={
+                'verbose_name': 'فاتورة مؤرشفة',
+                'verbose_name_plural': 'الفواتير المؤرشفة',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='رقم الدفعة')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='قيمة الدفعة')),
+                ('date_paid', models.DateField(db_index=True, verbose_name='تاريخ الدفع')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='ملاحظات')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='store.archivedtransaction', verbose_name='الفاتورة')),
+            ],
+            options={
+                'verbose_name': 'دفعة مؤرشفة',
+                'verbose_name_plural': 'الدفعات المؤرشفة',
+                'ordering': ['-date_paid'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContactCarryForward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sales', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='مبيعات مؤرشفة')),
+                ('purchases', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='مشتريات مؤرشفة')),
+                ('collected', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='المحصل منها')),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='المسدد منها')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('contact', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='carry_forward', to='store.contact', verbose_name='التاجر')),
+            ],
+            options={
+                'verbose_name': 'رصيد مرحل',
+                'verbose_name_plural': 'الأرصدة المرحلة من الأرشيف',
+            },
+        ),
+    ]
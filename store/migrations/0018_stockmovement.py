@@ -0,0 +1,75 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# تعبئة الدفتر للقواعد الموجودة: حركة لكل فاتورة (اليومية والأرشيف)، ثم تسوية بفرق الكمية
+# المتاحة عن الفواتير (رصيد افتتاحي، تعديلات وحذف قبل وجود الدفتر) في اليوم السابق لأول حركة
+# للمنتج (أو لأول حركة في الدفتر للمنتج بلا حركات)، ثم الرصيد الجاري بـ window function.
+BACKFILL = [
+    """
+    INSERT INTO store_stockmovement (product_id, date, kind, quantity, balance_after, transaction_id, notes, created_at)
+    SELECT product_id, date, transaction_type, CASE WHEN transaction_type = 'in' THEN weight ELSE -weight END,
+           0, id, '', CURRENT_TIMESTAMP
+    FROM store_dailytransaction
+    """,
+    """
+    INSERT INTO store_stockmovement (product_id, date, kind, quantity, balance_after, transaction_id, notes, created_at)
+    SELECT product_id, date, transaction_type, CASE WHEN transaction_type = 'in' THEN weight ELSE -weight END,
+           0, id, '', CURRENT_TIMESTAMP
+    FROM store_archivedtransaction
+    """,
+    """
+    INSERT INTO store_stockmovement (product_id, date, kind, quantity, balance_after, transaction_id, notes, created_at)
+    SELECT p.id, DATE(COALESCE(m.first, (SELECT MIN(date) FROM store_stockmovement), DATE('now', '+1 day')), '-1 day'),
+           'adjust', ROUND(p.quantity_available - COALESCE(m.total, 0), 2), 0, NULL,
+           'فرق الكمية المتاحة عن الفواتير عند بناء الدفتر', CURRENT_TIMESTAMP
+    FROM store_product p
+    LEFT JOIN (
+        SELECT product_id, SUM(quantity) AS total, MIN(date) AS first FROM store_stockmovement GROUP BY product_id
+    ) m ON m.product_id = p.id
+    WHERE ROUND(p.quantity_available - COALESCE(m.total, 0), 2) <> 0
+    """,
+    """
+    UPDATE store_stockmovement SET balance_after = ROUND(w.running, 2)
+    FROM (
+        SELECT id, SUM(quantity) OVER (PARTITION BY product_id ORDER BY date, id) AS running FROM store_stockmovement
+    ) AS w
+    WHERE store_stockmovement.id = w.id
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_archiverun_archivedtransaction_archivedpayment_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('kind', models.CharField(choices=[('in', 'وارد'), ('out', 'صادر'), ('edit', 'تعديل فاتورة'), ('delete', 'حذف فاتورة'), ('adjust', 'تسوية يدوية')], max_length=6, verbose_name='نوع الحركة')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='الكمية (+ وارد / - صادر)')),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='الرصيد بعد الحركة')),
+                ('transaction_id', models.BigIntegerField(blank=True, null=True, verbose_name='رقم الفاتورة')),
+                ('notes', models.TextField(blank=True, default='', verbose_name='ملاحظات')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='وقت التسجيل')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='store.product', verbose_name='المنتج')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'حركة مخزون',
+                'verbose_name_plural': 'دفتر حركة المخزون',
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['product', 'date'], name='stock_movement_product_date')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
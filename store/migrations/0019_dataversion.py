@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    # يبدأ بعد آخر رقم كان في الكاش، فلا تُقرأ نتائج قديمة مخزنة تحت أرقام سبق استخدامها
+    from django.core.cache import cache
+    try:
+        current = int(cache.get('store:data_version') or 0)
+    except (OSError, TypeError, ValueError):
+        current = 0
+    apps.get_model('store', 'DataVersion').objects.create(pk=1, value=current + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=1, verbose_name='رقم الإصدار')),
+            ],
+            options={
+                'verbose_name': 'رقم إصدار البيانات',
+                'verbose_name_plural': 'رقم إصدار البيانات',
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
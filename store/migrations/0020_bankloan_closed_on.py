@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:24
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_closed_on(apps, schema_editor):
+    # يوم الإيقاف الفعلي غير مسجل للقروض الموقوفة من قبل: آخر قسط دُفع منها، أو بدايتها إن لم يُدفع شيء
+    BankLoan = apps.get_model('store', 'BankLoan')
+    for loan in BankLoan.objects.filter(is_active=False).annotate(last_paid=Max('installments__actual_payment_date')):
+        loan.closed_on = loan.last_paid or loan.start_date
+        loan.save(update_fields=['closed_on'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankloan',
+            name='closed_on',
+            field=models.DateField(blank=True, null=True, verbose_name='تاريخ الإيقاف'),
+        ),
+        migrations.RunPython(backfill_closed_on, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_bankloan_closed_on'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapitalAdjustment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='التاريخ')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='المبلغ (+ إيداع / - سحب)')),
+                ('notes', models.TextField(blank=True, default='', verbose_name='ملاحظات')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت التسجيل')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'إيداع / سحب من الخزنة',
+                'verbose_name_plural': 'إيداعات وسحوبات الخزنة',
+                'ordering': ['-date', '-id'],
+            },
+        ),
+    ]
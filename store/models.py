@@ -1,10 +1,16 @@
-from django.db import models
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from dateutil.relativedelta import relativedelta
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.utils import timezone
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
+from . import metrics
+from .cache import bump_data_version
 
 # --- 1. الموديلات الأساسية (تجار ومنتجات) ---
 
@@ -25,6 +31,7 @@ class Product(models.Model):
     quantity_available = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="الكمية المتاحة (كيلو)")
     purchase_price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="سعر شراء الكيلو")
     selling_price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="سعر بيع الكيلو")
+    low_stock_threshold = models.DecimalField(max_digits=10, decimal_places=2, default=50, verbose_name="حد التنبيه (كيلو)")
 
     class Meta:
         verbose_name = "المخزن"
@@ -38,7 +45,7 @@ class Product(models.Model):
 class DailyTransaction(models.Model):
     TRANSACTION_TYPES = (('in', 'وارد'), ('out', 'صادر'))
     
-    date = models.DateField(default=timezone.now, verbose_name="التاريخ")
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="التاريخ")
     transaction_type = models.CharField(max_length=3, choices=TRANSACTION_TYPES, verbose_name="النوع (وارد/صادر)")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="اسم المنتج")
     contact = models.ForeignKey(Contact, on_delete=models.CASCADE, verbose_name="اسم التاجر")
@@ -55,16 +62,16 @@ class DailyTransaction(models.Model):
     def save(self, *args, **kwargs):
         self.total_price = self.weight * self.price_per_kg
         is_new = self.pk is None
-        
-        if is_new:
-            prod = self.product
-            if self.transaction_type == 'in':
-                prod.quantity_available += self.weight
-            else:
-                prod.quantity_available -= self.weight
-            prod.save()
-        
-        super().save(*args, **kwargs)
+        previous = None
+        if not is_new:
+            previous = DailyTransaction.objects.filter(pk=self.pk).values('product_id', 'date', 'transaction_type', 'weight').first()
+
+        # المخزون يتغير عبر دفتر الحركة (StockMovement) مع الإضافة والتعديل والحذف
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            StockMovement.record_transaction(self, previous)
+        if self._meta.get_field('product').is_cached(self):
+            self.product.refresh_from_db(fields=['quantity_available'])
 
         financial_rec, created = FinancialRecord.objects.get_or_create(transaction=self)
         
@@ -100,7 +107,7 @@ class PaymentInstallment(models.Model):
     financial_record = models.ForeignKey(FinancialRecord, on_delete=models.CASCADE, related_name="installments", verbose_name="السجل المالي")
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="قيمة الدفعة")
     # تم التعديل للسماح بإدخال التاريخ يدوياً عند الإضافة
-    date_paid = models.DateField(default=timezone.now, verbose_name="تاريخ الدفع") 
+    date_paid = models.DateField(default=timezone.now, db_index=True, verbose_name="تاريخ الدفع")
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات (مثل: طريقة الدفع)")
 
     class Meta:
@@ -126,6 +133,8 @@ class BankLoan(models.Model):
     loan_period_months = models.IntegerField(verbose_name="مدة القرض (بالشهور)")
     start_date = models.DateField(verbose_name="تاريخ بداية القرض")
     is_active = models.BooleanField(default=True, verbose_name="قرض نشط")
+    # يوم إيقاف القرض، حتى تبقى أرصدة "حتى تاريخ" القديمة شاملة لأصله المتبقي وقتها
+    closed_on = models.DateField(blank=True, null=True, verbose_name="تاريخ الإيقاف")
 
     class Meta:
         verbose_name = "قرض بنكي"
@@ -136,24 +145,37 @@ class BankLoan(models.Model):
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        if self.is_active:
+            self.closed_on = None
+        elif not self.closed_on:
+            self.closed_on = timezone.now().date()
         super().save(*args, **kwargs)
         
         if is_new:
-            total_interest = (self.total_loan_amount * self.interest_rate_percentage) / 100             
-            principal_per_month = round(self.total_loan_amount / self.loan_period_months)
-            interest_per_month = round(total_interest / self.loan_period_months)
-            
-            for i in range(self.loan_period_months):
-                installment_date = self.start_date + relativedelta(months=i)
-                BankInstallment.objects.create(
-                    loan=self,
-                    due_date=installment_date,
-                    total_installment_amount=principal_per_month + interest_per_month,
-                    interest_component=interest_per_month,
-                    principal_component=principal_per_month,
-                    extra_charges=0,
-                    is_paid=False
-                )
+            # جدول الأقساط bulk_create واحد فيُنشأ فوراً مع القرض، ولا ينتظر run_worker
+            self.generate_schedule()
+
+    def generate_schedule(self):
+        """إنشاء جدول الأقساط الشهرية دفعة واحدة (لا يفعل شيئاً إذا كان الجدول موجوداً)"""
+        if self.installments.exists():
+            return 0
+        total_interest = (self.total_loan_amount * self.interest_rate_percentage) / 100             
+        principal_per_month = round(self.total_loan_amount / self.loan_period_months)
+        interest_per_month = round(total_interest / self.loan_period_months)
+        
+        BankInstallment.objects.bulk_create([
+            BankInstallment(
+                loan=self,
+                due_date=self.start_date + relativedelta(months=i),
+                total_installment_amount=principal_per_month + interest_per_month,
+                interest_component=interest_per_month,
+                principal_component=principal_per_month,
+                extra_charges=0,
+                is_paid=False
+            )
+            for i in range(self.loan_period_months)
+        ])
+        return self.loan_period_months
 
 class BankInstallment(models.Model):
     loan = models.ForeignKey(BankLoan, on_delete=models.CASCADE, related_name="installments", verbose_name="القرض المرتبط")
@@ -163,7 +185,7 @@ class BankInstallment(models.Model):
     principal_component = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="أصل المبلغ")
     extra_charges = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="مصاريف إضافية")
     is_paid = models.BooleanField(default=False, verbose_name="تم الدفع")
-    actual_payment_date = models.DateField(blank=True, null=True, verbose_name="تاريخ الدفع الفعلي")
+    actual_payment_date = models.DateField(blank=True, null=True, db_index=True, verbose_name="تاريخ الدفع الفعلي")
 
     class Meta:
         verbose_name = "قسط بنكي"
@@ -196,8 +218,27 @@ class Capital(models.Model):
     def __str__(self):
         return f"المبلغ المتاح حالياً: {self.initial_amount}"
 
+class CapitalAdjustment(models.Model):
+    """
+    إيداع في الخزنة أو سحب منها خارج الفواتير والمصاريف (تعديل الرصيد يدوياً من لوحة الإدارة).
+    يُحسب كحركة نقدية مثل باقي الدفاتر، فلا تراه المطابقة فرقاً ولا يغير أرصدة الأيام السابقة.
+    """
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="التاريخ")
+    amount = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="المبلغ (+ إيداع / - سحب)")
+    notes = models.TextField(blank=True, default='', verbose_name="ملاحظات")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="المستخدم")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت التسجيل")
+
+    class Meta:
+        verbose_name = "إيداع / سحب من الخزنة"
+        verbose_name_plural = "إيداعات وسحوبات الخزنة"
+        ordering = ['-date', '-id']
+
+    def __str__(self):
+        return f"{self.date} {self.amount:+}"
+
 class IncomeRecord(models.Model):
-    date = models.DateField(default=timezone.now, verbose_name="التاريخ")
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="التاريخ")
     source = models.CharField(max_length=255, verbose_name="المصدر (من أين؟)")
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="المبلغ الوارد")
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
@@ -214,7 +255,7 @@ class ContactExpense(models.Model):
     PAYER_CHOICES = (('us', 'نحن سددنا'), ('them', 'هو سدد'))
     
     contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name="expenses", verbose_name="التاجر")
-    date = models.DateField(default=timezone.now, verbose_name="التاريخ")
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="التاريخ")
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="المبلغ")
     payer_type = models.CharField(max_length=5, choices=PAYER_CHOICES, verbose_name="جهة السداد")
     notes = models.TextField(verbose_name="بيان المصروف (نقل/عمالة/..)")
@@ -228,7 +269,7 @@ class ContactExpense(models.Model):
         return f"{self.contact.name} - {self.notes} - {self.amount}"
 
 class HomeExpense(models.Model):
-    date = models.DateField(default=timezone.now, verbose_name="التاريخ")
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="التاريخ")
     description = models.CharField(max_length=255, verbose_name="البيان (وصف المصروف)")
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="المبلغ")
 
@@ -242,8 +283,27 @@ class HomeExpense(models.Model):
 
 # --- 5. قسم الإشارات (Signals) لتحديث الخزنة آلياً ---
 
+_bulk_state = threading.local()
+
+@contextmanager
+def bulk_operation():
+    """
+    داخل هذا السياق لا تعمل إشارات الخزنة والكاش وإقفال الفترات لكل صف على حدة:
+    العملية الجماعية (store/bulk.py) تتحقق من الفترات وتعدل الخزنة مرة واحدة بنفسها.
+    خاص بالـ thread الحالي فلا يؤثر على الطلبات الأخرى.
+    """
+    _bulk_state.depth = getattr(_bulk_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _bulk_state.depth -= 1
+
+def in_bulk_operation():
+    return getattr(_bulk_state, 'depth', 0) > 0
+
 @receiver(post_save, sender=PaymentInstallment)
 def update_cash_on_payment(sender, instance, created, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if not capital: return
     if created:
@@ -255,6 +315,7 @@ def update_cash_on_payment(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=PaymentInstallment)
 def update_cash_on_delete(sender, instance, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if capital:
         if instance.financial_record.transaction.transaction_type == 'out':
@@ -263,8 +324,35 @@ def update_cash_on_delete(sender, instance, **kwargs):
             capital.initial_amount += instance.amount
         capital.save()
 
+_pending_recalculation = threading.local()
+
+def _recalculate_pending():
+    record_ids = sorted(getattr(_pending_recalculation, 'ids', set()))
+    _pending_recalculation.ids = set()
+    if record_ids:
+        from .jobs import recalculate_amount_paid
+        recalculate_amount_paid(record_ids)
+
+# حذف التاجر أو المنتج أو الفاتورة أو السجل المالي يحذف السجل نفسه، فلا يوجد ما يُعاد حسابه
+CASCADE_ORIGINS = (Contact, Product, DailyTransaction, FinancialRecord)
+
+@receiver(post_delete, sender=PaymentInstallment)
+def recalculate_paid_on_delete(sender, instance, origin=None, **kwargs):
+    # حذف دفعة لا يمر على save() لذلك نعيد حساب إجمالي المدفوع هنا (فوراً مثل الحفظ، وبدون انتظار عامل):
+    # السجلات تُجمع وتُحسب بجملة UPDATE واحدة بعد نجاح المعاملة، مهما كان عدد الدفعات المحذوفة
+    if in_bulk_operation(): return
+    origin_model = origin._meta.model if isinstance(origin, models.Model) else getattr(origin, 'model', None)
+    if origin_model in CASCADE_ORIGINS: return
+    if not hasattr(_pending_recalculation, 'ids'):
+        _pending_recalculation.ids = set()
+    _pending_recalculation.ids.add(instance.financial_record_id)
+    # كل حذف يسجل callback (الأول بعد النجاح يفرغ المجموعة والباقي لا يفعل شيئاً)، فلا تضيع
+    # سجلات بقيت من معاملة أُلغيت (rollback) بل تُحسب مع أول معاملة تنجح بعدها
+    db_transaction.on_commit(_recalculate_pending)
+
 @receiver(post_save, sender=IncomeRecord)
 def update_cash_on_income(sender, instance, created, **kwargs):
+    if in_bulk_operation(): return
     if created:
         capital = Capital.objects.first()
         if capital:
@@ -273,6 +361,7 @@ def update_cash_on_income(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=IncomeRecord)
 def restore_cash_on_delete_income(sender, instance, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if capital:
         capital.initial_amount -= instance.amount
@@ -280,6 +369,7 @@ def restore_cash_on_delete_income(sender, instance, **kwargs):
 
 @receiver(post_save, sender=HomeExpense)
 def update_cash_on_home_expense(sender, instance, created, **kwargs):
+    if in_bulk_operation(): return
     if created:
         capital = Capital.objects.first()
         if capital:
@@ -288,6 +378,7 @@ def update_cash_on_home_expense(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=HomeExpense)
 def restore_cash_on_delete_expense(sender, instance, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if capital:
         capital.initial_amount += instance.amount
@@ -295,6 +386,7 @@ def restore_cash_on_delete_expense(sender, instance, **kwargs):
 
 @receiver(post_save, sender=ContactExpense)
 def update_cash_on_contact_expense(sender, instance, created, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if not capital: return
     if created and instance.payer_type == 'us':
@@ -303,7 +395,398 @@ def update_cash_on_contact_expense(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=ContactExpense)
 def restore_cash_on_delete_contact_expense(sender, instance, **kwargs):
+    if in_bulk_operation(): return
     capital = Capital.objects.first()
     if capital and instance.payer_type == 'us':
         capital.initial_amount += instance.amount
-        capital.save()
\ No newline at end of file
+        capital.save()
+
+# أي تعديل في الدفاتر يُبطل النتائج المخزنة مؤقتاً (انظر store/cache.py)
+CACHED_MODELS = (
+    Contact, Product, DailyTransaction, FinancialRecord, PaymentInstallment, BankLoan, BankInstallment,
+    Capital, CapitalAdjustment, IncomeRecord, ContactExpense, HomeExpense,
+)
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_results(sender, **kwargs):
+    if sender in CACHED_MODELS and not in_bulk_operation():
+        bump_data_version()
+
+# عدد الكتابات لكل دفتر في /metrics (العمليات الجماعية في store/bulk.py تعد صفوفها بنفسها)
+@receiver(post_save)
+@receiver(post_delete)
+def count_ledger_writes(sender, created=None, **kwargs):
+    if sender in CACHED_MODELS:
+        action = 'delete' if created is None else 'create' if created else 'update'
+        metrics.inc('store_model_writes_total', model=sender._meta.model_name, action=action)
+
+# --- 6. إقفال الفترات الشهرية (Period Close) ---
+
+class PeriodClose(models.Model):
+    """لقطة مجمدة لأرصدة نهاية الشهر تُبنى عليها التقارير التاريخية بدلاً من إعادة الحساب من أول سطر"""
+    period_start = models.DateField(verbose_name="بداية الفترة")
+    period_end = models.DateField(unique=True, verbose_name="نهاية الفترة")
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="رصيد الخزنة في نهاية الفترة")
+    loan_principal_remaining = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="أصل القروض المتبقي")
+    is_closed = models.BooleanField(default=True, verbose_name="فترة مغلقة")
+    # لقطة تلقائية لتسريع استعلامات "حتى تاريخ" فقط: لا تمنع التعديل وتُحذف إذا عُدلت حركة قبل نهايتها
+    is_checkpoint = models.BooleanField(default=False, verbose_name="لقطة تلقائية")
+    closed_at = models.DateTimeField(default=timezone.now, verbose_name="تاريخ الإقفال")
+
+    class Meta:
+        verbose_name = "إقفال فترة"
+        verbose_name_plural = "إقفال الفترات الشهرية"
+        ordering = ['-period_end']
+
+    def __str__(self):
+        status = "مغلقة" if self.is_closed else ("لقطة تلقائية" if self.is_checkpoint else "مفتوحة")
+        return f"فترة {self.period_start} إلى {self.period_end} ({status})"
+
+class ContactBalanceSnapshot(models.Model):
+    period = models.ForeignKey(PeriodClose, on_delete=models.CASCADE, related_name="contact_balances", verbose_name="الفترة")
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, verbose_name="التاجر")
+    net_balance = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="صافي الرصيد (لنا + / علينا -)")
+
+    class Meta:
+        verbose_name = "رصيد تاجر مجمد"
+        verbose_name_plural = "أرصدة التجار المجمدة"
+        unique_together = ('period', 'contact')
+
+class ProductStockSnapshot(models.Model):
+    period = models.ForeignKey(PeriodClose, on_delete=models.CASCADE, related_name="product_stocks", verbose_name="الفترة")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="المنتج")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="الكمية (كيلو)")
+    value = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="قيمة المخزون")
+
+    class Meta:
+        verbose_name = "مخزون مجمد"
+        verbose_name_plural = "أرصدة المخزون المجمدة"
+        unique_together = ('period', 'product')
+
+# منع تعديل أو حذف أي حركة تقع داخل فترة مغلقة إلا بعد إعادة فتحها صراحة
+PERIOD_LOCKED_DATE_FIELDS = {
+    DailyTransaction: 'date',
+    PaymentInstallment: 'date_paid',
+    IncomeRecord: 'date',
+    ContactExpense: 'date',
+    HomeExpense: 'date',
+    BankInstallment: 'actual_payment_date',
+    CapitalAdjustment: 'date',
+}
+
+def ensure_period_open(date_value):
+    if not date_value:
+        return
+    if isinstance(date_value, str):
+        date_value = date.fromisoformat(date_value)
+    if PeriodClose.objects.filter(is_closed=True, period_start__lte=date_value, period_end__gte=date_value).exists():
+        raise ValidationError(f"لا يمكن تعديل حركة بتاريخ {date_value} لأن الفترة مغلقة. أعد فتح الفترة أولاً.")
+
+def _locked_dates(instance):
+    field = PERIOD_LOCKED_DATE_FIELDS[type(instance)]
+    dates = [getattr(instance, field)]
+    if instance.pk:
+        dates += type(instance).objects.filter(pk=instance.pk).values_list(field, flat=True)
+    return dates
+
+def invalidate_checkpoints(dates):
+    """حذف اللقطات التلقائية التي تغطي أي تاريخ تغيرت حركته (ستُبنى من جديد بأمر build_checkpoints)"""
+    days = []
+    for value in filter(None, dates):
+        if isinstance(value, str):
+            value = date.fromisoformat(value[:10])
+        elif isinstance(value, datetime):
+            value = value.date()
+        days.append(value)
+    if days:
+        PeriodClose.objects.filter(is_checkpoint=True, is_closed=False, period_end__gte=min(days)).delete()
+
+@receiver(pre_save)
+def block_edits_in_closed_period(sender, instance, raw=False, **kwargs):
+    if raw or sender not in PERIOD_LOCKED_DATE_FIELDS or in_bulk_operation():
+        return
+    dates = _locked_dates(instance)
+    for date_value in dates:
+        ensure_period_open(date_value)
+    invalidate_checkpoints(dates)
+
+@receiver(pre_delete)
+def block_deletes_in_closed_period(sender, instance, **kwargs):
+    if sender not in PERIOD_LOCKED_DATE_FIELDS or in_bulk_operation():
+        return
+    date_value = getattr(instance, PERIOD_LOCKED_DATE_FIELDS[sender])
+    ensure_period_open(date_value)
+    invalidate_checkpoints([date_value])
+
+# --- 7. طابور المهام الخلفية (Background Jobs) ---
+
+class Job(models.Model):
+    """مهمة ثقيلة تُنفذ خارج الطلب بواسطة أمر run_worker بدون أي وسيط خارجي"""
+    STATUS_CHOICES = (
+        ('pending', 'في الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('done', 'تمت'),
+        ('failed', 'فشلت'),
+    )
+
+    name = models.CharField(max_length=100, verbose_name="اسم المهمة")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="المدخلات")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="الحالة")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="عدد المحاولات")
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name="أقصى عدد محاولات")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="تنفذ بعد")
+    result = models.JSONField(blank=True, null=True, verbose_name="النتيجة")
+    last_error = models.TextField(blank=True, default='', verbose_name="آخر خطأ")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="بدأت في")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="انتهت في")
+
+    class Meta:
+        verbose_name = "مهمة خلفية"
+        verbose_name_plural = "المهام الخلفية"
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+# --- 8. التنبيهات المحسوبة مسبقاً (Alerts) ---
+
+class Alert(models.Model):
+    """تنبيه يُحسب يومياً بأمر compute_alerts فتقرأه لوحة التحكم باستعلام واحد بدلاً من فحص الجداول كلها"""
+    KIND_CHOICES = (
+        ('bank_overdue', 'قسط بنكي متأخر'),
+        ('bank_due', 'قسط بنكي قريب'),
+        ('invoice_overdue', 'فواتير متأخرة'),
+        ('low_stock', 'مخزون منخفض'),
+    )
+    LEVEL_CHOICES = (('danger', 'عاجل'), ('warning', 'تنبيه'))
+
+    key = models.CharField(max_length=100, unique=True, verbose_name="المعرف")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="النوع")
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='warning', verbose_name="الأهمية")
+    title = models.CharField(max_length=200, verbose_name="العنوان")
+    message = models.TextField(verbose_name="التفاصيل")
+    amount = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True, verbose_name="المبلغ")
+    due_date = models.DateField(blank=True, null=True, verbose_name="تاريخ الاستحقاق")
+    url = models.CharField(max_length=200, blank=True, default='', verbose_name="الرابط")
+    is_active = models.BooleanField(default=True, verbose_name="نشط")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+    notified_at = models.DateTimeField(blank=True, null=True, verbose_name="تاريخ الإرسال بالبريد")
+
+    class Meta:
+        verbose_name = "تنبيه"
+        verbose_name_plural = "التنبيهات"
+        ordering = ['level', 'due_date']
+        # فهرس جزئي على التنبيهات النشطة بنفس ترتيب العرض: لوحة التحكم تقرأها بدون فرز
+        indexes = [models.Index(fields=['level', 'due_date'], condition=models.Q(is_active=True), name='store_alert_active_idx')]
+
+    def __str__(self):
+        return self.title
+
+@receiver(post_save, sender=BankInstallment)
+def resolve_bank_alert_on_payment(sender, instance, **kwargs):
+    # القسط المدفوع يختفي من لوحة التحكم فوراً بدون انتظار التشغيل اليومي
+    if instance.is_paid:
+        Alert.objects.filter(key=f"bank:{instance.pk}", is_active=True).update(is_active=False)
+
+# --- 9. مفاتيح منع التكرار (Idempotency) ---
+
+class IdempotencyKey(models.Model):
+    """
+    مفتاح عشوائي يولده المتصفح لكل نموذج مرسل. النماذج المحفوظة أثناء انقطاع الإنترنت
+    قد تُرسل أكثر من مرة عند عودة الاتصال، فيُنفذ الطلب الأول فقط وتُعاد نتيجته للبقية.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="المفتاح")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="المستخدم")
+    path = models.CharField(max_length=200, verbose_name="المسار")
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="كود الرد")
+    response_location = models.CharField(max_length=500, blank=True, default='', verbose_name="التحويل إلى")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="تاريخ الإنشاء")
+
+    class Meta:
+        verbose_name = "مفتاح منع تكرار"
+        verbose_name_plural = "مفاتيح منع التكرار"
+
+    def __str__(self):
+        return f"{self.path} ({self.key[:8]})"
+
+# --- 10. الأرشيف (الفواتير المسددة القديمة) ---
+
+class ArchiveRun(models.Model):
+    """تشغيل واحد لأمر archive_ledger: كل الحركات المؤرشفة تاريخها (وتاريخ دفعاتها) في أو قبل cutoff"""
+    cutoff = models.DateField(verbose_name="أرشفة ما قبل (شامل)")
+    transactions = models.PositiveIntegerField(default=0, verbose_name="عدد الفواتير")
+    payments = models.PositiveIntegerField(default=0, verbose_name="عدد الدفعات")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="تاريخ التشغيل")
+
+    class Meta:
+        verbose_name = "تشغيل أرشفة"
+        verbose_name_plural = "سجل الأرشفة"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"أرشفة حتى {self.cutoff}: {self.transactions} فاتورة"
+
+class ArchivedTransaction(models.Model):
+    """
+    فاتورة مسددة بالكامل نُقلت من اليومية مع سجلها المالي (amount_paid) بنفس الرقم.
+    الأرشيف للقراءة فقط: لا إشارات خزنة ولا مخزون، فأرقامه محسوبة بالفعل في الأرصدة.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="رقم الحركة")
+    run = models.ForeignKey(ArchiveRun, on_delete=models.PROTECT, related_name="archived_transactions", verbose_name="تشغيل الأرشفة")
+    date = models.DateField(db_index=True, verbose_name="التاريخ")
+    transaction_type = models.CharField(max_length=3, choices=DailyTransaction.TRANSACTION_TYPES, verbose_name="النوع (وارد/صادر)")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="اسم المنتج")
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, verbose_name="اسم التاجر")
+    weight = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="الوزن")
+    price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="السعر للكيلو")
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="السعر المستحق الكلى")
+    paid_amount_now = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="المبلغ المدفوع الآن")
+    notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
+    financial_record_id = models.BigIntegerField(verbose_name="رقم السجل المالي")
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="إجمالي المبلغ المدفوع")
+
+    class Meta:
+        verbose_name = "فاتورة مؤرشفة"
+        verbose_name_plural = "الفواتير المؤرشفة"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.get_transaction_type_display()} {self.contact} - {self.total_price} ({self.date})"
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="رقم الدفعة")
+    transaction = models.ForeignKey(ArchivedTransaction, on_delete=models.CASCADE, related_name="payments", verbose_name="الفاتورة")
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="قيمة الدفعة")
+    date_paid = models.DateField(db_index=True, verbose_name="تاريخ الدفع")
+    notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
+
+    class Meta:
+        verbose_name = "دفعة مؤرشفة"
+        verbose_name_plural = "الدفعات المؤرشفة"
+        ordering = ['-date_paid']
+
+class ContactCarryForward(models.Model):
+    """إجماليات فواتير التاجر المؤرشفة، تُضاف لحسابه بدلاً من جمع صفوف الأرشيف في كل صفحة"""
+    contact = models.OneToOneField(Contact, on_delete=models.CASCADE, related_name="carry_forward", verbose_name="التاجر")
+    sales = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="مبيعات مؤرشفة")
+    purchases = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="مشتريات مؤرشفة")
+    collected = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="المحصل منها")
+    paid = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="المسدد منها")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+
+    class Meta:
+        verbose_name = "رصيد مرحل"
+        verbose_name_plural = "الأرصدة المرحلة من الأرشيف"
+
+    @property
+    def balance(self):
+        """صافي أثر الفواتير المؤرشفة على الحساب (لنا + / علينا -)، غير صفري فقط عند الدفع الزائد"""
+        return (self.sales - self.collected) - (self.purchases - self.paid)
+
+    def __str__(self):
+        return f"{self.contact}: {self.balance}"
+
+# --- 11. دفتر حركة المخزون (Stock Ledger) ---
+
+class StockMovement(models.Model):
+    """
+    كل تغيير في كمية منتج: وارد وصادر الفواتير، وتعديلها وحذفها، والتسويات اليدوية (هالك / جرد).
+    balance_after هو الرصيد بعد الحركة بترتيب (التاريخ، الرقم)، فرصيد أي يوم هو balance_after
+    لآخر حركة قبله بدون جمع الفواتير. حركات الفواتير بتاريخ الفاتورة نفسها.
+    """
+    KINDS = (
+        ('in', 'وارد'),
+        ('out', 'صادر'),
+        ('edit', 'تعديل فاتورة'),
+        ('delete', 'حذف فاتورة'),
+        ('adjust', 'تسوية يدوية'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements", verbose_name="المنتج")
+    date = models.DateField(verbose_name="التاريخ")
+    kind = models.CharField(max_length=6, choices=KINDS, verbose_name="نوع الحركة")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="الكمية (+ وارد / - صادر)")
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="الرصيد بعد الحركة")
+    # رقم الفاتورة فقط (بدون مفتاح أجنبي) حتى يبقى بعد حذف الفاتورة أو نقلها للأرشيف
+    transaction_id = models.BigIntegerField(blank=True, null=True, verbose_name="رقم الفاتورة")
+    notes = models.TextField(blank=True, default='', verbose_name="ملاحظات")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="المستخدم")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="وقت التسجيل")
+
+    class Meta:
+        verbose_name = "حركة مخزون"
+        verbose_name_plural = "دفتر حركة المخزون"
+        ordering = ['date', 'id']
+        indexes = [models.Index(fields=['product', 'date'], name='stock_movement_product_date')]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.product} {self.quantity:+} ({self.date})"
+
+    @classmethod
+    def record(cls, product_id, date_value, quantity, kind, transaction_id=None, notes='', user=None):
+        """
+        تسجيل حركة وتحديث كمية المنتج ورصيد ما بعدها في معاملة واحدة.
+        تحديث المنتج أولاً يحجز القاعدة للكتابة، فلا تقرأ حركتان متزامنتان نفس الرصيد السابق.
+        """
+        day = cls._meta.get_field('date').to_python(date_value)
+        with db_transaction.atomic():
+            Product.objects.filter(pk=product_id).update(quantity_available=F('quantity_available') + quantity)
+            previous = cls.objects.filter(product_id=product_id, date__lte=day).order_by('-date', '-id').values_list(
+                'balance_after', flat=True
+            ).first() or 0
+            movement = cls.objects.create(
+                product_id=product_id, date=day, kind=kind, quantity=quantity, balance_after=previous + quantity,
+                transaction_id=transaction_id, notes=notes, user=user,
+            )
+            # حركة بتاريخ قديم تغير رصيد كل ما بعدها
+            cls.objects.filter(product_id=product_id, date__gt=day).update(balance_after=F('balance_after') + quantity)
+        return movement
+
+    @classmethod
+    def record_transaction(cls, instance, previous=None):
+        """حركات فاتورة بعد حفظها، previous = قيمها في القاعدة قبل التعديل (None للفاتورة الجديدة)"""
+        quantity = signed_weight(instance.transaction_type, instance.weight)
+        day = cls._meta.get_field('date').to_python(instance.date)
+        if previous is None:
+            cls.record(instance.product_id, day, quantity, instance.transaction_type, instance.pk)
+            return
+        old = signed_weight(previous['transaction_type'], previous['weight'])
+        if previous['product_id'] == instance.product_id and previous['date'] == day:
+            if quantity != old:
+                cls.record(instance.product_id, day, quantity - old, 'edit', instance.pk, notes=f"تعديل كمية الفاتورة من {old:+} إلى {quantity:+}")
+            return
+        cls.record(previous['product_id'], previous['date'], -old, 'edit', instance.pk, notes="إلغاء الفاتورة قبل نقلها لمنتج أو تاريخ آخر")
+        cls.record(instance.product_id, day, quantity, 'edit', instance.pk, notes="الفاتورة بعد نقلها لمنتج أو تاريخ آخر")
+
+def signed_weight(transaction_type, weight):
+    return weight if transaction_type == 'in' else -weight
+
+@receiver(post_delete, sender=DailyTransaction)
+def record_stock_on_delete(sender, instance, origin=None, **kwargs):
+    # الأرشفة تنقل الفاتورة بدون أن يتغير المخزون، وحذف المنتج نفسه يحذف دفتره كله
+    if in_bulk_operation() or isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
+    StockMovement.record(
+        instance.product_id, instance.date, -signed_weight(instance.transaction_type, instance.weight), 'delete',
+        instance.pk, notes=f"حذف فاتورة {instance.get_transaction_type_display()} رقم {instance.pk}",
+    )
+
+# --- 12. رقم إصدار البيانات (مفاتيح الكاش) ---
+
+class DataVersion(models.Model):
+    """
+    صف واحد (pk=1) يحمل رقم إصدار الدفاتر الذي تضيفه النتائج المخزنة لمفتاحها (store/cache.py).
+    في جدول وليس في الكاش: الزيادة UPDATE ذري بين العمليات، والكاش قد يحذف المفتاح عند امتلائه.
+    """
+    value = models.BigIntegerField(default=1, verbose_name="رقم الإصدار")
+
+    class Meta:
+        verbose_name = "رقم إصدار البيانات"
+        verbose_name_plural = "رقم إصدار البيانات"
+
+    def __str__(self):
+        return str(self.value)
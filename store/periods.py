@@ -0,0 +1,266 @@
+"""
+إقفال الفترات الشهرية وأرصدة "حتى تاريخ".
+
+كل رصيد تاريخي = أقرب لقطة قبل التاريخ المطلوب + الحركات التي وقعت بعدها فقط،
+بدلاً من إعادة حساب التاريخ كله من أول سطر في كل تقرير.
+
+بجانب الفترات المغلقة يبني أمر build_checkpoints لقطة تلقائية لنهاية كل شهر مكتمل
+(لا تمنع التعديل)، فأي استعلام "حتى تاريخ" يقرأ لقطة واحدة + حركات شهر على الأكثر.
+تعديل أو حذف حركة بتاريخ قديم يحذف اللقطات التلقائية التي بعدها حتى يُعاد بناؤها.
+
+المخزون لا يحتاج ذلك: دفتر الحركة (store/stock.py) يحمل الرصيد بعد كل حركة، فرصيد أي يوم
+هو آخر حركة قبله لكل منتج.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, Q, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .archive import archived_cash_flow, archived_contact_deltas, first_archived_date
+from .models import (
+    DailyTransaction, PaymentInstallment, ContactExpense, HomeExpense, IncomeRecord,
+    BankInstallment, Capital, CapitalAdjustment, Product, PeriodClose, ContactBalanceSnapshot, ProductStockSnapshot,
+)
+from .stock import stock_as_of
+
+ZERO = Decimal(0)
+
+
+def _sum(field, **filters):
+    return Coalesce(Sum(field, filter=Q(**filters) if filters else None), ZERO, output_field=DecimalField())
+
+
+def _date_range(field, after=None, upto=None):
+    """شرط الفترة (after, upto] على حقل التاريخ، وأي طرف None يعني بلا حد"""
+    q = Q()
+    if after:
+        q &= Q(**{f'{field}__gt': after})
+    if upto:
+        q &= Q(**{f'{field}__lte': upto})
+    return q
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def latest_snapshot(on_or_before=None, using='default', checkpoints=False):
+    """أقرب فترة مغلقة (أو لقطة تلقائية إذا checkpoints=True) تنتهي في أو قبل التاريخ المطلوب"""
+    usable = Q(is_closed=True) | Q(is_checkpoint=True) if checkpoints else Q(is_closed=True)
+    qs = PeriodClose.objects.using(using).filter(usable)
+    if on_or_before:
+        qs = qs.filter(period_end__lte=on_or_before)
+    return qs.order_by('-period_end').first()
+
+
+# --- 1. حركة الخزنة ---
+
+def cash_flow_between(after=None, upto=None, using='default'):
+    """صافي ما دخل الخزنة وخرج منها في الفترة (after, upto] بنفس منطق إشارات الخزنة"""
+    payments = PaymentInstallment.objects.using(using).filter(_date_range('date_paid', after, upto)).aggregate(
+        collected=_sum('amount', financial_record__transaction__transaction_type='out'),
+        paid=_sum('amount', financial_record__transaction__transaction_type='in'),
+    )
+    income = IncomeRecord.objects.using(using).filter(_date_range('date', after, upto)).aggregate(total=_sum('amount'))['total']
+    home = HomeExpense.objects.using(using).filter(_date_range('date', after, upto)).aggregate(total=_sum('amount'))['total']
+    contact_exp = ContactExpense.objects.using(using).filter(
+        _date_range('date', after, upto), payer_type='us'
+    ).aggregate(total=_sum('amount'))['total']
+    bank = BankInstallment.objects.using(using).filter(
+        _date_range('actual_payment_date', after, upto), is_paid=True
+    ).aggregate(total=_sum('total_installment_amount'))['total']
+    adjustments = CapitalAdjustment.objects.using(using).filter(_date_range('date', after, upto)).aggregate(
+        total=_sum('amount'))['total']
+    archived_collected, archived_paid = archived_cash_flow(after, upto, using=using)
+
+    return (payments['collected'] + archived_collected + income + adjustments
+            - payments['paid'] - archived_paid - home - contact_exp - bank)
+
+
+# --- 2. أرصدة التجار (لنا + / علينا -) ---
+
+def contact_deltas(after=None, upto=None):
+    """تغير صافي رصيد كل تاجر في الفترة (after, upto] بثلاث استعلامات مجمعة (+ الأرشيف إذا وصلت إليه الفترة)"""
+    deltas = {}
+
+    def add(cid, amount):
+        if amount:
+            deltas[cid] = deltas.get(cid, ZERO) + amount
+
+    invoices = DailyTransaction.objects.filter(_date_range('date', after, upto)).values('contact_id').annotate(
+        sold=_sum('total_price', transaction_type='out'),
+        bought=_sum('total_price', transaction_type='in'),
+    )
+    for row in invoices:
+        add(row['contact_id'], row['sold'] - row['bought'])
+
+    payments = PaymentInstallment.objects.filter(_date_range('date_paid', after, upto)).values(
+        'financial_record__transaction__contact_id'
+    ).annotate(
+        collected=_sum('amount', financial_record__transaction__transaction_type='out'),
+        paid=_sum('amount', financial_record__transaction__transaction_type='in'),
+    )
+    for row in payments:
+        add(row['financial_record__transaction__contact_id'], row['paid'] - row['collected'])
+
+    expenses = ContactExpense.objects.filter(_date_range('date', after, upto)).values('contact_id').annotate(
+        us=_sum('amount', payer_type='us'),
+        them=_sum('amount', payer_type='them'),
+    )
+    for row in expenses:
+        add(row['contact_id'], row['us'] - row['them'])
+
+    for cid, delta in archived_contact_deltas(after, upto).items():
+        add(cid, delta)
+
+    return deltas
+
+
+def contact_balances_as_of(as_of=None, snapshot=None):
+    """صافي رصيد كل تاجر حتى تاريخ معين (None = حتى الآن) انطلاقاً من أقرب لقطة"""
+    if snapshot is None:
+        snapshot = latest_snapshot(as_of, checkpoints=True)
+    return _balances_from(snapshot, as_of)
+
+
+def _balances_from(snapshot, as_of):
+    balances = {}
+    after = None
+    if snapshot:
+        after = snapshot.period_end
+        balances = dict(snapshot.contact_balances.values_list('contact_id', 'net_balance'))
+    for cid, delta in contact_deltas(after, as_of).items():
+        balances[cid] = balances.get(cid, ZERO) + delta
+    return balances
+
+
+# --- 3. القروض ---
+
+def _unpaid_installments(as_of):
+    """أقساط القروض القائمة في نهاية اليوم (بدأت ولم تكن قد أوقفت) التي لم تكن قد دُفعت حتى هذا اليوم"""
+    return BankInstallment.objects.filter(
+        Q(loan__closed_on__isnull=True) | Q(loan__closed_on__gt=as_of), loan__start_date__lte=as_of,
+    ).exclude(is_paid=True, actual_payment_date__lte=as_of)
+
+
+def loan_principal_as_of(as_of):
+    """أصل القروض القائمة الذي لم يكن قد سُدد حتى نهاية اليوم المطلوب"""
+    return _unpaid_installments(as_of).aggregate(total=_sum('principal_component'))['total']
+
+
+# --- 4. الإقفال وإعادة الفتح ---
+
+def _cash_as_of(as_of, snapshot):
+    if snapshot:
+        return snapshot.cash_balance + cash_flow_between(snapshot.period_end, as_of)
+    capital = Capital.objects.first()
+    return (capital.initial_amount if capital else ZERO) - cash_flow_between(after=as_of)
+
+
+def _save_snapshot(period, balances, stock):
+    prices = dict(Product.objects.values_list('id', 'purchase_price_per_kg'))
+    period.contact_balances.all().delete()
+    period.product_stocks.all().delete()
+    ContactBalanceSnapshot.objects.bulk_create([
+        ContactBalanceSnapshot(period=period, contact_id=cid, net_balance=balance)
+        for cid, balance in balances.items() if balance
+    ])
+    ProductStockSnapshot.objects.bulk_create([
+        ProductStockSnapshot(period=period, product_id=pid, quantity=qty, value=qty * prices.get(pid, ZERO))
+        for pid, qty in stock.items()
+    ])
+    return period
+
+
+@transaction.atomic
+def close_period(period_start, period_end):
+    """تجميد أرصدة نهاية الفترة وقفلها ضد التعديل"""
+    previous = PeriodClose.objects.filter(is_closed=True, period_end__lt=period_start).order_by('-period_end').first()
+
+    period, _ = PeriodClose.objects.update_or_create(
+        period_end=period_end,
+        defaults={
+            'period_start': period_start,
+            'cash_balance': _cash_as_of(period_end, None),
+            'loan_principal_remaining': loan_principal_as_of(period_end),
+            'is_closed': True,
+            'is_checkpoint': False,
+            'closed_at': timezone.now(),
+        },
+    )
+    return _save_snapshot(period, _balances_from(previous, period_end), stock_as_of(period_end))
+
+
+def reopen_period(period):
+    """إعادة فتح فترة مغلقة، ولا يُسمح بذلك إذا كانت هناك فترة لاحقة مغلقة مبنية عليها"""
+    later = PeriodClose.objects.filter(is_closed=True, period_end__gt=period.period_end).order_by('period_end').first()
+    if later:
+        raise ValueError(f"أعد فتح الفترة المنتهية في {later.period_end} أولاً.")
+    period.is_closed = False
+    period.save(update_fields=['is_closed'])
+    return period
+
+
+# --- 5. اللقطات التلقائية ---
+
+@transaction.atomic
+def build_checkpoint(period_start, period_end):
+    """لقطة غير مقفلة لنهاية الفترة، مبنية للأمام من اللقطة السابقة (حركات الفترة فقط)"""
+    previous = latest_snapshot(period_start - timedelta(days=1), checkpoints=True)
+    period = PeriodClose.objects.create(
+        period_start=period_start,
+        period_end=period_end,
+        cash_balance=_cash_as_of(period_end, previous),
+        loan_principal_remaining=loan_principal_as_of(period_end),
+        is_closed=False,
+        is_checkpoint=True,
+    )
+    return _save_snapshot(period, _balances_from(previous, period_end), stock_as_of(period_end))
+
+
+def build_checkpoints(today=None):
+    """بناء اللقطات الناقصة لكل شهر مكتمل منذ أول حركة، وإرجاع عدد ما بُني"""
+    today = today or timezone.now().date()
+    first_days = [DailyTransaction.objects.order_by('date').values_list('date', flat=True).first(), first_archived_date()]
+    first_day = min(filter(None, first_days), default=None)
+    if first_day is None:
+        return 0
+
+    existing = set(PeriodClose.objects.values_list('period_end', flat=True))
+    year, month, built = first_day.year, first_day.month, 0
+    while True:
+        period_start, period_end = month_bounds(year, month)
+        if period_end >= today:
+            return built
+        if period_end not in existing:
+            build_checkpoint(period_start, period_end)
+            built += 1
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def position_as_of(as_of):
+    """المركز المالي كما كان في نهاية يوم معين: خزنة، لينا، علينا، بضاعة، متبقي القروض (أصل وإجمالي)"""
+    snapshot = latest_snapshot(as_of, checkpoints=True)
+    balances = contact_balances_as_of(as_of, snapshot=snapshot)
+    prices = dict(Product.objects.values_list('id', 'purchase_price_per_kg'))
+    stock = stock_as_of(as_of)
+    loans = _unpaid_installments(as_of).aggregate(
+        principal=_sum('principal_component'), remaining=_sum('total_installment_amount')
+    )
+
+    return {
+        'as_of': as_of,
+        'snapshot': snapshot,
+        'cash': _cash_as_of(as_of, snapshot),
+        'receivable': sum((b for b in balances.values() if b > 0), ZERO),
+        'payable': abs(sum((b for b in balances.values() if b < 0), ZERO)),
+        'inventory_value': sum((qty * prices.get(pid, ZERO) for pid, qty in stock.items()), ZERO),
+        'loan_principal': loans['principal'],
+        'loan_remaining': loans['remaining'],
+        'contact_balances': balances,
+        'stock': stock,
+    }
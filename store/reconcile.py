@@ -0,0 +1,101 @@
+"""
+مطابقة الأرصدة المشتقة مع مصادرها.
+
+كل فحص عبارة عن استعلام مجمع واحد يعيد فقط الصفوف المختلفة، ثم يتم التصحيح
+اختيارياً بـ bulk_update، لذلك يصلح للتشغيل الليلي على قاعدة بها ملايين الصفوف.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import OuterRef, Subquery, Sum, Q, F, DecimalField, Window
+from django.db.models.functions import Coalesce, Round
+
+from .models import (
+    FinancialRecord, PaymentInstallment, Product, DailyTransaction, Capital, ArchivedTransaction, StockMovement,
+)
+from .periods import latest_snapshot, cash_flow_between
+
+ZERO = Decimal(0)
+BATCH_SIZE = 500
+
+Discrepancy = namedtuple('Discrepancy', ['pk', 'label', 'stored', 'expected'])
+
+
+def _grouped_sum(queryset, group_field, sum_field):
+    # التقريب لخانتين يمنع فروقات وهمية من جمع الكسور العشرية في SQLite
+    return Round(Coalesce(
+        Subquery(queryset.filter(**{group_field: OuterRef('pk')}).values(group_field).annotate(t=Sum(sum_field)).values('t')),
+        ZERO, output_field=DecimalField(),
+    ), 2)
+
+
+def check_amount_paid(using='default'):
+    """إجمالي المدفوع في كل سجل مالي = مجموع دفعاته"""
+    rows = FinancialRecord.objects.using(using).annotate(
+        expected=_grouped_sum(PaymentInstallment.objects.using(using), 'financial_record', 'amount')
+    ).filter(~Q(amount_paid=F('expected'))).values_list('pk', 'transaction_id', 'amount_paid', 'expected')
+    return [Discrepancy(pk, f"فاتورة #{tid}", stored, expected) for pk, tid, stored, expected in rows.iterator()]
+
+
+def check_stock(using='default'):
+    """الكمية المتاحة لكل منتج = الوارد - الصادر (من اليومية والأرشيف) + التسويات اليدوية"""
+    movements = DailyTransaction.objects.using(using)
+    archived = ArchivedTransaction.objects.using(using)
+    rows = Product.objects.using(using).annotate(
+        added=_grouped_sum(movements.filter(transaction_type='in'), 'product', 'weight'),
+        removed=_grouped_sum(movements.filter(transaction_type='out'), 'product', 'weight'),
+        archived_added=_grouped_sum(archived.filter(transaction_type='in'), 'product', 'weight'),
+        archived_removed=_grouped_sum(archived.filter(transaction_type='out'), 'product', 'weight'),
+        adjusted=_grouped_sum(StockMovement.objects.using(using).filter(kind='adjust'), 'product', 'quantity'),
+    ).annotate(
+        expected=F('added') + F('archived_added') - F('removed') - F('archived_removed') + F('adjusted')
+    ).filter(
+        ~Q(quantity_available=F('expected'))
+    ).values_list('pk', 'name', 'quantity_available', 'expected')
+    return [Discrepancy(*row) for row in rows]
+
+
+def check_ledger(using='default'):
+    """رصيد كل حركة في دفتر المخزون = المجموع الجاري للحركات قبلها (بترتيب التاريخ ثم الرقم)"""
+    rows = StockMovement.objects.using(using).annotate(expected=Round(Window(
+        Sum('quantity'), partition_by=[F('product_id')], order_by=[F('date').asc(), F('id').asc()],
+    ), 2)).filter(~Q(balance_after=F('expected'))).values_list('pk', 'product__name', 'date', 'balance_after', 'expected')
+    return [Discrepancy(pk, f"{name} {day}", stored, expected) for pk, name, day, stored, expected in rows.iterator()]
+
+
+def check_capital(using='default'):
+    """الخزنة = رصيد آخر فترة مغلقة + صافي حركة النقدية بعدها"""
+    capital = Capital.objects.using(using).first()
+    snapshot = latest_snapshot(using=using)
+    if not capital or not snapshot:
+        return None
+    expected = snapshot.cash_balance + cash_flow_between(after=snapshot.period_end, using=using)
+    if capital.initial_amount == expected:
+        return []
+    return [Discrepancy(capital.pk, "الخزنة", capital.initial_amount, expected)]
+
+
+CHECKS = {
+    'amount_paid': (check_amount_paid, FinancialRecord, 'amount_paid'),
+    'stock': (check_stock, Product, 'quantity_available'),
+    'ledger': (check_ledger, StockMovement, 'balance_after'),
+    'capital': (check_capital, Capital, 'initial_amount'),
+}
+
+
+def fix(model, field, discrepancies, using='default'):
+    objs = [model(pk=d.pk, **{field: d.expected}) for d in discrepancies]
+    model.objects.using(using).bulk_update(objs, [field], batch_size=BATCH_SIZE)
+    return len(objs)
+
+
+def reconcile(checks=None, apply=False, using='default'):
+    """تشغيل الفحوص وإرجاع {اسم الفحص: قائمة الفروقات أو None إذا تعذر الفحص}"""
+    results = {}
+    for name in checks or CHECKS:
+        check, model, field = CHECKS[name]
+        found = check(using=using)
+        if apply and found:
+            fix(model, field, found, using=using)
+        results[name] = found
+    return results
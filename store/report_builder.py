@@ -0,0 +1,334 @@
+"""
+منشئ تقارير مرن: تجميع أي مقاييس حسب أي أبعاد باستعلام GROUP BY واحد، بدون View جديد لكل سؤال.
+
+    # الكيلوهات المباعة لكل منتج لكل شهر هذا العام
+    /api/report/?group=product,month&measures=weight&type=out&start=2026-01-01
+    # أعلى 10 تجار هامشاً
+    /api/report/?group=contact&measures=total_price,profit,margin&type=out&sort=-margin&limit=10
+    # مصروفات التجار لكل ربع سنة
+    /api/report/?source=contact_expenses&group=quarter,payer_type&measures=amount
+
+النتيجة تُخزن مؤقتاً بمفتاح من المعاملات + رقم إصدار البيانات (store/cache.py)، فتُعاد
+من الكاش حتى أول تعديل في الدفاتر.
+
+الفواتير والدفعات المؤرشفة (store/archive.py) تدخل في التقرير فقط إذا بدأت الفترة في أو قبل
+آخر تاريخ قطع: يُنفذ نفس الاستعلام على جدول الأرشيف وتُدمج الصفوف ذات الأبعاد نفسها.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import Cast, NullIf, TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.utils.dateparse import parse_date
+
+from .archive import archive_boundary
+from .cache import data_version
+from .models import (
+    ArchivedPayment, ArchivedTransaction, ContactExpense, DailyTransaction, HomeExpense, IncomeRecord,
+    PaymentInstallment,
+)
+
+TIME_DIMENSIONS = {
+    'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'quarter': TruncQuarter, 'year': TruncYear,
+}
+
+
+def _money(expression):
+    return Sum(expression, output_field=DecimalField())
+
+
+def _transaction_measures(paid='financialrecord__amount_paid'):
+    cogs = F('weight') * F('product__purchase_price_per_kg')
+    profit = F('total_price') - cogs
+    return {
+        'count': Count('pk'),
+        'weight': Sum('weight'),
+        'total_price': Sum('total_price'),
+        'cogs': _money(cogs),
+        'profit': _money(profit),
+        # البسط كعدد عشري: SQLite يقسم الأعداد الصحيحة قسمة صحيحة (14.29% تصبح 14)
+        'margin': ExpressionWrapper(
+            Cast(_money(profit), FloatField()) * 100 / NullIf(Sum('total_price'), 0), output_field=DecimalField()
+        ),
+        'paid': Sum(paid),
+        'remaining': _money(F('total_price') - F(paid)),
+    }
+
+
+# المقاييس النسبية: لا تُجمع عند دمج صفوف الأرشيف بل يُعاد حسابها من (البسط، المقام)
+RATIOS = {'margin': ('profit', 'total_price')}
+
+
+# لكل مصدر: الموديل، حقل التاريخ، الأبعاد {الاسم: {عمود الناتج: الحقل}}، الفلاتر، والمقاييس.
+# archive: جدول الأرشيف المقابل، وpaths تحول بدايات مسارات الحقول إلى ما يقابلها فيه
+SOURCES = {
+    'transactions': {
+        'model': DailyTransaction,
+        'date': 'date',
+        'dimensions': {
+            'product': {'product_id': 'product_id', 'product_name': 'product__name'},
+            'contact': {'contact_id': 'contact_id', 'contact_name': 'contact__name'},
+            'type': {'transaction_type': 'transaction_type'},
+        },
+        'filters': {'type': 'transaction_type', 'product': 'product_id', 'contact': 'contact_id'},
+        'measures': _transaction_measures,
+        'archive': {'model': ArchivedTransaction, 'measures': lambda: _transaction_measures('amount_paid')},
+    },
+    'payments': {
+        'model': PaymentInstallment,
+        'date': 'date_paid',
+        'dimensions': {
+            'product': {'product_id': 'financial_record__transaction__product_id',
+                        'product_name': 'financial_record__transaction__product__name'},
+            'contact': {'contact_id': 'financial_record__transaction__contact_id',
+                        'contact_name': 'financial_record__transaction__contact__name'},
+            'type': {'transaction_type': 'financial_record__transaction__transaction_type'},
+        },
+        'filters': {
+            'type': 'financial_record__transaction__transaction_type',
+            'product': 'financial_record__transaction__product_id',
+            'contact': 'financial_record__transaction__contact_id',
+        },
+        'measures': lambda: {'count': Count('pk'), 'amount': Sum('amount')},
+        'archive': {
+            'model': ArchivedPayment,
+            'paths': {'financial_record__transaction__': 'transaction__'},
+            'measures': lambda: {'count': Count('pk'), 'amount': Sum('amount')},
+        },
+    },
+    'contact_expenses': {
+        'model': ContactExpense,
+        'date': 'date',
+        'dimensions': {
+            'contact': {'contact_id': 'contact_id', 'contact_name': 'contact__name'},
+            'payer_type': {'payer_type': 'payer_type'},
+        },
+        'filters': {'contact': 'contact_id', 'payer_type': 'payer_type'},
+        'measures': lambda: {'count': Count('pk'), 'amount': Sum('amount')},
+    },
+    'home_expenses': {
+        'model': HomeExpense,
+        'date': 'date',
+        'dimensions': {'description': {'description': 'description'}},
+        'filters': {},
+        'measures': lambda: {'count': Count('pk'), 'amount': Sum('amount')},
+    },
+    'income': {
+        'model': IncomeRecord,
+        'date': 'date',
+        'dimensions': {'source': {'income_source': 'source'}},
+        'filters': {},
+        'measures': lambda: {'count': Count('pk'), 'amount': Sum('amount')},
+    },
+}
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def parse_spec(params):
+    """التحقق من معاملات الطلب وتحويلها لمواصفة موحدة (تُستخدم أيضاً كمفتاح للكاش)"""
+    source_name = params.get('source', 'transactions')
+    if source_name not in SOURCES:
+        raise ValueError(f"مصدر غير معروف: {source_name}. المتاح: {', '.join(SOURCES)}")
+    source = SOURCES[source_name]
+    measures = source['measures']()
+
+    group = _split(params.get('group'))
+    unknown = [d for d in group if d not in source['dimensions'] and d not in TIME_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"أبعاد غير معروفة: {', '.join(unknown)}. المتاح: {', '.join([*source['dimensions'], *TIME_DIMENSIONS])}")
+
+    selected = _split(params.get('measures')) or list(measures)[:2]
+    unknown = [m for m in selected if m not in measures]
+    if unknown:
+        raise ValueError(f"مقاييس غير معروفة: {', '.join(unknown)}. المتاح: {', '.join(measures)}")
+
+    filters = {}
+    for name in ('start', 'end'):
+        if params.get(name):
+            try:
+                day = parse_date(params[name])
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValueError(f"تاريخ غير صحيح: {params[name]}")
+            filters[name] = day.isoformat()
+    for name, lookup in source['filters'].items():
+        if params.get(name):
+            if lookup.endswith('_id') and not params[name].isdigit():
+                raise ValueError(f"{name} يجب أن يكون رقماً.")
+            filters[name] = params[name]
+
+    max_rows = getattr(settings, 'STORE_REPORT_MAX_ROWS', 1000)
+    try:
+        limit = min(int(params.get('limit') or max_rows), max_rows)
+    except ValueError:
+        raise ValueError("limit يجب أن يكون رقماً.")
+
+    sort = params.get('sort') or ''
+    columns = [*selected, *(key for d in group for key in source['dimensions'].get(d, [d]))]
+    if sort and sort.lstrip('-') not in columns:
+        raise ValueError(f"لا يمكن الترتيب حسب {sort}: يجب أن يكون أحد المقاييس أو الأبعاد المطلوبة.")
+
+    return {
+        'source': source_name, 'group': group, 'measures': selected,
+        'filters': filters, 'sort': sort, 'limit': max(limit, 1),
+    }
+
+
+def _measures(table, names):
+    # المقاييس تُسمى m_<الاسم> داخل الاستعلام لأن أسماء مثل weight و amount هي أسماء حقول في الموديل
+    measures = table['measures']()
+    return {f'm_{name}': measures[name] for name in names}
+
+
+def _path(path, table):
+    for prefix, replacement in table.get('paths', {}).items():
+        if path.startswith(prefix):
+            return replacement + path[len(prefix):]
+    return path
+
+
+def _order_key(name, measures):
+    descending, name = name.startswith('-'), name.lstrip('-')
+    return f"{'-' if descending else ''}{'m_' if name in measures else ''}{name}"
+
+
+def _ordering(spec):
+    # الأبعاد الزمنية بالترتيب، وإلا الأكبر في أول مقياس
+    return [spec['sort']] if spec['sort'] else (
+        [d for d in spec['group'] if d in TIME_DIMENSIONS] or [f"-{spec['measures'][0]}"]
+    )
+
+
+def _grouped(spec, table, names):
+    """استعلام GROUP BY بدون ترتيب على جدول العمل (table = المصدر) أو جدول الأرشيف (table = source['archive'])"""
+    source = SOURCES[spec['source']]
+    date_field = source['date']
+
+    qs = table['model'].objects.all()
+    filters = dict(spec['filters'])
+    if 'start' in filters:
+        qs = qs.filter(**{f'{date_field}__gte': filters.pop('start')})
+    if 'end' in filters:
+        qs = qs.filter(**{f'{date_field}__lte': filters.pop('end')})
+    qs = qs.filter(**{_path(source['filters'][name], table): value for name, value in filters.items()})
+    if not spec['group']:
+        return qs
+
+    fields, columns = [], {}
+    for dimension in spec['group']:
+        if dimension in TIME_DIMENSIONS:
+            columns[dimension] = TIME_DIMENSIONS[dimension](date_field)
+            continue
+        for key, field in source['dimensions'][dimension].items():
+            field = _path(field, table)
+            if key == field:
+                fields.append(field)
+            else:
+                columns[key] = F(field)
+
+    return qs.values(*fields, **columns).annotate(**_measures(table, names))
+
+
+def build_queryset(spec):
+    """استعلام GROUP BY واحد للمواصفة على جدول العمل (بدون أبعاد: الاستعلام المفلتر فقط ليُجمع في صف واحد)"""
+    qs = _grouped(spec, SOURCES[spec['source']], spec['measures'])
+    if not spec['group']:
+        return qs
+    return qs.order_by(*(_order_key(name, spec['measures']) for name in _ordering(spec)))
+
+
+def reaches_archive(spec):
+    """هل يشمل التقرير صفوفاً مؤرشفة؟ (المصدر له أرشيف والفترة تبدأ في أو قبل آخر تاريخ قطع)"""
+    if 'archive' not in SOURCES[spec['source']]:
+        return False
+    boundary = archive_boundary()
+    start = spec['filters'].get('start')
+    return boundary is not None and (start is None or parse_date(start) <= boundary)
+
+
+def _add(a, b):
+    return b if a is None else a if b is None else a + b
+
+
+def _sort_rows(rows, spec):
+    # ترتيب مستقر بالمفاتيح من الأخير للأول، والقيم الفارغة في النهاية دائماً
+    for name in reversed(_ordering(spec)):
+        descending, key = name.startswith('-'), _order_key(name.lstrip('-'), spec['measures'])
+        present = [row for row in rows if row[key] is not None]
+        rows = sorted(present, key=lambda row: row[key], reverse=descending) + [row for row in rows if row[key] is None]
+    return rows
+
+
+def merged_rows(spec):
+    """
+    التقرير من جدول العمل + جدول الأرشيف: الصفوف ذات الأبعاد نفسها تُجمع مقاييسها، والمقاييس
+    النسبية تُحسب بعد الدمج من مكوناتها. الترتيب والحد يُطبقان على الناتج المدمج.
+    """
+    source = SOURCES[spec['source']]
+    names = list(dict.fromkeys(
+        part for name in spec['measures'] for part in RATIOS.get(name, (name,))
+    ))
+    merged = {}
+    for table in (source, source['archive']):
+        qs = _grouped(spec, table, names)
+        for row in (qs if spec['group'] else [qs.aggregate(**_measures(table, names))]):
+            key = tuple(value for column, value in row.items() if not column.startswith('m_'))
+            if key in merged:
+                merged[key].update({f'm_{name}': _add(merged[key][f'm_{name}'], row[f'm_{name}']) for name in names})
+            else:
+                merged[key] = row
+
+    rows = list(merged.values())
+    for row in rows:
+        for name, (numerator, denominator) in RATIOS.items():
+            if name in spec['measures']:
+                total = row[f'm_{denominator}']
+                row[f'm_{name}'] = row[f'm_{numerator}'] * 100 / total if total else None
+        for name in names:
+            if name not in spec['measures']:
+                del row[f'm_{name}']
+        # نفس ترتيب الأعمدة في الاستعلام: الأبعاد ثم المقاييس المطلوبة
+        for name in spec['measures']:
+            row[f'm_{name}'] = row.pop(f'm_{name}')
+    return _sort_rows(rows, spec) if spec['group'] else rows
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return float(round(value, 2))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def run_report(spec):
+    """{'rows': [...], 'truncated': bool, 'spec': spec}، من الكاش إن وُجد"""
+    key = 'report:{}:{}'.format(
+        data_version(), hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    )
+    result = cache.get(key)
+    if result is None:
+        if reaches_archive(spec):
+            rows = merged_rows(spec)
+        elif spec['group']:
+            # صف زيادة لمعرفة ما إذا كانت النتيجة قُطعت عند الحد الأقصى
+            rows = list(build_queryset(spec)[:spec['limit'] + 1])
+        else:
+            rows = [build_queryset(spec).aggregate(**_measures(SOURCES[spec['source']], spec['measures']))]
+        result = {
+            'spec': spec,
+            'rows': [
+                {k[2:] if k.startswith('m_') else k: _jsonable(v) for k, v in row.items()}
+                for row in rows[:spec['limit']]
+            ],
+            'truncated': len(rows) > spec['limit'],
+        }
+        cache.set(key, result, getattr(settings, 'STORE_REPORT_CACHE_SECONDS', 600))
+    return result
@@ -0,0 +1,194 @@
+"""
+استعلامات صفحات التقارير: فلتر الفترة المشترك، وأرقام كل جدول باستعلام aggregate واحد.
+
+كل رقم في الملخصات (مبيعات، تحصيل، مصاريف دفعناها / دفعها التاجر...) هو Sum بشرط
+filter=Q(...) داخل نفس الاستعلام، بدلاً من aggregate منفصل لكل رقم أو حلقة Python على
+الصفوف. بهذا يبقى عدد استعلامات كل صفحة ثابتاً مهما زاد عدد الحركات أو التجار
+(انظر أمر benchmark_queries).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import archive_boundary
+from .models import (
+    ArchivedTransaction, Contact, ContactCarryForward, ContactExpense, DailyTransaction, FinancialRecord, HomeExpense,
+    IncomeRecord,
+)
+
+ZERO = Decimal(0)
+SALE = Q(transaction_type='out')
+PURCHASE = Q(transaction_type='in')
+
+
+def _sum(expression, condition=None):
+    return Coalesce(Sum(expression, filter=condition, output_field=DecimalField()), ZERO, output_field=DecimalField())
+
+
+def period_filter(params, today=None):
+    """
+    شروط الفترة على حقل date من GET: period = today / week / month، أو من start_date إلى end_date
+    (period = custom أو بدون period). 'all' أو تاريخ ناقص / غير صحيح = بلا فلتر.
+    """
+    period = params.get('period') or 'custom'
+    today = today or timezone.now().date()
+
+    if period == 'today':
+        return {'date': today}
+    if period == 'week':
+        return {'date__gte': today - timedelta(days=7)}
+    if period == 'month':
+        return {'date__gte': today - timedelta(days=30)}
+    if period == 'custom':
+        try:
+            start_date = parse_date(params.get('start_date') or '')
+            end_date = parse_date(params.get('end_date') or '')
+        except ValueError:
+            return {}
+        if start_date and end_date:
+            return {'date__range': [start_date, end_date]}
+    return {}
+
+
+def period_start(filter_q):
+    """أول يوم في فلتر period_filter (None = من البداية)"""
+    filter_q = filter_q or {}
+    if 'date__range' in filter_q:
+        return filter_q['date__range'][0]
+    return filter_q.get('date', filter_q.get('date__gte'))
+
+
+def includes_archive(filter_q):
+    """الأرشيف يدخل في الأرقام فقط إذا بدأت الفترة في أو قبل آخر تاريخ قطع"""
+    boundary = archive_boundary()
+    start = period_start(filter_q)
+    return boundary is not None and (start is None or start <= boundary)
+
+
+# --- 1. أرقام كل جدول (استعلام واحد لكل جدول) ---
+
+def _invoice_totals(queryset, paid):
+    return queryset.aggregate(
+        sales=_sum('total_price', SALE),
+        purchases=_sum('total_price', PURCHASE),
+        collected=_sum(paid, SALE),
+        paid=_sum(paid, PURCHASE),
+        receivable=_sum(F('total_price') - paid, SALE),
+        payable=_sum(F('total_price') - paid, PURCHASE),
+        cogs=_sum(F('weight') * F('product__purchase_price_per_kg'), SALE),
+    )
+
+
+def transaction_totals(filter_q=None, archive=None, **filters):
+    """
+    فواتير البيع والشراء: الإجمالي، المحصل / المسدد منها، المتبقي، وتكلفة البضاعة المباعة.
+    المتبقي يُحسب من السجل المالي لكل فاتورة (نفس FinancialRecord.remaining_amount).
+    الفواتير المؤرشفة تُضاف باستعلام ثانٍ عندما تصل الفترة إليها (archive=None: يُحدد تلقائياً).
+    """
+    filter_q = filter_q or {}
+    totals = _invoice_totals(DailyTransaction.objects.filter(**filter_q, **filters), F('financialrecord__amount_paid'))
+    if archive is None:
+        archive = includes_archive(filter_q)
+    if archive:
+        archived = _invoice_totals(ArchivedTransaction.objects.filter(**filter_q, **filters), F('amount_paid'))
+        totals = {name: value + archived[name] for name, value in totals.items()}
+    totals['profit'] = totals['sales'] - totals['cogs']
+    return totals
+
+
+def contact_expense_totals(filter_q=None, **filters):
+    """مصاريف التجار: ما دفعناه نحن (us) وما دفعه التاجر (them) والإجمالي"""
+    return ContactExpense.objects.filter(**(filter_q or {}), **filters).aggregate(
+        us=_sum('amount', Q(payer_type='us')),
+        them=_sum('amount', Q(payer_type='them')),
+        total=_sum('amount'),
+    )
+
+
+def amount_total(model, filter_q=None):
+    """إجمالي حقل amount لدفتر بسيط (مصاريف البيت، المداخيل)"""
+    return model.objects.filter(**(filter_q or {})).aggregate(total=_sum('amount'))['total']
+
+
+def period_totals(filter_q=None):
+    """أرقام الفترة من الدفاتر الأربعة (أربعة استعلامات)"""
+    return {
+        'transactions': transaction_totals(filter_q),
+        'contact_expenses': contact_expense_totals(filter_q),
+        'home_expenses': amount_total(HomeExpense, filter_q),
+        'income': amount_total(IncomeRecord, filter_q),
+    }
+
+
+def loan_totals(installments):
+    """إجمالي أقساط قرض، فوائدها، المدفوع منها والمتبقي"""
+    totals = installments.aggregate(
+        total_flow=_sum('total_installment_amount'),
+        total_interest=_sum('interest_component'),
+        total_paid=_sum('total_installment_amount', Q(is_paid=True)),
+    )
+    totals['total_remaining'] = totals['total_flow'] - totals['total_paid']
+    return totals
+
+
+# --- 2. أرصدة التجار ---
+
+def contact_summary(contact):
+    """
+    صافي حساب تاجر (لنا + / علينا -) من فواتيره ومصاريفه ورصيده المرحل من الأرشيف:
+    ثلاثة استعلامات مهما كان عدد فواتيره.
+    """
+    invoices = transaction_totals(archive=False, contact=contact)
+    expenses = contact_expense_totals(contact=contact)
+    carry_forward = ContactCarryForward.objects.filter(contact=contact).first()
+    balance_us = invoices['receivable'] + expenses['us']
+    balance_them = invoices['payable'] + expenses['them']
+    summary = {
+        'total_out': invoices['sales'],
+        'total_in': invoices['purchases'],
+        'total_expenses': expenses['total'],
+        'net_balance': balance_us - balance_them,
+        'carry_forward': carry_forward,
+    }
+    if carry_forward:
+        summary['total_out'] += carry_forward.sales
+        summary['total_in'] += carry_forward.purchases
+        summary['net_balance'] += carry_forward.balance
+    return summary
+
+
+def outstanding_balances():
+    """
+    صافي رصيد كل تاجر من الفواتير غير المسددة بالكامل ومصاريف التجار، مقسماً إلى
+    (ديون لنا، ديون علينا) كقوائم {'contact_name', 'amount'} مرتبة من الأكبر.
+    """
+    balances = {}
+
+    remaining = ExpressionWrapper(F('transaction__total_price') - F('amount_paid'), output_field=DecimalField())
+    invoices = FinancialRecord.objects.annotate(rem=remaining).filter(rem__gt=0).values(
+        'transaction__contact_id'
+    ).annotate(
+        sold=_sum('rem', Q(transaction__transaction_type='out')),
+        bought=_sum('rem', Q(transaction__transaction_type='in')),
+    ).order_by()
+    for row in invoices:
+        cid = row['transaction__contact_id']
+        balances[cid] = balances.get(cid, ZERO) + row['sold'] - row['bought']
+
+    expenses = ContactExpense.objects.values('contact_id').annotate(
+        us=_sum('amount', Q(payer_type='us')),
+        them=_sum('amount', Q(payer_type='them')),
+    ).order_by()
+    for row in expenses:
+        cid = row['contact_id']
+        balances[cid] = balances.get(cid, ZERO) + row['us'] - row['them']
+
+    names = dict(Contact.objects.filter(pk__in=[cid for cid, bal in balances.items() if bal]).values_list('pk', 'name'))
+    ranked = sorted(balances.items(), key=lambda item: abs(item[1]), reverse=True)
+    receivable = [{'contact_name': names.get(cid), 'amount': bal} for cid, bal in ranked if bal > 0]
+    payable = [{'contact_name': names.get(cid), 'amount': abs(bal)} for cid, bal in ranked if bal < 0]
+    return receivable, payable
@@ -0,0 +1,216 @@
+"""
+سجل الاستعلامات البطيئة (اختياري) لمعرفة أي استدعاء ORM جعل الصفحة بطيئة.
+
+    STORE_SLOW_QUERY_MS = 200    # أو متغير البيئة STORE_SLOW_QUERY_MS، و0 = معطل
+
+SlowQueryMiddleware يلف كل طلب بـ connection.execute_wrapper، وأي استعلام يتجاوز الحد يُكتب
+سطر JSON في STORE_SLOW_QUERY_LOG: الـ SQL ومعاملاته، المدة، الصفحة، سطر الكود الذي استدعاه،
+وخطة التنفيذ (EXPLAIN QUERY PLAN) لاستعلامات القراءة. عند التعطيل يخرج الـ middleware من
+السلسلة (MiddlewareNotUsed) فلا يكلف الطلبات شيئاً.
+
+السجل ملف وليس جدولاً: الكتابة فيه لا تدخل في معاملة الطلب (فلا تضيع مع rollback) ولا تأخذ
+قفل الكتابة في SQLite أثناء صفحة قراءة فقط، وكل العمليات تضيف أسطرها لنفس الملف (وضع append).
+صفحة الاستعلامات البطيئة تجمع الأسطر بشكل الاستعلام (fingerprint: الـ SQL بدون القيم) وترتبها
+بمجموع الوقت، مع أبطأ مثال لكل شكل.
+
+المدة هي وقت cursor.execute: في SQLite يشمل ذلك تنفيذ الاستعلام حتى أول صف (كل التجميع
+والترتيب)، وليس جلب باقي الصفوف بعده.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+READ_PREFIXES = ('SELECT', 'WITH')
+MAX_PARAM_LENGTH = 200
+# ملفات القياس نفسها (هذا الملف و execute_wrapper في metrics.py) ليست مصدر الاستعلام
+INSTRUMENTATION_FILES = {__file__, os.path.join(os.path.dirname(__file__), 'metrics.py')}
+
+RE_STRING = re.compile(r"'(?:[^']|'')*'")
+RE_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+RE_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+RE_SPACE = re.compile(r'\s+')
+
+_write_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """(شكل الاستعلام بدون القيم، بصمته): نفس الاستعلام بقيم أو أطوال IN مختلفة له نفس الشكل"""
+    shape = RE_SPACE.sub(' ', sql).strip()
+    shape = RE_STRING.sub('?', shape.replace('%s', '?'))
+    shape = RE_NUMBER.sub('?', shape)
+    shape = RE_PLACEHOLDER_LIST.sub('?, ...', shape)
+    return shape, hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def _param(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + '…'
+
+
+def _params(params, many):
+    if many:
+        return f"{len(params)} مجموعة معاملات (executemany)"
+    if isinstance(params, dict):
+        return {key: _param(value) for key, value in params.items()}
+    return [_param(value) for value in params or ()]
+
+
+def _caller():
+    """أقرب سطر من كود المشروع (وليس Django أو المكتبات) في مسار الاستدعاء"""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if filename in INSTRUMENTATION_FILES or not filename.startswith(base) or 'site-packages' in filename:
+            continue
+        return f"{os.path.relpath(filename, base)}:{frame.lineno} ({frame.name})"
+    return ''
+
+
+def _plan(db, sql, params):
+    """خطة التنفيذ كشجرة نصية (سطر لكل خطوة، والمسافة البادئة = العمق)"""
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(f"{db.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+    except (DatabaseError, NotImplementedError) as e:
+        return f"تعذر حساب الخطة: {e}"
+    depth = {}
+    lines = []
+    for row in rows:
+        if len(row) == 4:
+            # SQLite: (id, parent, notused, detail)
+            depth[row[0]] = depth.get(row[1], -1) + 1
+            lines.append('  ' * depth[row[0]] + str(row[3]))
+        else:
+            lines.append(' '.join(str(column) for column in row))
+    return '\n'.join(lines)
+
+
+def log_path():
+    return Path(getattr(settings, 'STORE_SLOW_QUERY_LOG', settings.BASE_DIR / 'logs' / 'slow_queries.jsonl'))
+
+
+def _append(entry):
+    path = log_path()
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    try:
+        with _write_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # نسخة قديمة واحدة (.1) حتى لا يكبر الملف بلا حد
+            if path.exists() and path.stat().st_size > getattr(settings, 'STORE_SLOW_QUERY_MAX_BYTES', 5 * 1024 * 1024):
+                os.replace(path, path.with_name(path.name + '.1'))
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError:
+        # السجل أداة تشخيص، وتعذر الكتابة فيه لا يجب أن يُفشل الطلب نفسه
+        pass
+
+
+class SlowQueryLog:
+    """execute_wrapper يسجل استعلامات طلب واحد الأبطأ من threshold_ms"""
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold_ms = threshold_ms
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # استعلام EXPLAIN نفسه يمر من نفس الـ wrapper
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= self.threshold_ms:
+            self.record(sql, params, many, elapsed_ms, context['connection'])
+        return result
+
+    def record(self, sql, params, many, elapsed_ms, db):
+        plan = ''
+        if not many and sql.lstrip().upper().startswith(READ_PREFIXES):
+            self.explaining = True
+            try:
+                plan = _plan(db, sql, params)
+            finally:
+                self.explaining = False
+        match = self.request.resolver_match
+        shape, key = fingerprint(sql)
+        _append({
+            'at': timezone.now().isoformat(timespec='seconds'),
+            'ms': round(elapsed_ms, 1),
+            'fingerprint': key,
+            'shape': shape,
+            'sql': sql,
+            'params': _params(params, many),
+            'view': (match.view_name if match else '') or 'unmatched',
+            'path': self.request.path,
+            'source': _caller(),
+            'plan': plan,
+        })
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.threshold_ms = getattr(settings, 'STORE_SLOW_QUERY_MS', 0)
+        if not self.threshold_ms:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(SlowQueryLog(request, self.threshold_ms)):
+            return self.get_response(request)
+
+
+def read_entries():
+    """كل أسطر السجل (النسخة القديمة ثم الحالية)، مع تجاهل أي سطر تالف"""
+    path = log_path()
+    for candidate in (path.with_name(path.name + '.1'), path):
+        try:
+            with open(candidate, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def top_queries(limit=None):
+    """
+    أشكال الاستعلامات الأعلى في مجموع الوقت: [{fingerprint, shape, count, total_ms, avg_ms,
+    max_ms, views, last_at, slowest}] حيث slowest هو السطر الكامل لأبطأ مرة (مع الخطة).
+    """
+    limit = limit or getattr(settings, 'STORE_SLOW_QUERY_TOP', 20)
+    groups = {}
+    for entry in read_entries():
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'shape': entry['shape'], 'count': 0, 'total_ms': 0.0,
+                'views': set(), 'last_at': entry['at'], 'slowest': entry,
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['views'].add(entry['view'])
+        group['last_at'] = max(group['last_at'], entry['at'])
+        if entry['ms'] > group['slowest']['ms']:
+            group['slowest'] = entry
+    ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+    for group in ranked:
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['max_ms'] = group['slowest']['ms']
+        group['views'] = sorted(group['views'])
+    return ranked
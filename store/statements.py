@@ -0,0 +1,162 @@
+"""
+توليد كشوف حساب التجار دفعة واحدة (آخر الشهر).
+
+البيانات تُجلب لكل التجار بأربع استعلامات فقط (مع الرصيد المرحل من الأرشيف)، ثم يتم
+توزيع توليد الملفات على مجموعة عمليات (Process Pool) لا تلمس قاعدة البيانات إطلاقاً.
+"""
+import hashlib
+import json
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.apps import apps
+from django.db import connection
+from django.db.models import BigIntegerField, Count, Func, Sum
+from django.template.loader import render_to_string
+
+from .models import Contact, DailyTransaction, PaymentInstallment, ContactExpense, ContactCarryForward
+
+ZERO = Decimal(0)
+MANIFEST_NAME = 'manifest.json'
+
+
+def _row_hash(*values):
+    return int.from_bytes(hashlib.blake2b(repr(values).encode(), digest_size=4).digest(), 'big')
+
+
+class RowHash(Func):
+    """
+    بصمة 32 بت لمحتوى الصف داخل SQLite (دالة بايثون مسجلة على الاتصال). مجموعها لكل تاجر
+    يتغير مع تعديل أي حقل يظهر في الكشف، ويبقى أقل من 2^63 حتى مع مليارات الصفوف.
+    """
+    function = 'store_row_hash'
+    output_field = BigIntegerField()
+
+
+def fingerprints(contact_ids):
+    """
+    بصمة لبيانات كل تاجر تتغير مع أي إضافة أو تعديل أو حذف، بدون جلب الصفوف نفسها:
+    عدد الصفوف ومجموع RowHash لكل الحقول المعروضة في الكشف (تاريخ دفعة قديمة، ملاحظات،
+    نقل فاتورة لمنتج آخر بنفس الإجمالي...).
+    """
+    connection.ensure_connection()
+    connection.connection.create_function('store_row_hash', -1, _row_hash, deterministic=True)
+    parts = {cid: [] for cid in contact_ids}
+    sources = [
+        (DailyTransaction.objects.filter(contact_id__in=contact_ids), 'contact_id',
+         ['pk', 'date', 'transaction_type', 'product__name', 'weight', 'price_per_kg', 'total_price',
+          'financialrecord__amount_paid']),
+        (PaymentInstallment.objects.filter(financial_record__transaction__contact_id__in=contact_ids),
+         'financial_record__transaction__contact_id',
+         ['pk', 'date_paid', 'amount', 'notes', 'financial_record_id', 'financial_record__transaction__product__name']),
+        (ContactExpense.objects.filter(contact_id__in=contact_ids), 'contact_id',
+         ['pk', 'date', 'amount', 'payer_type', 'notes']),
+        (ContactCarryForward.objects.filter(contact_id__in=contact_ids), 'contact_id',
+         ['sales', 'purchases', 'collected', 'paid']),
+    ]
+    for index, (queryset, key, fields) in enumerate(sources):
+        rows = queryset.values(key).annotate(n=Count('pk'), h=Sum(RowHash(*fields))).order_by()
+        for row in rows:
+            parts[row[key]].append((index, row['n'], row['h']))
+    contacts = {pk: (name, phone) for pk, name, phone in Contact.objects.filter(pk__in=contact_ids).values_list(
+        'pk', 'name', 'phone'
+    )}
+    return {
+        cid: hashlib.sha256(json.dumps([contacts.get(cid), sorted(p)], default=str).encode()).hexdigest()
+        for cid, p in parts.items()
+    }
+
+
+def load_statements(contact_ids):
+    """تجميع كل بيانات الكشوف في قواميس بسيطة قابلة للإرسال إلى العمليات الفرعية"""
+    statements = {
+        c['id']: {'contact': c, 'transactions': [], 'payments': [], 'expenses': [], 'carry_forward': None}
+        for c in Contact.objects.filter(pk__in=contact_ids).values('id', 'name', 'phone')
+    }
+
+    for t in DailyTransaction.objects.filter(contact_id__in=contact_ids).values(
+        'contact_id', 'date', 'transaction_type', 'product__name', 'weight', 'price_per_kg',
+        'total_price', 'financialrecord__amount_paid',
+    ).order_by('date', 'pk'):
+        t['paid'] = t.pop('financialrecord__amount_paid') or ZERO
+        t['remaining'] = t['total_price'] - t['paid']
+        statements[t['contact_id']]['transactions'].append(t)
+
+    for p in PaymentInstallment.objects.filter(financial_record__transaction__contact_id__in=contact_ids).values(
+        'financial_record__transaction__contact_id', 'date_paid', 'amount', 'notes',
+        'financial_record__transaction__transaction_type', 'financial_record__transaction__product__name',
+    ).order_by('date_paid', 'pk'):
+        statements[p['financial_record__transaction__contact_id']]['payments'].append({
+            'date_paid': p['date_paid'],
+            'amount': p['amount'],
+            'notes': p['notes'],
+            'transaction_type': p['financial_record__transaction__transaction_type'],
+            'product': p['financial_record__transaction__product__name'],
+        })
+
+    for e in ContactExpense.objects.filter(contact_id__in=contact_ids).values(
+        'contact_id', 'date', 'amount', 'payer_type', 'notes',
+    ).order_by('date', 'pk'):
+        statements[e['contact_id']]['expenses'].append(e)
+
+    # الفواتير المسددة المنقولة للأرشيف تظهر كسطر واحد بإجمالياتها
+    for cf in ContactCarryForward.objects.filter(contact_id__in=contact_ids).values(
+        'contact_id', 'sales', 'purchases', 'collected', 'paid',
+    ):
+        cf['balance'] = (cf['sales'] - cf['collected']) - (cf['purchases'] - cf['paid'])
+        statements[cf.pop('contact_id')]['carry_forward'] = cf
+
+    return statements
+
+
+def summarize(statement):
+    """نفس معادلة صفحة التاجر: (المتبقي لنا + ما دفعناه عنه) - (المتبقي علينا + ما دفعه عنا)"""
+    txs, expenses = statement['transactions'], statement['expenses']
+    balance_us = sum((t['remaining'] for t in txs if t['transaction_type'] == 'out'), ZERO)
+    balance_us += sum((e['amount'] for e in expenses if e['payer_type'] == 'us'), ZERO)
+    balance_them = sum((t['remaining'] for t in txs if t['transaction_type'] == 'in'), ZERO)
+    balance_them += sum((e['amount'] for e in expenses if e['payer_type'] == 'them'), ZERO)
+    total_out = sum((t['total_price'] for t in txs if t['transaction_type'] == 'out'), ZERO)
+    total_in = sum((t['total_price'] for t in txs if t['transaction_type'] == 'in'), ZERO)
+    net_balance = balance_us - balance_them
+    carry_forward = statement.get('carry_forward')
+    if carry_forward:
+        total_out += carry_forward['sales']
+        total_in += carry_forward['purchases']
+        net_balance += carry_forward['balance']
+    return {
+        'total_out': total_out,
+        'total_in': total_in,
+        'total_expenses': sum((e['amount'] for e in expenses), ZERO),
+        'net_balance': net_balance,
+        'total_remaining': abs(net_balance),
+    }
+
+
+def init_worker():
+    # مع spawn تبدأ العملية الفرعية بدون إعدادات Django
+    if not apps.ready:
+        django.setup()
+
+
+def render_statement(statement, output_dir, generated_at, pdf=False):
+    """يعمل داخل العملية الفرعية: توليد HTML (وPDF اختيارياً) لتاجر واحد"""
+    context = dict(statement, generated_at=generated_at, **summarize(statement))
+    html = render_to_string('statement.html', context)
+
+    base = Path(output_dir) / f"statement_{statement['contact']['id']}"
+    base.with_suffix('.html').write_text(html, encoding='utf-8')
+    if pdf:
+        from weasyprint import HTML
+        HTML(string=html).write_pdf(base.with_suffix('.pdf'))
+    return statement['contact']['id']
+
+
+def read_manifest(output_dir):
+    path = Path(output_dir) / MANIFEST_NAME
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def write_manifest(output_dir, manifest):
+    (Path(output_dir) / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
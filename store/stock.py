@@ -0,0 +1,138 @@
+"""
+دفتر حركة المخزون: رصيد أي منتج في أي يوم وتاريخ حركته والتسويات اليدوية.
+
+كل حركة تحمل الرصيد بعدها (balance_after)، فرصيد يوم معين هو آخر حركة قبله من الفهرس
+(product, date) بدون المرور على اليومية، وكشف الحركة يعرض الرصيد الجاري كما هو مخزن.
+الكمية المتاحة في Product باقية كما هي لباقي الصفحات، وتساوي دائماً آخر رصيد في الدفتر.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import Case, CharField, DecimalField, F, Min, OuterRef, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import (
+    ArchivedTransaction, DailyTransaction, Product, StockMovement, ensure_period_open, invalidate_checkpoints,
+)
+
+ZERO = Decimal(0)
+REBUILT_KINDS = ['in', 'out', 'edit', 'delete']
+
+
+def stock_as_of(as_of, product_ids=None):
+    """{المنتج: الكمية في نهاية يوم as_of} من آخر حركة لكل منتج في أو قبل هذا اليوم"""
+    last = StockMovement.objects.filter(product=OuterRef('pk'), date__lte=as_of).order_by('-date', '-id')
+    products = Product.objects.annotate(
+        balance=Coalesce(Subquery(last.values('balance_after')[:1]), ZERO, output_field=DecimalField())
+    )
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return dict(products.values_list('pk', 'balance'))
+
+
+def movement_history(product, start=None, end=None):
+    """حركات المنتج في الفترة [start, end] بالترتيب مع الرصيد الجاري، والرصيد قبل أول يوم"""
+    movements = StockMovement.objects.filter(product=product).select_related('user')
+    opening = ZERO
+    if start:
+        movements = movements.filter(date__gte=start)
+        opening = stock_as_of(start - timedelta(days=1), [product.pk]).get(product.pk, ZERO)
+    if end:
+        movements = movements.filter(date__lte=end)
+    return opening, movements.order_by('date', 'id')
+
+
+def adjust_stock(product, quantity, date=None, notes='', user=None):
+    """تسوية يدوية (هالك، فرق جرد...) بكمية موجبة أو سالبة، وترفض أي تاريخ داخل فترة مغلقة"""
+    date = date or timezone.now().date()
+    if not quantity:
+        raise ValidationError("كمية التسوية لا يمكن أن تكون صفراً.")
+    if not notes.strip():
+        raise ValidationError("اكتب سبب التسوية (هالك، فرق جرد...).")
+    ensure_period_open(date)
+    with transaction.atomic():
+        movement = StockMovement.record(product.pk, date, quantity, 'adjust', notes=notes.strip(), user=user)
+        # لقطات المخزون بعد هذا التاريخ لم تعد صحيحة
+        invalidate_checkpoints([date])
+    bump_data_version()
+    return movement
+
+
+def _insert_select(queryset, columns):
+    """
+    INSERT INTO ... SELECT بنفس SQL الـ ORM، بدون تحميل الصفوف في بايثون.
+    columns = {اسم القيمة في values_list: عمود الدفتر}، لأن الـ ORM يضع الحقول قبل الـ annotations.
+    """
+    query = queryset.query
+    names = [*query.extra_select, *query.values_select, *query.annotation_select]
+    sql, params = query.sql_with_params()
+    table = StockMovement._meta.db_table
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns[name] for name in names)}) {sql}", params)
+        return cursor.rowcount
+
+
+def recompute_balances(product_ids=None):
+    """إعادة حساب balance_after لكل الحركات بمجموع جارٍ (window function) بترتيب (التاريخ، الرقم)"""
+    movements = StockMovement.objects.all()
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    running = movements.annotate(running=Window(
+        Sum('quantity'), partition_by=[F('product_id')], order_by=[F('date').asc(), F('id').asc()],
+    )).values_list('id', 'running').order_by()
+    sql, params = running.query.sql_with_params()
+    table = StockMovement._meta.db_table
+    with connections[movements.db].cursor() as cursor:
+        # التقريب لخانتين يمنع تراكم كسور الجمع العشري في SQLite
+        cursor.execute(
+            f"UPDATE {table} SET balance_after = ROUND(w.running, 2) FROM ({sql}) AS w WHERE {table}.id = w.id",
+            params,
+        )
+
+
+def rebuild_ledger():
+    """
+    إعادة بناء حركات الفواتير من اليومية والأرشيف (حركة وارد / صادر لكل فاتورة بوضعها الحالي).
+    التسويات اليدوية تبقى، وأي فرق بين الكمية المتاحة ومجموع الدفتر يُسجل كتسوية افتتاحية في اليوم
+    السابق لأول حركة للمنتج (الرصيد الذي كان موجوداً قبل الدفتر)، فرصيد أي تاريخ قديم يشمله أيضاً. يرجع {'movements': عدد حركات الفواتير، 'adjusted': عدد التسويات}.
+    """
+    now = timezone.now()
+    columns = {
+        'product_id': 'product_id', 'date': 'date', 'transaction_type': 'kind', 'signed': 'quantity',
+        'zero': 'balance_after', 'id': 'transaction_id', 'no_notes': 'notes', 'recorded': 'created_at',
+    }
+    with transaction.atomic():
+        StockMovement.objects.filter(kind__in=REBUILT_KINDS).delete()
+        count = 0
+        for model in (DailyTransaction, ArchivedTransaction):
+            rows = model.objects.annotate(
+                signed=Case(When(transaction_type='in', then=F('weight')), default=-F('weight'), output_field=DecimalField()),
+                zero=Value(0, output_field=DecimalField()),
+                no_notes=Value('', output_field=CharField()),
+                recorded=Value(now),
+            ).values_list(*columns).order_by()
+            count += _insert_select(rows, columns)
+
+        ledger = {
+            pid: (total, first) for pid, total, first in StockMovement.objects.values('product_id').annotate(
+                total=Sum('quantity'), first=Min('date'),
+            ).values_list('product_id', 'total', 'first').order_by()
+        }
+        # المنتج الذي ليس له أي حركة يأخذ بداية الدفتر كله
+        start = min((first for _, first in ledger.values()), default=now.date() + timedelta(days=1))
+        adjustments = []
+        for pid, quantity in Product.objects.values_list('pk', 'quantity_available'):
+            total, first = ledger.get(pid, (ZERO, start))
+            difference = round(quantity - total, 2)
+            if difference:
+                adjustments.append(StockMovement(
+                    product_id=pid, date=first - timedelta(days=1), kind='adjust', quantity=difference, balance_after=0,
+                    notes="فرق الكمية المتاحة عن الفواتير عند بناء الدفتر",
+                ))
+        StockMovement.objects.bulk_create(adjustments)
+        recompute_balances()
+    return {'movements': count, 'adjusted': len(adjustments)}
@@ -0,0 +1,15 @@
+import os
+
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """أسماء مشفرة + gzip/brotli، مع السماح بتمرير مجلد لوسم static كما يفعل jazzmin مع مجلد الثيمات"""
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if os.path.isdir(self.path(name)):
+                return name
+            raise
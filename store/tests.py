@@ -1,3 +1,1094 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import pyarrow.parquet as pq
+
+from . import metrics
+from .alerts import notify_pending, refresh_alerts
+from .analytics import inventory_value, profitability_report
+from .archive import archive_ledger
+from .backup import VERIFY_ALIAS, backups_to_delete, create_backup, list_backups, verify_backup
+from .bank_import import import_lines, imported_keys, match_statement, parse_statement
+from .bulk import create_payments, delete_payments, set_installments_paid
+from .exports import export_all
+from .forecast import cash_forecast
+from .jobs import TASKS, enqueue, run_job
+from .loans import apply_reschedule, plan_reschedule, portfolio_summary
+from .management.commands import loadtest
+from .management.commands.build_icons import ICON_PATTERN
+from .models import (
+    Alert, ArchivedTransaction, BankInstallment, BankLoan, Capital, CapitalAdjustment, Contact, ContactExpense,
+    DailyTransaction, FinancialRecord, HomeExpense, IncomeRecord, Job, PaymentInstallment, PeriodClose, Product,
+    StockMovement,
+)
+from .periods import build_checkpoints, close_period, loan_principal_as_of, position_as_of, reopen_period
+from .reconcile import reconcile
+from .report_builder import parse_spec, reaches_archive, run_report
+from .reports import (
+    contact_summary, loan_totals, outstanding_balances, period_filter, period_totals, transaction_totals,
+)
+from .slow_queries import fingerprint, read_entries, top_queries
+from .statements import fingerprints, load_statements, summarize
+from .stock import rebuild_ledger, stock_as_of
+
+
+# كاش في الذاكرة يُفرغ بعد كل اختبار: رقم إصدار البيانات يرجع لنفس القيمة مع كل rollback
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LedgerTestCase(TestCase):
+    """خزنة، تاجران، منتجان، وفواتير على ثلاثة أشهر من 2025 (بعضها مسدد بالكامل وبعضها جزئياً)"""
+
+    def tearDown(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.capital = Capital.objects.create(initial_amount=Decimal('100000'))
+        cls.customer = Contact.objects.create(name="عميل")
+        cls.supplier = Contact.objects.create(name="مورد")
+        cls.rice = Product.objects.create(name="أرز", purchase_price_per_kg=Decimal('20'), selling_price_per_kg=Decimal('25'))
+        cls.sugar = Product.objects.create(name="سكر", purchase_price_per_kg=Decimal('30'), selling_price_per_kg=Decimal('35'))
+
+        cls.invoice(date(2025, 1, 5), 'in', cls.supplier, cls.rice, '1000', '20', paid='20000')
+        cls.invoice(date(2025, 1, 10), 'in', cls.supplier, cls.sugar, '500', '30', paid='5000')
+        cls.invoice(date(2025, 1, 20), 'out', cls.customer, cls.rice, '300', '25', paid='7500')
+        cls.invoice(date(2025, 2, 3), 'out', cls.customer, cls.sugar, '100', '35', paid='1000')
+        cls.invoice(date(2025, 2, 15), 'out', cls.customer, cls.rice, '200', '25')
+        cls.invoice(date(2025, 3, 1), 'in', cls.supplier, cls.rice, '400', '21', paid='8400')
+        HomeExpense.objects.create(date=date(2025, 2, 20), description="كهرباء", amount=Decimal('750'))
+
+    @staticmethod
+    def invoice(day, kind, contact, product, weight, price, paid='0'):
+        return DailyTransaction.objects.create(
+            date=day, transaction_type=kind, contact=contact, product=product,
+            weight=Decimal(weight), price_per_kg=Decimal(price), paid_amount_now=Decimal(paid),
+        )
+
+    def treasury(self):
+        return Capital.objects.get().initial_amount
+
+    def position(self, as_of):
+        """أرقام المركز المالي بدون اللقطة نفسها، والأرصدة الصفرية محذوفة حتى تتساوى المقارنة"""
+        result = position_as_of(as_of)
+        result.pop('snapshot')
+        result['contact_balances'] = {cid: b for cid, b in result['contact_balances'].items() if b}
+        result['stock'] = {pid: q for pid, q in result['stock'].items() if q}
+        return result
+
+    def capital_updates(self, queries):
+        return sum(1 for query in queries if query['sql'].startswith('UPDATE "store_capital"'))
+
+
+class ReconcileTests(LedgerTestCase):
+    CLEAN = {'amount_paid': [], 'stock': [], 'ledger': [], 'capital': []}
+
+    def setUp(self):
+        # فحص الخزنة يحتاج فترة مغلقة كنقطة مرجعية
+        close_period(date(2024, 12, 1), date(2024, 12, 31))
+
+    def test_consistent_ledgers_have_no_discrepancies(self):
+        self.assertEqual(reconcile(), self.CLEAN)
+
+    def test_detects_and_fixes_each_derived_balance(self):
+        record = FinancialRecord.objects.get(transaction__date=date(2025, 2, 3))
+        movement = StockMovement.objects.filter(product=self.rice).order_by('date', 'id').first()
+        FinancialRecord.objects.filter(pk=record.pk).update(amount_paid=Decimal('999'))
+        Product.objects.filter(pk=self.sugar.pk).update(quantity_available=F('quantity_available') + 7)
+        StockMovement.objects.filter(pk=movement.pk).update(balance_after=Decimal('1'))
+        Capital.objects.update(initial_amount=F('initial_amount') + 100)
+
+        found = reconcile()
+        self.assertEqual(
+            {name: [(d.pk, d.stored, d.expected) for d in rows] for name, rows in found.items()},
+            {
+                'amount_paid': [(record.pk, Decimal('999'), Decimal('1000'))],
+                'stock': [(self.sugar.pk, Decimal('407'), Decimal('400'))],
+                'ledger': [(movement.pk, Decimal('1'), Decimal('1000'))],
+                'capital': [(Capital.objects.get().pk, self.treasury(), self.treasury() - 100)],
+            },
+        )
+
+        reconcile(apply=True)
+        self.assertEqual(reconcile(), self.CLEAN)
+        record.refresh_from_db()
+        self.assertEqual(record.amount_paid, Decimal('1000'))
+
+    def test_only_runs_the_requested_checks(self):
+        Product.objects.filter(pk=self.sugar.pk).update(quantity_available=0)
+        self.assertEqual(reconcile(['amount_paid']), {'amount_paid': []})
+        self.assertEqual(len(reconcile(['stock'])['stock']), 1)
+
+    def test_capital_check_is_skipped_without_a_closed_period(self):
+        PeriodClose.objects.all().delete()
+        self.assertIsNone(reconcile(['capital'])['capital'])
+
+    def test_command_fails_on_drift_and_fixes_with_flag(self):
+        Product.objects.filter(pk=self.rice.pk).update(quantity_available=0)
+        with self.assertRaises(CommandError):
+            call_command('reconcile', stdout=StringIO())
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).quantity_available, 0)
+
+        out = StringIO()
+        call_command('reconcile', '--fix', stdout=out)
+        self.assertIn("تم تصحيح 1 قيمة", out.getvalue())
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).quantity_available, Decimal('900'))
+        call_command('reconcile', stdout=StringIO())
+
+    def test_manual_treasury_edit_is_recorded_as_a_cash_flow(self):
+        admin_user = User.objects.create_superuser('boss', 'boss@example.com', 'pass')
+        self.client.force_login(admin_user)
+        capital = Capital.objects.get()
+        before = self.position(date(2025, 2, 3))
+        edited = self.treasury() + 250
+
+        response = self.client.post(f'/admin/store/capital/{capital.pk}/change/', {'initial_amount': edited})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CapitalAdjustment.objects.get().amount, Decimal('250'))
+
+        self.assertEqual(reconcile(), self.CLEAN)
+        reconcile(apply=True)
+        self.assertEqual(self.treasury(), edited)
+        self.assertEqual(self.position(date(2025, 2, 3)), before)
+
+
+class PeriodCloseTests(LedgerTestCase):
+    def test_closed_period_rejects_edits(self):
+        close_period(date(2025, 1, 1), date(2025, 1, 31))
+        january = DailyTransaction.objects.get(date=date(2025, 1, 20))
+        record = FinancialRecord.objects.get(transaction__date=date(2025, 2, 15))
+
+        january.weight = Decimal('301')
+        with self.assertRaises(ValidationError):
+            january.save()
+        # الحذف يرفض من داخل معاملة Collector (بدون savepoint) فتُلف هنا حتى يستمر الاختبار
+        with self.assertRaises(ValidationError), transaction.atomic():
+            january.delete()
+        with self.assertRaises(ValidationError):
+            PaymentInstallment.objects.create(financial_record=record, amount=Decimal('100'), date_paid=date(2025, 1, 31))
+        with self.assertRaises(ValidationError):
+            create_payments([(record.pk, Decimal('100'), date(2025, 1, 31), '')])
+        self.assertFalse(record.installments.exists())
+
+        # نقل حركة من فترة مفتوحة إلى فترة مغلقة مرفوض أيضاً
+        february = DailyTransaction.objects.get(date=date(2025, 2, 15))
+        february.date = date(2025, 1, 25)
+        with self.assertRaises(ValidationError):
+            february.save()
+
+        reopen_period(PeriodClose.objects.get(period_end=date(2025, 1, 31)))
+        january.save()
+        self.assertEqual(self.position(date(2025, 1, 31))['stock'][self.rice.pk], Decimal('699'))
+
+    def test_position_uses_the_closed_period(self):
+        before = self.position(date(2025, 2, 28))
+        close_period(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(position_as_of(date(2025, 2, 28))['snapshot'].period_end, date(2025, 1, 31))
+        self.assertEqual(self.position(date(2025, 2, 28)), before)
+
+    def test_loan_principal_as_of_ignores_later_deactivation(self):
+        loan = BankLoan.objects.create(
+            bank_name="البنك الأهلي", total_loan_amount=Decimal('12000'), loan_period_months=12, start_date=date(2025, 1, 1),
+        )
+        set_installments_paid(loan.installments.order_by('due_date')[:2], True, on_date=date(2025, 2, 28))
+        self.assertEqual(loan_principal_as_of(date(2024, 12, 31)), 0)
+        self.assertEqual(loan_principal_as_of(date(2025, 3, 31)), Decimal('10000'))
+
+        # إيقاف القرض اليوم لا يغير رصيد مارس 2025 ولا لقطة إقفاله
+        loan.is_active = False
+        loan.save()
+        self.assertEqual(loan.closed_on, timezone.now().date())
+        self.assertEqual(loan_principal_as_of(date(2025, 3, 31)), Decimal('10000'))
+        self.assertEqual(close_period(date(2025, 3, 1), date(2025, 3, 31)).loan_principal_remaining, Decimal('10000'))
+
+        BankLoan.objects.filter(pk=loan.pk).update(closed_on=date(2025, 6, 30))
+        self.assertEqual(loan_principal_as_of(date(2025, 6, 29)), Decimal('10000'))
+        self.assertEqual(loan_principal_as_of(date(2025, 6, 30)), 0)
+
+
+class CheckpointTests(LedgerTestCase):
+    DAYS = [date(2025, 1, 15), date(2025, 1, 31), date(2025, 2, 10), date(2025, 2, 28), date(2025, 3, 31)]
+
+    def test_position_as_of_is_the_same_with_checkpoints(self):
+        without = {day: self.position(day) for day in self.DAYS}
+        self.assertEqual(without[date(2025, 3, 31)]['cash'], self.treasury())
+        self.assertEqual(without[date(2025, 1, 31)]['stock'], {self.rice.pk: Decimal('700'), self.sugar.pk: Decimal('500')})
+
+        self.assertEqual(build_checkpoints(today=date(2025, 4, 15)), 3)
+        for day in self.DAYS:
+            self.assertEqual(self.position(day), without[day], day)
+
+
+class StockLedgerTests(LedgerTestCase):
+    def test_rebuild_dates_opening_stock_before_the_first_movement(self):
+        # رصيد سابق للفواتير (بضاعة موجودة قبل تشغيل البرنامج)، ومنتج بلا أي فاتورة
+        Product.objects.filter(pk=self.rice.pk).update(quantity_available=F('quantity_available') + 50)
+        salt = Product.objects.create(
+            name="ملح", quantity_available=Decimal('30'), purchase_price_per_kg=Decimal('5'), selling_price_per_kg=Decimal('6'),
+        )
+        self.assertEqual(rebuild_ledger()['adjusted'], 2)
+
+        self.assertEqual(stock_as_of(date(2025, 1, 4)), {self.rice.pk: Decimal('50'), self.sugar.pk: 0, salt.pk: Decimal('30')})
+        self.assertEqual(stock_as_of(date(2025, 1, 31))[self.rice.pk], Decimal('750'))
+        self.assertEqual(reconcile(['stock', 'ledger']), {'stock': [], 'ledger': []})
+
+
+class ArchiveTests(LedgerTestCase):
+    def test_archive_keeps_balances(self):
+        close_period(date(2024, 12, 1), date(2024, 12, 31))
+        self.assertEqual(reconcile(), {'amount_paid': [], 'stock': [], 'ledger': [], 'capital': []})
+        days = [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)]
+        before = {day: self.position(day) for day in days}
+        treasury = self.treasury()
+        stock = dict(Product.objects.values_list('pk', 'quantity_available'))
+
+        run = archive_ledger(date(2025, 1, 31))
+        # فاتورتا يناير المسددتان بالكامل فقط: فاتورة السكر عليها باقٍ، وفبراير بعد تاريخ القطع
+        self.assertEqual((run.transactions, run.payments), (2, 2))
+        self.assertEqual(ArchivedTransaction.objects.count(), 2)
+        self.assertEqual(DailyTransaction.objects.filter(date__lte=date(2025, 1, 31)).count(), 1)
+
+        for day in days:
+            self.assertEqual(self.position(day), before[day], day)
+
+        # المطابقة بعد الأرشفة لا تجد فروقاً ولا تغير شيئاً
+        self.assertEqual(reconcile(apply=True), {'amount_paid': [], 'stock': [], 'ledger': [], 'capital': []})
+        self.assertEqual(self.treasury(), treasury)
+        self.assertEqual(dict(Product.objects.values_list('pk', 'quantity_available')), stock)
+
+
+    def test_report_builder_and_exports_read_the_archive(self):
+        specs = [
+            parse_spec({'group': 'month', 'measures': 'total_price,paid,margin'}),
+            parse_spec({'group': 'contact', 'measures': 'total_price,remaining', 'type': 'out'}),
+            parse_spec({'source': 'payments', 'group': 'type', 'measures': 'count,amount', 'start': '2025-01-01'}),
+            parse_spec({'measures': 'weight,profit'}),
+        ]
+        before = [run_report(spec)['rows'] for spec in specs]
+        with tempfile.TemporaryDirectory() as output:
+            export_all(Path(output) / 'before', tables=['transactions', 'payments'])
+            archive_ledger(date(2025, 1, 31))
+            self.assertEqual([run_report(spec)['rows'] for spec in specs], before)
+            # بداية بعد تاريخ القطع: الأرشيف لا يدخل
+            self.assertFalse(reaches_archive(parse_spec({'start': '2025-02-01'})))
+
+            export_all(Path(output) / 'after', tables=['transactions', 'payments'])
+            for table in ('transactions', 'payments'):
+                self.assertEqual(
+                    pq.read_table(Path(output) / 'after' / table).to_pylist(),
+                    pq.read_table(Path(output) / 'before' / table).to_pylist(),
+                )
+
+    def test_transactions_list_rows_match_totals_after_archiving(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        archive_ledger(date(2025, 1, 31))
+
+        response = self.client.get(reverse('transactions_list'), {'period': 'all'})
+        rows = response.context['transactions']
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(sum(row.paid for row in rows if row.transaction_type == 'out'), response.context['actual_collection'])
+        self.assertEqual(sum(row.paid for row in rows if row.transaction_type == 'in'), response.context['actual_payments'])
+        self.assertContains(response, '/admin/store/archivedtransaction/', count=2)
+
+        # فترة بعد تاريخ القطع لا تقرأ الأرشيف
+        response = self.client.get(reverse('transactions_list'), {'period': 'custom', 'start_date': '2025-02-01', 'end_date': '2025-03-31'})
+        self.assertEqual(len(response.context['transactions']), 3)
+
+
+class BulkPaymentTests(LedgerTestCase):
+    def test_delete_payments_reverses_the_treasury_once(self):
+        treasury = self.treasury()
+        payments = PaymentInstallment.objects.filter(date_paid__gte=date(2025, 2, 1))
+        with CaptureQueriesContext(connection) as queries:
+            count, delta = delete_payments(payments)
+        # حذف تحصيل 1000 يُنقص الخزنة، وحذف سداد 8400 يعيده إليها
+        self.assertEqual((count, delta), (2, Decimal('7400')))
+        self.assertEqual(self.capital_updates(queries), 1)
+        self.assertEqual(self.treasury(), treasury + 7400)
+        self.assertEqual(reconcile(['amount_paid']), {'amount_paid': []})
+
+    def test_mark_installments_paid_and_unpaid(self):
+        loan = BankLoan.objects.create(
+            bank_name="البنك الأهلي", total_loan_amount=Decimal('12000'), interest_rate_percentage=Decimal('10'),
+            loan_period_months=12, start_date=date(2025, 1, 1),
+        )
+        installments = list(loan.installments.order_by('due_date')[:3])
+        Alert.objects.create(key=f"bank:{installments[0].pk}", kind='bank_overdue', title="قسط", message="قسط")
+        treasury = self.treasury()
+
+        with CaptureQueriesContext(connection) as queries:
+            count, delta = set_installments_paid(installments, True, on_date=date(2025, 3, 20))
+        self.assertEqual((count, delta), (3, Decimal('-3300')))
+        self.assertEqual(self.capital_updates(queries), 1)
+        self.assertEqual(self.treasury(), treasury - 3300)
+        self.assertFalse(Alert.objects.get().is_active)
+
+        # الأقساط المدفوعة بالفعل لا تُحسب مرتين
+        self.assertEqual(set_installments_paid(loan.installments.order_by('due_date')[:4], True, on_date=date(2025, 4, 1))[0], 1)
+        self.assertEqual(set_installments_paid(loan.installments.all(), False), (4, Decimal('4400')))
+        self.assertEqual(self.treasury(), treasury)
+
+    def test_locked_date_aborts_the_whole_selection(self):
+        payments = PaymentInstallment.objects.all()
+        close_period(date(2025, 1, 1), date(2025, 1, 31))
+        treasury = self.treasury()
+        with self.assertRaises(ValidationError):
+            delete_payments(payments)
+        self.assertEqual(PaymentInstallment.objects.count(), 5)
+        self.assertEqual(self.treasury(), treasury)
+
+
+class IdempotencyTests(LedgerTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.record = FinancialRecord.objects.get(transaction__date=date(2025, 2, 15))
+
+    def post_payment(self, key):
+        return self.client.post(
+            f'/update-paid/{self.record.pk}/', {'amount_paid': '1500', 'date': '2025-03-10'},
+            HTTP_X_IDEMPOTENCY_KEY=key, HTTP_REFERER='/',
+        )
+
+    def test_replay_does_not_post_twice(self):
+        treasury = self.treasury()
+        first = self.post_payment('a' * 32)
+        second = self.post_payment('a' * 32)
+
+        self.assertFalse(first.json()['duplicate'])
+        self.assertTrue(second.json()['duplicate'])
+        self.assertEqual(self.record.installments.count(), 1)
+        self.assertEqual(self.treasury(), treasury + 1500)
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.amount_paid, Decimal('1500'))
+
+        # مفتاح جديد = عملية جديدة
+        self.post_payment('b' * 32)
+        self.assertEqual(self.record.installments.count(), 2)
+
+    def test_rejected_request_does_not_reserve_the_key(self):
+        self.client.post(
+            f'/update-paid/{self.record.pk}/', {'amount_paid': '100', 'date': '2025-03-10', 'idempotency_key': 'bad key'},
+            HTTP_REFERER='/',
+        )
+
+
+class JobTests(LedgerTestCase):
+    def test_worker_runs_queued_jobs_and_retries_failures(self):
+        failing = mock.Mock(side_effect=RuntimeError("boom"))
+        with mock.patch.dict(TASKS, {'flaky': failing}):
+            call_command('enqueue_job', 'flaky', 'month="2025-01"', 'limit=2', stdout=StringIO())
+            job = Job.objects.get()
+            self.assertEqual(job.payload, {'month': '2025-01', 'limit': 2})
+
+            call_command('run_worker', '--burst', stdout=StringIO())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('pending', 1))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIn("boom", job.last_error)
+
+            Job.objects.update(run_after=timezone.now(), attempts=2)
+            call_command('run_worker', '--burst', stdout=StringIO())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 3))
+        failing.assert_called_with(month='2025-01', limit=2)
+
+        with self.assertRaises(CommandError):
+            call_command('enqueue_job', 'generate_loan_schedule', stdout=StringIO())
+
+    @override_settings(STORE_JOBS_EAGER=True)
+    def test_eager_mode_records_the_attempt(self):
+        job = enqueue('precompute_reports', reports=[{'group': 'month', 'measures': 'total_price'}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), ('done', 1, {'reports': 1}))
+        self.assertIsNotNone(job.started_at)
+        self.assertGreaterEqual(job.finished_at, job.started_at)
+
+    def test_export_and_statement_tasks(self):
+        with tempfile.TemporaryDirectory() as output:
+            job = run_job(enqueue('export_analytics', output=output, tables=['transactions']))
+            self.assertEqual(job.result, {'exported': {'transactions': 6}})
+
+            job = run_job(enqueue('generate_statements', output=output, contacts=[self.customer.pk]))
+            self.assertEqual(job.status, 'done', job.last_error)
+            self.assertTrue((Path(output) / f'statement_{self.customer.pk}.html').exists())
+
+    def test_deleting_a_payment_updates_amount_paid_without_a_worker(self):
+        record = FinancialRecord.objects.get(transaction__date=date(2025, 2, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentInstallment.objects.filter(financial_record=record).get().delete()
+        record.refresh_from_db()
+        self.assertEqual(record.amount_paid, 0)
+        self.assertFalse(Job.objects.exists())
+
+
+class StatementTests(LedgerTestCase):
+    def test_statement_totals_match_the_contact_page_after_archiving(self):
+        archive_ledger(date(2025, 1, 31))
+        statements = load_statements([self.customer.pk, self.supplier.pk])
+        for contact in (self.customer, self.supplier):
+            summary, page = summarize(statements[contact.pk]), contact_summary(contact)
+            self.assertEqual(
+                (summary['total_out'], summary['total_in'], summary['net_balance']),
+                (page['total_out'], page['total_in'], page['net_balance']),
+            )
+
+    def test_unchanged_contacts_are_skipped(self):
+        before = fingerprints([self.customer.pk, self.supplier.pk])
+        PaymentInstallment.objects.filter(financial_record__transaction__contact=self.customer).update(notes="كاش")
+        after = fingerprints([self.customer.pk, self.supplier.pk])
+        self.assertNotEqual(before[self.customer.pk], after[self.customer.pk])
+        self.assertEqual(before[self.supplier.pk], after[self.supplier.pk])
+
+        with tempfile.TemporaryDirectory() as output:
+            call_command('generate_statements', output=output, workers=1, stdout=StringIO())
+            out = StringIO()
+            call_command('generate_statements', output=output, workers=1, stdout=out)
+            self.assertIn("لا يوجد تغيير", out.getvalue())
+
+            HomeExpense.objects.create(date=date(2025, 3, 2), description="إيجار", amount=Decimal('100'))
+            self.customer.phone = '01000000000'
+            self.customer.save()
+            out = StringIO()
+            call_command('generate_statements', output=output, workers=1, stdout=out)
+            self.assertIn("تم توليد 1 كشف", out.getvalue())
+            self.assertIn('01000000000', (Path(output) / f'statement_{self.customer.pk}.html').read_text())
+
+
+class StaticAssetTests(LedgerTestCase):
+    def test_pages_link_only_local_fingerprinted_assets(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        for url in (reverse('login'), reverse('dashboard')):
+            html = self.client.get(url).content.decode()
+            assets = re.findall(r'(?:href|src)="([^"]+\.(?:css|js))"', html)
+            self.assertTrue(assets, url)
+            for asset in assets:
+                self.assertRegex(asset, r'^/static/.+\.[0-9a-f]{12}\.(css|js)$')
+
+    def test_icon_subset_covers_every_icon_in_the_templates(self):
+        css = Path(finders.find('vendor/fontawesome/css/icons.min.css')).read_text()
+        used = set()
+        for root, pattern in ((settings.BASE_DIR / 'templates', '*.html'), (settings.BASE_DIR / 'static' / 'js', '*.js')):
+            for path in root.rglob(pattern):
+                used.update(ICON_PATTERN.findall(path.read_text(encoding='utf-8')))
+        self.assertEqual(sorted(name for name in used if not re.search(rf'\.{name}(?![\w-])', css)), [])
+
+
+class CompressionTests(LedgerTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+
+    def test_html_pages_are_compressed(self):
+        plain = self.client.get(reverse('transactions_list'), {'period': 'all'})
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+        response = self.client.get(reverse('transactions_list'), {'period': 'all'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn("عميل", gzip.decompress(response.content).decode())
+
+        response = self.client.get(reverse('transactions_list'), {'period': 'all'}, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        html = brotli.decompress(response.content).decode()
+        # حشو عشوائي بعد الصفحة (حماية BREACH)
+        self.assertRegex(html, r'<!-- [0-9a-f]+ -->$')
+
+    @override_settings(STORE_COMPRESS_MIN_LENGTH=10 ** 7)
+    def test_small_responses_are_sent_as_is(self):
+        response = self.client.get(reverse('transactions_list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class AdminLogsTests(LedgerTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass'))
+
+    def test_summary_page_does_not_load_the_log_tables(self):
+        response = self.client.get(reverse('admin_logs'), {'period': 'all'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "كهرباء")
+        self.assertContains(response, reverse('admin_logs_section', args=['home_expenses']))
+        self.assertEqual(response.context['total_profit_period'], Decimal('3000'))
+
+    def test_sections_are_paginated_and_filtered(self):
+        HomeExpense.objects.bulk_create([
+            HomeExpense(date=date(2025, 3, 1), description=f"مصروف {i}", amount=Decimal('10')) for i in range(30)
+        ])
+        url = reverse('admin_logs_section', args=['home_expenses'])
+        first = self.client.get(url, {'period': 'all'})
+        self.assertEqual(len(first.context['page']), 25)
+        self.assertEqual(len(self.client.get(url, {'period': 'all', 'page': 2}).context['page']), 6)
+
+        february = self.client.get(url, {'period': 'custom', 'start_date': '2025-02-01', 'end_date': '2025-02-28'})
+        self.assertEqual([e.description for e in february.context['page']], ["كهرباء"])
+        self.assertIn('start_date=2025-02-01', february.context['query'])
+
+        self.assertEqual(self.client.get(reverse('admin_logs_section', args=['secrets'])).status_code, 404)
+
+
+class PortfolioTests(LedgerTestCase):
+    def loan(self, amount, months, rate, start):
+        return BankLoan.objects.create(
+            bank_name="بنك", total_loan_amount=Decimal(amount), interest_rate_percentage=Decimal(rate),
+            loan_period_months=months, start_date=start,
+        )
+
+    def test_totals_and_next_installment_across_loans(self):
+        self.loan('12000', 12, '10', date(2025, 1, 1))
+        with CaptureQueriesContext(connection) as one_loan:
+            portfolio_summary(date(2025, 3, 15))
+        self.loan('6000', 6, '0', date(2025, 3, 20))
+        BankLoan.objects.create(
+            bank_name="مغلق", total_loan_amount=Decimal('1000'), loan_period_months=1, start_date=date(2025, 1, 1),
+            is_active=False,
+        )
+
+        with CaptureQueriesContext(connection) as two_loans:
+            summary = portfolio_summary(date(2025, 3, 15))
+        self.assertEqual(len(two_loans), len(one_loan))
+        self.assertEqual(len(summary['loans']), 2)
+        totals = summary['totals']
+        self.assertEqual(totals['remaining_total'], Decimal('13200') + Decimal('6000'))
+        self.assertEqual(totals['remaining_interest'], Decimal('1200'))
+        # يناير وفبراير ومارس من القرض الأول متأخرة
+        self.assertEqual((totals['overdue_count'], totals['overdue_amount']), (3, Decimal('3300')))
+        self.assertEqual((totals['next_due_date'], totals['next_due_amount']), (date(2025, 3, 20), Decimal('1000')))
+
+
+class RescheduleTests(LedgerTestCase):
+    def setUp(self):
+        self.loan = BankLoan.objects.create(
+            bank_name="بنك", total_loan_amount=Decimal('12000'), interest_rate_percentage=Decimal('10'),
+            loan_period_months=12, start_date=date(2025, 1, 1),
+        )
+
+    def unpaid(self):
+        return self.loan.installments.filter(is_paid=False)
+
+    def test_prepayment_keeping_the_term_lowers_each_installment(self):
+        treasury = self.treasury()
+        plan = plan_reschedule(self.loan, prepayment=Decimal('4000'), on_date=date(2025, 1, 15))
+        self.assertEqual((plan['before']['principal'], plan['after']['principal']), (Decimal('12000'), Decimal('8000')))
+        self.assertEqual(plan['after']['count'], 12)
+
+        self.assertEqual(apply_reschedule(plan), {'updated': 12, 'created': 0, 'deleted': 0})
+        self.assertEqual(self.treasury(), treasury - 4000)
+        self.assertEqual(self.unpaid().aggregate(total=Sum('principal_component'))['total'], Decimal('8000'))
+        self.assertEqual(set(self.unpaid().values_list('interest_component', flat=True)), {Decimal('67')})
+        self.assertEqual(loan_principal_as_of(date(2025, 1, 15)), Decimal('8000'))
+
+    def test_prepayment_keeping_the_installment_shortens_the_term(self):
+        plan = plan_reschedule(self.loan, prepayment=Decimal('4000'), mode='term', on_date=date(2025, 1, 15))
+        self.assertEqual(apply_reschedule(plan), {'updated': 8, 'created': 0, 'deleted': 4})
+        self.assertEqual(self.unpaid().count(), 8)
+        self.assertEqual(self.unpaid().order_by('due_date').last().due_date, date(2025, 8, 1))
+
+    def test_new_term_adds_installments_and_rejects_overpayment(self):
+        apply_reschedule(plan_reschedule(self.loan, months=15, rate=Decimal('12')))
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.interest_rate_percentage, Decimal('12'))
+        self.assertEqual(self.unpaid().count(), 15)
+        self.assertEqual(self.unpaid().order_by('due_date').last().due_date, date(2026, 3, 1))
+
+        with self.assertRaises(ValueError):
+            plan_reschedule(self.loan, prepayment=Decimal('12001'))
+
+
+class ExportTests(LedgerTestCase):
+    def test_incremental_and_full_exports(self):
+        with tempfile.TemporaryDirectory() as output:
+            self.assertEqual(export_all(output, tables=['transactions', 'home_expenses']), {'transactions': 6, 'home_expenses': 1})
+            self.invoice(date(2025, 3, 5), 'out', self.customer, self.rice, '10', '25')
+            self.assertEqual(export_all(output, tables=['transactions', 'home_expenses']), {'transactions': 1, 'home_expenses': 0})
+            self.assertEqual(sorted(p.name for p in (Path(output) / 'transactions').iterdir()), ['part-00001.parquet', 'part-00002.parquet'])
+
+            table = pq.read_table(Path(output) / 'transactions')
+            self.assertEqual(table.num_rows, 7)
+            self.assertEqual(str(table.schema.field('total_price').type), 'decimal128(12, 2)')
+            self.assertEqual(str(table.schema.field('date').type), 'date32[day]')
+            self.assertEqual(sum(table.column('total_price').to_pylist()), Decimal('59650'))
+
+            self.assertEqual(export_all(output, full=True, tables=['transactions']), {'transactions': 7})
+            self.assertEqual(len(list((Path(output) / 'transactions').iterdir())), 1)
+
+            with self.assertRaises(CommandError):
+                call_command('export_analytics', output=output, tables=['secrets'], stdout=StringIO())
+
+
+class AnalyticsTests(LedgerTestCase):
+    def test_profitability_matches_the_report_queries(self):
+        report = profitability_report(date(2025, 1, 1), date(2025, 3, 31))
+        totals = transaction_totals(date__range=(date(2025, 1, 1), date(2025, 3, 31)))
+        self.assertEqual(
+            (report['totals']['count'], report['totals']['revenue'], report['totals']['cost'], report['totals']['profit']),
+            (3, totals['sales'], totals['cogs'], totals['profit']),
+        )
+        self.assertEqual([(row['key'], row['profit']) for row in report['by_product']], [("أرز", 2500), ("سكر", 500)])
+        self.assertEqual([row['profit'] for row in report['by_month']], [1500, 1500])
+        self.assertEqual(report['margins']['percentiles'][50], 20.0)
+
+        rice = next(row for row in report['turnover'] if row['product'] == "أرز")
+        self.assertEqual(rice['sold'], 500)
+        self.assertAlmostEqual(rice['turnover'], rice['sold'] / rice['average_stock'])
+
+        # نفس الأرقام بعد نقل فواتير يناير إلى الأرشيف
+        archive_ledger(date(2025, 1, 31))
+        self.assertEqual(profitability_report(date(2025, 1, 1), date(2025, 3, 31))['totals'], report['totals'])
+
+    def test_inventory_value(self):
+        self.assertEqual(inventory_value(), Decimal('30000'))
+
+
+class ReportBuilderTests(LedgerTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass'))
+
+    def report(self, **params):
+        return self.client.get(reverse('report_api'), params).json()
+
+    def test_grouped_measures_sorting_and_limit(self):
+        rows = self.report(group='product', measures='weight,profit,margin', type='out', sort='-profit')['rows']
+        self.assertEqual([(r['product_name'], r['weight'], r['profit'], r['margin']) for r in rows], [
+            ("أرز", 500.0, 2500.0, 20.0), ("سكر", 100.0, 500.0, 14.29),
+        ])
+        result = self.report(group='month', measures='total_price', limit=2)
+        self.assertEqual([r['month'] for r in result['rows']], ['2025-01-01', '2025-02-01'])
+        self.assertTrue(result['truncated'])
+        self.assertEqual(self.report(source='home_expenses', measures='amount')['rows'], [{'amount': 750.0}])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'source': 'secrets'}, {'group': 'colour'}, {'measures': 'tax'}, {'start': '2025-13-01'},
+                       {'contact': 'x'}, {'sort': 'profit'}):
+            response = self.client.get(reverse('report_api'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_cached_result_is_invalidated_by_new_data(self):
+        params = {'group': 'contact', 'measures': 'count,total_price', 'type': 'out'}
+        self.assertEqual(self.report(**params)['rows'][0]['count'], 3)
+        with self.assertNumQueries(1):  # رقم إصدار البيانات فقط
+            run_report(parse_spec(params))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice(date(2025, 3, 5), 'out', self.customer, self.rice, '10', '25')
+        self.assertEqual(self.report(**params)['rows'][0]['count'], 4)
+
+
+class LoadTestCommandTests(TestCase):
+    def results(self, p95, rps):
+        row = {'requests': 100, 'errors': 0, 'rps': rps, 'p50': 10.0, 'p95': p95, 'p99': p95}
+        return {'created': '2025-01-01T00:00:00', 'config': {'workers': 8}, 'total': row, 'endpoints': {'dashboard': row}}
+
+    def compare(self, baseline, results, tolerance=0.25):
+        out = StringIO()
+        command = loadtest.Command(stdout=out)
+        command.compare(results, {'baseline': baseline, 'save': False, 'tolerance': tolerance})
+        return out.getvalue()
+
+    def test_summarize_percentiles(self):
+        row = loadtest.summarize([(float(ms), ms != 100) for ms in range(1, 101)], seconds=10)
+        self.assertEqual((row['requests'], row['errors'], row['rps']), (100, 1, 10.0))
+        self.assertEqual((row['p50'], row['p95'], row['p99']), (50.5, 95.0, 99.0))
+        self.assertEqual(loadtest.summarize([(7.0, True)], seconds=0)['p99'], 7.0)
+
+    def test_compare_with_baseline(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            baseline = str(Path(workdir) / 'baseline.json')
+            self.assertIn('--save', self.compare(baseline, self.results(20.0, 50.0)))
+
+            command = loadtest.Command(stdout=StringIO())
+            command.compare(self.results(20.0, 50.0), {'baseline': baseline, 'save': True, 'tolerance': 0.25})
+            self.assertIn('لا يوجد تراجع', self.compare(baseline, self.results(24.0, 40.0)))
+
+            with self.assertRaisesRegex(CommandError, r'dashboard p95: 20.0 -> 30.0 ms'):
+                self.compare(baseline, self.results(30.0, 50.0))
+            with self.assertRaisesRegex(CommandError, 'طلب/ث: 50.0 -> 30.0'):
+                self.compare(baseline, self.results(20.0, 30.0))
+
+
+class ReportQueryTests(LedgerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ContactExpense.objects.create(contact=cls.customer, date=date(2025, 2, 5), amount=Decimal('200'), payer_type='us', notes="نقل")
+        ContactExpense.objects.create(contact=cls.supplier, date=date(2025, 3, 2), amount=Decimal('300'), payer_type='them', notes="عمالة")
+        IncomeRecord.objects.create(date=date(2025, 2, 10), source="إيجار", amount=Decimal('1000'))
+
+    def test_period_filter(self):
+        today = date(2025, 3, 10)
+        self.assertEqual(period_filter({'period': 'today'}, today), {'date': today})
+        self.assertEqual(period_filter({'period': 'week'}, today), {'date__gte': date(2025, 3, 3)})
+        self.assertEqual(
+            period_filter({'start_date': '2025-02-01', 'end_date': '2025-02-28'}, today),
+            {'date__range': [date(2025, 2, 1), date(2025, 2, 28)]},
+        )
+        self.assertEqual(period_filter({'start_date': '2025-02-30', 'end_date': '2025-03-01'}, today), {})
+        self.assertEqual(period_filter({'period': 'all', 'start_date': '2025-02-01'}, today), {})
+
+    def test_period_totals_one_query_per_ledger(self):
+        february = {'date__range': [date(2025, 2, 1), date(2025, 2, 28)]}
+        with CaptureQueriesContext(connection) as before:
+            totals = period_totals(february)
+        invoices = totals['transactions']
+        self.assertEqual((invoices['sales'], invoices['collected'], invoices['receivable']), (8500, 1000, 7500))
+        self.assertEqual((invoices['purchases'], invoices['cogs'], invoices['profit']), (0, 7000, 1500))
+        self.assertEqual(totals['contact_expenses'], {'us': 200, 'them': 0, 'total': 200})
+        self.assertEqual((totals['home_expenses'], totals['income']), (750, 1000))
+
+        for day in range(1, 11):
+            self.invoice(date(2025, 2, day), 'out', self.customer, self.rice, '1', '25')
+        with CaptureQueriesContext(connection) as after:
+            self.assertEqual(period_totals(february)['transactions']['sales'], 8750)
+        self.assertEqual(len(after), len(before))
+
+    def test_contact_balances(self):
+        customer, supplier = contact_summary(self.customer), contact_summary(self.supplier)
+        self.assertEqual((customer['total_out'], customer['total_expenses'], customer['net_balance']), (16000, 200, 7700))
+        self.assertEqual((supplier['total_in'], supplier['net_balance']), (43400, -10300))
+
+        receivable, payable = outstanding_balances()
+        self.assertEqual(receivable, [{'contact_name': "عميل", 'amount': 7700}])
+        self.assertEqual(payable, [{'contact_name': "مورد", 'amount': 10300}])
+
+    def test_loan_totals(self):
+        loan = BankLoan.objects.create(
+            bank_name="بنك", total_loan_amount=Decimal('12000'), loan_period_months=12, start_date=date(2025, 1, 1),
+        )
+        installments = loan.installments.order_by('due_date')
+        installments.filter(pk__in=list(installments.values_list('pk', flat=True)[:2])).update(is_paid=True)
+        self.assertEqual(
+            loan_totals(installments),
+            {'total_flow': 12000, 'total_interest': 0, 'total_paid': 2000, 'total_remaining': 10000},
+        )
+
+
+class BackupTests(LedgerTestCase):
+    def snapshot(self, workdir):
+        """قاعدة الاختبار في الذاكرة، فتُنسخ إلى ملف ليأخذ منه create_backup نسخته"""
+        path = Path(workdir) / 'live.sqlite3'
+        connection.ensure_connection()
+        # backup API ينتظر انتهاء معاملة الاختبار المفتوحة على نفس القاعدة، فالنسخ هنا بـ iterdump
+        with closing(sqlite3.connect(path)) as target:
+            target.executescript('\n'.join(connection.connection.iterdump()))
+        return path
+
+    def test_backup_and_verify_restored_copy(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            live = self.snapshot(workdir)
+            with closing(sqlite3.connect(live)) as db, db:
+                db.execute("UPDATE store_product SET quantity_available = quantity_available + 7 WHERE id = ?", [self.sugar.pk])
+            with mock.patch('store.backup.database_path', return_value=live):
+                path, stats = create_backup(Path(workdir) / 'backups', pages=8, pause=0, now=timezone.localtime())
+            self.assertEqual(list_backups(path.parent), [path])
+            self.assertEqual(stats['restarts'], 0)
+            self.assertGreater(stats['steps'], 1)
+            self.assertEqual(Path(f"{path}.sha256").read_text(), f"{stats['sha256']}  {path.name}\n")
+
+            # اتصال التحقق المؤقت يُضاف لإعدادات القواعد، وحارس الاختبارات يمنع أي قاعدة غير مذكورة في databases
+            with mock.patch.object(BackupTests, 'databases', {'default', VERIFY_ALIAS}):
+                result = verify_backup(path)
+            self.assertEqual(result['integrity'], 'ok')
+            # الفحوص تعمل على النسخة المستعادة وليس على القاعدة الحالية
+            self.assertEqual([(d.pk, d.stored, d.expected) for d in result['reconcile']['stock']], [(self.sugar.pk, 407, 400)])
+            self.assertEqual(result['reconcile']['amount_paid'], [])
+
+            with open(path, 'ab') as f:
+                f.write(b'\0')
+            with self.assertRaises(ValueError):
+                verify_backup(path)
+
+    def test_rotation_keeps_latest_and_first_of_month(self):
+        names = ['20250105', '20250120', '20250203', '20250210', '20250301', '20250302', '20250303']
+        paths = [Path(f"db-{name}-020000.sqlite3.gz") for name in names]
+        self.assertEqual(
+            [p.name[3:11] for p in backups_to_delete(paths, keep=2, keep_monthly=2)],
+            ['20250105', '20250120', '20250210'],
+        )
+        self.assertEqual(backups_to_delete(paths, keep=0, keep_monthly=0), paths)
+
+
+class CashForecastTests(LedgerTestCase):
+    def test_expected_payment_days_and_balance(self):
+        late = Contact.objects.create(name="عميل متأخر")
+        with self.captureOnCommitCallbacks(execute=True):
+            # يدفع عادة بعد عشرة أيام من الفاتورة
+            first = self.invoice(date(2025, 2, 1), 'out', late, self.rice, '10', '25')
+            PaymentInstallment.objects.create(financial_record=first.financialrecord, amount=Decimal('250'), date_paid=date(2025, 2, 11))
+            self.invoice(date(2025, 2, 25), 'out', late, self.rice, '10', '25')
+        BankLoan.objects.create(
+            bank_name="بنك", total_loan_amount=Decimal('3000'), loan_period_months=3, start_date=date(2025, 3, 1),
+        )
+        due = BankInstallment.objects.filter(due_date__lte=date(2025, 4, 1)).aggregate(total=Sum('total_installment_amount'))['total']
+
+        forecast = cash_forecast(months=1, today=date(2025, 3, 1))
+        self.assertEqual((forecast['days'][0], forecast['days'][-1], len(forecast['balance'])), ('2025-03-01', '2025-04-01', 32))
+        # فواتير العميل والمورد القديمة متأخرة عن موعدها فتُحسب في أول يوم
+        self.assertEqual(forecast['overdue'], {'collections': 7500, 'payments': 10000})
+        self.assertEqual(forecast['flows']['collections'][6], 250)
+        self.assertEqual(forecast['totals']['collections'], 7750)
+        self.assertEqual(forecast['totals']['bank'], -float(due))
+        self.assertEqual(forecast['home_daily_rate'], 8.33)
+        self.assertEqual(forecast['opening'], float(self.treasury()))
+        self.assertAlmostEqual(forecast['closing'], forecast['opening'] + sum(forecast['totals'].values()), places=2)
+        self.assertEqual(forecast['first_negative'], None)
+
+    def test_cached_until_ledgers_change(self):
+        today = date(2025, 3, 1)
+        opening = cash_forecast(months=1, today=today)['opening']
+        # قراءة رقم إصدار البيانات فقط
+        with self.assertNumQueries(1):
+            cash_forecast(months=1, today=today)
+        # رقم الإصدار يزيد بعد نجاح المعاملة
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeExpense.objects.create(date=date(2025, 3, 1), description="غاز", amount=Decimal('90'))
+        self.assertEqual(cash_forecast(months=1, today=today)['home_daily_rate'], 9.33)
+        self.assertEqual(cash_forecast(months=1, today=today)['opening'], opening - 90)
+
+    def test_api_months(self):
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('forecast_api'), {'months': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('forecast_api'), {'months': 99}).json()['months'], 24)
+
+
+class MetricsTests(LedgerTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.directory = Path(workdir.name)
+        settings_override = override_settings(STORE_METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_dead_process_files_fold_once(self):
+        key = ('store_model_writes_total', (('action', 'save'), ('model', 'test049')))
+        metrics.inc(key[0], 2, model='test049', action='save')
+        # ملف عملية منتهية (رقم لا يوجد) يُضاف للملف المجمع مرة واحدة ثم يُحذف
+        (self.directory / '999999999-1.json').write_text(json.dumps([[key[0], list(map(list, key[1])), 5]]))
+        self.assertEqual(metrics.collect()[key], 7)
+        self.assertFalse((self.directory / '999999999-1.json').exists())
+        self.assertEqual(metrics.collect()[key], 7)
+        metrics.inc(key[0], model='test049', action='save')
+        self.assertEqual(metrics.collect()[key], 8)
+
+    def test_render_histogram(self):
+        values = {}
+        for name, labels, value in [
+            ('store_http_request_duration_seconds_count', (('view', 'a"b'),), 1),
+            ('store_http_request_duration_seconds_bucket', (('le', '+Inf'), ('view', 'a"b')), 1),
+            ('store_http_request_duration_seconds_bucket', (('le', '0.1'), ('view', 'a"b')), 1),
+            ('store_http_request_duration_seconds_sum', (('view', 'a"b'),), 0.05),
+            ('store_treasury_balance', (), 1500.5),
+        ]:
+            values[(name, labels)] = value
+        self.assertEqual(metrics.render(values).splitlines(), [
+            '# HELP store_http_request_duration_seconds زمن الطلب لكل صفحة بالثواني',
+            '# TYPE store_http_request_duration_seconds histogram',
+            'store_http_request_duration_seconds_bucket{le="0.1",view="a\\"b"} 1',
+            'store_http_request_duration_seconds_bucket{le="+Inf",view="a\\"b"} 1',
+            'store_http_request_duration_seconds_sum{view="a\\"b"} 0.05',
+            'store_http_request_duration_seconds_count{view="a\\"b"} 1',
+            '# HELP store_treasury_balance رصيد الخزنة الحالي',
+            '# TYPE store_treasury_balance gauge',
+            'store_treasury_balance 1500.5',
+        ])
+
+    @override_settings(STORE_METRICS_TOKEN='secret')
+    def test_endpoint_access_and_gauges(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn(f'store_treasury_balance {metrics._number(self.treasury())}\n', body)
+        self.assertIn('store_open_invoices{kind="receivable"} 2\n', body)
+        self.assertIn('store_open_invoices_amount{kind="payable"} 10000\n', body)
+        # الطلبات المرفوضة قبله مسجلة بعد انتهائها
+        self.assertIn('store_http_requests_total{method="GET",status="403",view="metrics"} 2\n', body)
+
+
+class SlowQueryLogTests(LedgerTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.log = Path(workdir.name) / 'slow.jsonl'
+        settings_override = override_settings(STORE_SLOW_QUERY_LOG=self.log)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+    def test_fingerprint_ignores_values(self):
+        shape, key = fingerprint("SELECT * FROM t\n WHERE a = 5 AND b = 'x''y' AND c IN (%s, %s, %s) AND \"t2\".\"col1\" = %s")
+        self.assertEqual(shape, 'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (?, ...) AND "t2"."col1" = ?')
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE a = 70 AND b = '' AND c IN (%s, %s) AND \"t2\".\"col1\" = %s")[1], key)
+
+    @override_settings(STORE_SLOW_QUERY_MS=0.001)
+    def test_middleware_logs_source_and_plan(self):
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        entries = [entry for entry in read_entries() if entry['view'] == 'dashboard']
+        self.assertTrue(entries)
+        reads = [entry for entry in entries if entry['sql'].startswith('SELECT')]
+        self.assertTrue(all(entry['plan'] for entry in reads))
+        self.assertTrue(any(entry['source'].startswith(f"store{os.sep}") for entry in entries))
+        self.assertFalse(any('EXPLAIN' in entry['sql'] for entry in entries))
+
+    def test_top_queries_by_total_time(self):
+        lines = [
+            {'fingerprint': 'a', 'shape': 'A', 'ms': 300, 'view': 'dashboard', 'at': '2025-01-01T00:00:00'},
+            {'fingerprint': 'b', 'shape': 'B', 'ms': 150, 'view': 'dashboard', 'at': '2025-01-01T00:00:01'},
+            {'fingerprint': 'b', 'shape': 'B', 'ms': 250, 'view': 'contact_detail', 'at': '2025-01-01T00:00:02'},
+        ]
+        self.log.write_text('\n'.join(json.dumps(line) for line in lines) + '\n{تالف\n')
+        top = top_queries()
+        self.assertEqual([(q['fingerprint'], q['count'], q['total_ms'], q['max_ms']) for q in top], [('b', 2, 400, 250), ('a', 1, 300, 300)])
+        self.assertEqual(top[0]['views'], ['contact_detail', 'dashboard'])
+        self.assertEqual(top_queries(limit=1)[0]['fingerprint'], 'b')
+
+        self.assertContains(self.client.get(reverse('slow_queries')), 'contact_detail')
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('slow_queries')).status_code, 302)
+
+
+class CreatePaymentsTests(LedgerTestCase):
+    def test_create_payments_moves_the_treasury_once(self):
+        sale = FinancialRecord.objects.get(transaction__date=date(2025, 2, 15))
+        purchase = FinancialRecord.objects.get(transaction__date=date(2025, 1, 10))
+        treasury = self.treasury()
+
+        with CaptureQueriesContext(connection) as queries:
+            count, delta = create_payments([
+                (sale.pk, Decimal('2000'), date(2025, 3, 5), ''),
+                (sale.pk, Decimal('1000'), date(2025, 3, 6), ''),
+                (purchase.pk, Decimal('4000'), date(2025, 3, 6), ''),
+            ])
+        self.assertEqual((count, delta), (3, Decimal('-1000')))
+        self.assertEqual(self.capital_updates(queries), 1)
+        self.assertEqual(self.treasury(), treasury - 1000)
+        sale.refresh_from_db()
+        purchase.refresh_from_db()
+        self.assertEqual((sale.amount_paid, purchase.amount_paid), (Decimal('3000'), Decimal('9000')))
+
+    def test_create_payments_over_remaining_changes_nothing(self):
+        sale = FinancialRecord.objects.get(transaction__date=date(2025, 2, 15))
+        treasury = self.treasury()
+        with self.assertRaises(ValidationError):
+            create_payments([(sale.pk, Decimal('4000'), date(2025, 3, 5), ''), (sale.pk, Decimal('1001'), date(2025, 3, 5), '')])
+        self.assertEqual(self.treasury(), treasury)
+        self.assertFalse(sale.installments.exists())
+
+
+class BankImportTests(LedgerTestCase):
+    STATEMENT = (
+        "date,amount,description,reference\n"
+        "2025-02-12,2500,تحويل,R1\n"
+        "2025-02-12,2500,تحويل,R2\n"
+        "2025-02-12,1000,تحويل من عميل,R3\n"
+        "2025-03-02,-3000,سداد,R4\n"
+    )
+
+    def setUp(self):
+        other = Contact.objects.create(name="زبون آخر")
+        # فاتورة ثانية بنفس متبقي فاتورة 3 فبراير (2500) لتاجر آخر
+        self.invoice(date(2025, 2, 10), 'out', other, self.sugar, '100', '25')
+        self.records = dict(FinancialRecord.objects.values_list('transaction__date', 'pk'))
+
+    def match(self, text):
+        lines, errors = parse_statement(text.encode())
+        self.assertEqual(errors, [])
+        return lines, {result['line'].reference: result for result in match_statement(lines)}
+
+    def test_ambiguous_lines_are_suggested_but_not_confirmed(self):
+        _, results = self.match(self.STATEMENT)
+
+        # مبلغ مطابق لفاتورتين بدون ذكر التاجر: الأقرب تاريخاً مقترحة، والاختيار للمستخدم
+        self.assertEqual(len(results['R1']['candidates']), 2)
+        self.assertEqual(results['R1']['selected'], self.records[date(2025, 2, 10)])
+        self.assertFalse(results['R1']['confirm'])
+        # الاقتراح الأول حجز مبلغه، فالسطر المماثل يأخذ الفاتورة الأخرى
+        self.assertEqual(results['R2']['selected'], self.records[date(2025, 2, 3)])
+        self.assertFalse(results['R2']['confirm'])
+        # التاجر مذكور بالاسم: دفعة جزئية مؤكدة على فاتورته الوحيدة التي بقي فيها متاح
+        self.assertEqual(results['R3']['selected'], self.records[date(2025, 2, 15)])
+        self.assertTrue(results['R3']['confirm'])
+        # لا تاجر ولا مبلغ مطابق: بدون اقتراح
+        self.assertEqual((results['R4']['candidates'], results['R4']['selected']), ([], None))
+
+    def test_imported_lines_are_not_imported_again(self):
+        lines, results = self.match(self.STATEMENT + "2025-02-12,1000,تحويل من عميل,R3\n")
+        self.assertEqual(len({line.key for line in lines}), len(lines))
+        self.assertEqual(lines[-1].key, f"{lines[2].key}#2")
+
+        confirmed = [(results['R3']['selected'], lines[2])]
+        self.assertEqual(import_lines(confirmed), (1, Decimal('1000')))
+        self.assertEqual(imported_keys(), {lines[2].key})
+
+        lines, results = self.match(self.STATEMENT)
+        self.assertTrue(results['R3']['duplicate'])
+        self.assertEqual(results['R3']['candidates'], [])
+        self.assertFalse(results['R1']['duplicate'])
+        with self.assertRaises(ValidationError):
+            import_lines(confirmed)
+        self.assertEqual(PaymentInstallment.objects.filter(notes__contains='[bank:').count(), 1)
+
+
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', STORE_ALERT_EMAILS=['owner@example.com'])
+class AlertEmailTests(TestCase):
+    def setUp(self):
+        Product.objects.create(
+            name="أرز", quantity_available=Decimal('10'), low_stock_threshold=Decimal('50'),
+            purchase_price_per_kg=Decimal('20'), selling_price_per_kg=Decimal('25'),
+        )
+        Product.objects.create(
+            name="سكر", quantity_available=Decimal('5'), low_stock_threshold=Decimal('50'),
+            purchase_price_per_kg=Decimal('30'), selling_price_per_kg=Decimal('35'),
+        )
+
+    def test_one_digest_for_all_pending_alerts(self):
+        refresh_alerts()
+        self.assertEqual(notify_pending(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertFalse(Alert.objects.filter(notified_at__isnull=True).exists())
+
+        # التنبيه المرسل لا يُرسل مرة أخرى
+        refresh_alerts()
+        self.assertEqual(notify_pending(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_failure_keeps_alerts_pending(self):
+        refresh_alerts()
+        with mock.patch('store.alerts.send_mail', side_effect=ConnectionRefusedError), self.assertLogs('store.alerts', 'WARNING'):
+            self.assertEqual(notify_pending(), 0)
+        self.assertEqual(Alert.objects.filter(notified_at__isnull=True).count(), 2)
+
+        # تُرسل في التشغيل التالي
+        self.assertEqual(notify_pending(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_command_reports_refresh_when_smtp_is_down(self):
+        out = StringIO()
+        with mock.patch('store.alerts.send_mail', side_effect=ConnectionRefusedError), self.assertLogs('store.alerts', 'WARNING'):
+            call_command('compute_alerts', stdout=out)
+        self.assertIn("تنبيهات جديدة: 2", out.getvalue())
+        self.assertEqual(Alert.objects.filter(is_active=True).count(), 2)
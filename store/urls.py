@@ -8,6 +8,8 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('transactions/', views.transactions_list, name='transactions_list'),
     path('contact/<int:pk>/', views.contact_detail, name='contact_detail'),
+    path('product/<int:pk>/stock/', views.product_stock, name='product_stock'),
+    path('product/<int:pk>/stock/adjust/', views.adjust_product_stock, name='adjust_product_stock'),
     
     # إضافة حركة (يومية) مباشرة من بروفايل التاجر أو لوحة التحكم
     path('contact/add-transaction/', views.add_transaction_direct, name='add_transaction_direct'),
@@ -28,14 +30,30 @@ urlpatterns = [
     path('update-paid/<int:record_id>/', views.update_paid_amount, name='update_paid_amount'),
     path('payment/edit/<int:payment_id>/', views.edit_payment_amount, name='edit_payment_amount'),
     path('admin-logs/', views.admin_logs_dashboard, name='admin_logs'),
+    path('admin-logs/section/<str:section>/', views.admin_logs_section, name='admin_logs_section'),
+    path('admin-logs/slow-queries/', views.slow_queries, name='slow_queries'),
+    path('analytics/', views.analytics_report, name='analytics_report'),
+    path('api/report/', views.report_api, name='report_api'),
+    path('api/forecast/', views.forecast_api, name='forecast_api'),
+    path('metrics', views.metrics_view, name='metrics'),
 
     # --- 6. مسارات قسم البنك ---
     path('bank/statement/', views.bank_statement, name='bank_statement'),
+    path('bank/statement/<int:loan_id>/', views.bank_loan_statement, name='bank_loan_statement'),
+    path('bank/statement/<int:loan_id>/reschedule/', views.reschedule_loan, name='reschedule_loan'),
     path('bank/add-installment/', views.add_bank_installment, name='add_bank_installment'),
     path('bank/installment/update-charges/<int:inst_id>/', views.update_installment_charges, name='update_installment_charges'),
     path('bank/installment/toggle/<int:inst_id>/', views.toggle_installment_status, name='toggle_installment_status'),
+    path('bank/statement/<int:loan_id>/installments/status/', views.bulk_installment_status, name='bulk_installment_status'),
+    path('bank/import/', views.bank_import, name='bank_import'),
+    path('bank/import/confirm/', views.confirm_bank_import, name='confirm_bank_import'),
 
     # --- 7. مسارات "مصروف البيت" وإدارة الخزنة ---
     path('home-expenses/add/', lambda r: redirect('/admin/store/homeexpense/add/'), name='add_home_expense'),
     path('capital/update/', lambda r: redirect('/admin/store/capital/'), name='update_capital'),
+
+    # --- 8. التطبيق على الهاتف (PWA) ---
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('manifest.webmanifest', views.web_manifest, name='web_manifest'),
+    path('offline/', views.offline, name='offline'),
 ]
\ No newline at end of file
@@ -1,17 +1,45 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum, Prefetch, F, ExpressionWrapper, DecimalField
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.core.paginator import Paginator
+from django.db.models import F, ExpressionWrapper, DecimalField, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import (
     DailyTransaction, Product, FinancialRecord, PaymentInstallment, 
     Contact, BankLoan, BankInstallment, Capital, HomeExpense, ContactExpense,
-    IncomeRecord  # تم إضافة الموديل الجديد هنا
+    IncomeRecord,  # تم إضافة الموديل الجديد هنا
+    Alert, ArchivedTransaction
 )
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+import hashlib
+import hmac
+import json
+import uuid
+from django.conf import settings
+from django.templatetags.static import static
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from decimal import Decimal, InvalidOperation
+from .periods import contact_balances_as_of, position_as_of
+from .loans import portfolio_summary, plan_reschedule, apply_reschedule
+from .analytics import profitability_report, inventory_value
+from .report_builder import parse_spec, run_report
+from .forecast import cash_forecast
+from .reports import (
+    period_filter, transaction_totals, amount_total, period_totals, contact_summary, outstanding_balances, loan_totals,
+    includes_archive,
+)
+from .idempotency import idempotent
+from .bulk import set_installments_paid
+from .bank_import import StatementLine, import_lines, match_statement, parse_statement
+from .stock import adjust_stock, movement_history, stock_as_of
+from . import metrics
+from .slow_queries import top_queries
 
 # --- 1. قسم الإشارات (Signals) ---
 @receiver(post_save, sender=DailyTransaction)
@@ -23,91 +51,29 @@ def create_financial_record(sender, instance, created, **kwargs):
 # --- 2. لوحة التحكم (Dashboard) ---
 @login_required
 def dashboard(request):
-    period = request.GET.get('period', 'all')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
     today = timezone.now().date()
+    filter_q = period_filter(request.GET, today)
 
-    transactions_queryset = DailyTransaction.objects.all()
-    income_queryset = IncomeRecord.objects.all()
-
-    # --- فلترة المدة الزمنية ---
-    if period == 'today':
-        transactions_queryset = transactions_queryset.filter(date=today)
-        income_queryset = income_queryset.filter(date=today)
-    elif period == 'week':
-        last_week = today - timedelta(days=7)
-        transactions_queryset = transactions_queryset.filter(date__gte=last_week)
-        income_queryset = income_queryset.filter(date__gte=last_week)
-    elif period == 'month':
-        last_month = today - timedelta(days=30)
-        transactions_queryset = transactions_queryset.filter(date__gte=last_month)
-        income_queryset = income_queryset.filter(date__gte=last_month)
-    elif period == 'custom' and start_date and end_date:
-        transactions_queryset = transactions_queryset.filter(date__range=[start_date, end_date])
-        income_queryset = income_queryset.filter(date__range=[start_date, end_date])
-
-    # --- حسابات الأرباح والوارد ---
-    total_sales = transactions_queryset.filter(transaction_type='out').aggregate(total=Sum('total_price'))['total'] or 0
-    total_income = income_queryset.aggregate(total=Sum('amount'))['total'] or 0
-    
-    cost_of_goods_sold = transactions_queryset.filter(transaction_type='out').annotate(
-        cost=ExpressionWrapper(F('weight') * F('product__purchase_price_per_kg'), output_field=DecimalField())
-    ).aggregate(total=Sum('cost'))['total'] or 0
-    
-    net_profit = (total_sales - cost_of_goods_sold) + total_income
-
-    # --- منطق المقاصة الشامل (Netting Logic) ---
-    all_contacts = {c.id: c.name for c in Contact.objects.all()}
-    contact_balances = {}
-
-    # 1. ديون الفواتير (لنا + / علينا -)
-    financial_records = FinancialRecord.objects.annotate(
-        rem=ExpressionWrapper(F('transaction__total_price') - F('amount_paid'), output_field=DecimalField())
-    ).filter(rem__gt=0)
-
-    for rec in financial_records:
-        cid = rec.transaction.contact.id
-        if rec.transaction.transaction_type == 'out':
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) + rec.rem
-        else:
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) - rec.rem
-
-    # 2. مصاريف التجار (دفعنا نحن + / دفع التاجر -)
-    all_c_expenses = ContactExpense.objects.all()
-    for exp in all_c_expenses:
-        cid = exp.contact.id
-        if exp.payer_type == 'us':
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) + exp.amount
-        else:
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) - exp.amount
-
-    # تصنيف النتائج النهائية
-    final_receivable_list = []
-    final_payable_list = []
-    for cid, balance in contact_balances.items():
-        if balance > 0:
-            final_receivable_list.append({'contact_name': all_contacts.get(cid), 'amount': balance})
-        elif balance < 0:
-            final_payable_list.append({'contact_name': all_contacts.get(cid), 'amount': abs(balance)})
+    # --- حسابات الأرباح والوارد (استعلام واحد للفواتير وواحد للمداخيل) ---
+    totals = transaction_totals(filter_q)
+    total_sales = totals['sales']
+    total_income = amount_total(IncomeRecord, filter_q)
+    net_profit = totals['profit'] + total_income
 
+    # --- منطق المقاصة الشامل (Netting Logic): الفواتير غير المسددة ومصاريف التجار لكل تاجر ---
+    final_receivable_list, final_payable_list = outstanding_balances()
     total_receivable = sum(item['amount'] for item in final_receivable_list)
     total_payable = sum(item['amount'] for item in final_payable_list)
 
-    # --- البنك ---
-    loan = BankLoan.objects.filter(is_active=True).first()
-    bank_summary = {'total_remaining': 0, 'bank_name': "لا يوجد قرض نشط"}
-    if loan:
-        bank_insts = BankInstallment.objects.filter(loan=loan)
-        total_flow = bank_insts.aggregate(Sum('total_installment_amount'))['total_installment_amount__sum'] or 0
-        total_paid = bank_insts.filter(is_paid=True).aggregate(Sum('total_installment_amount'))['total_installment_amount__sum'] or 0
-        next_inst = bank_insts.filter(is_paid=False, due_date__gte=today).order_by('due_date').first()
-        bank_summary = {
-            'total_remaining': total_flow - total_paid, 
-            'next_installment_amount': next_inst.total_installment_amount if next_inst else 0,
-            'next_installment_date': next_inst.due_date if next_inst else None, 
-            'bank_name': loan.bank_name
-        }
+    # --- البنك (كل القروض النشطة) ---
+    portfolio = portfolio_summary(today)
+    loans = portfolio['loans']
+    bank_summary = {
+        'total_remaining': portfolio['totals']['remaining_total'],
+        'next_installment_amount': portfolio['totals']['next_due_amount'],
+        'next_installment_date': portfolio['totals']['next_due_date'],
+        'bank_name': loans[0].bank_name if len(loans) == 1 else (f"{len(loans)} قروض نشطة" if loans else "لا يوجد قرض نشط"),
+    }
 
     context = {
         'total_sales': total_sales, 
@@ -117,11 +83,11 @@ def dashboard(request):
         'payable': total_payable,
         'receivable_details': final_receivable_list, 
         'debt_details': final_payable_list,
-        'recent_sales': transactions_queryset.filter(transaction_type='out').select_related('product', 'contact').order_by('-date')[:10],
+        'recent_sales': DailyTransaction.objects.filter(transaction_type='out', **filter_q).select_related('product', 'contact', 'financialrecord').order_by('-date')[:10],
         'inventory': Product.objects.all(),
         'bank_summary': bank_summary,
-        'upcoming_bank_alerts': BankInstallment.objects.filter(is_paid=False, due_date__range=[today, today + timedelta(days=3)]),
-        'overdue_bank_alerts': BankInstallment.objects.filter(is_paid=False, due_date__lt=today),
+        # التنبيهات محسوبة مسبقاً بأمر compute_alerts
+        'alerts': Alert.objects.filter(is_active=True),
     }
     return render(request, 'dashboard.html', context)
 
@@ -129,20 +95,11 @@ def dashboard(request):
 
 @login_required
 def transactions_list(request):
-    period = request.GET.get('period', 'all')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    today = timezone.now().date()
-    
-    # استيراد الأدوات اللازمة للحسابات المتقدمة داخل QuerySet
-    from django.db.models.functions import Coalesce
-    from django.db.models import F, ExpressionWrapper, DecimalField, Sum
-    from decimal import Decimal
-    from datetime import timedelta
+    filter_q = period_filter(request.GET)
 
     # 1. جلب البيانات الأساسية مع إضافة حقول (المدفوع والمتبقي) لكل حركة
     # نستخدم annotate لحساب القيم بناءً على علاقة الـ OneToOne مع FinancialRecord
-    transactions = DailyTransaction.objects.select_related(
+    transactions = DailyTransaction.objects.filter(**filter_q).select_related(
         'product', 'contact', 'financialrecord'
     ).annotate(
         paid=Coalesce(F('financialrecord__amount_paid'), Decimal(0), output_field=DecimalField()),
@@ -150,81 +107,41 @@ def transactions_list(request):
             F('total_price') - Coalesce(F('financialrecord__amount_paid'), Decimal(0)),
             output_field=DecimalField()
         )
-    ).all().order_by('-date')
-
-    contact_expenses = ContactExpense.objects.select_related('contact').all().order_by('-date')
-    home_expenses = HomeExpense.objects.all().order_by('-date')
-    income_records = IncomeRecord.objects.all().order_by('-date')
-
-    # --- تطبيق الفلترة الزمنية ---
-    filter_q = {}
-    if period == 'today':
-        filter_q = {'date': today}
-    elif period == 'week':
-        filter_q = {'date__gte': today - timedelta(days=7)}
-    elif period == 'month':
-        filter_q = {'date__gte': today - timedelta(days=30)}
-    elif period == 'custom' and start_date and end_date:
-        filter_q = {'date__range': [start_date, end_date]}
-
-    if filter_q:
-        transactions = transactions.filter(**filter_q)
-        contact_expenses = contact_expenses.filter(**filter_q)
-        home_expenses = home_expenses.filter(**filter_q)
-        income_records = income_records.filter(**filter_q)
-
-    # --- الحسابات المالية الإجمالية (الدرج / السيولة) ---
-    
-    # 1. تحصيل المبيعات (ما دخل الدرج من فواتير الصادر 'out')
-    actual_sales_collection = transactions.filter(transaction_type='out').aggregate(
-        total=Coalesce(Sum('paid'), Decimal(0), output_field=DecimalField())
-    )['total']
-    
-    # 2. إجمالي المداخيل الإضافية من سجل المداخيل
-    total_income_records = income_records.aggregate(
-        total=Coalesce(Sum('amount'), Decimal(0), output_field=DecimalField())
-    )['total']
-
-    # 3. مصاريف التجار التي دفعها التاجر (payer_type='them')
-    # تم التصحيح هنا من 'contact' إلى 'them' لتطابق الموديل
-    total_contact_exp_by_them = contact_expenses.filter(payer_type='them').aggregate(
-        total=Coalesce(Sum('amount'), Decimal(0), output_field=DecimalField())
-    )['total']
-    
+    ).order_by('-date')
+
+    # الفواتير المؤرشفة داخل الفترة تظهر كصفوف للقراءة فقط، لأن الإجماليات بالأعلى تشملها
+    if includes_archive(filter_q):
+        archived = ArchivedTransaction.objects.filter(**filter_q).select_related('product', 'contact').annotate(
+            paid=F('amount_paid'),
+            remaining=ExpressionWrapper(F('total_price') - F('amount_paid'), output_field=DecimalField()),
+            archived=Value(True),
+        )
+        transactions = sorted([*transactions, *archived], key=lambda t: t.date, reverse=True)
+
+    contact_expenses = ContactExpense.objects.filter(**filter_q).select_related('contact').order_by('-date')
+    home_expenses = HomeExpense.objects.filter(**filter_q).order_by('-date')
+    income_records = IncomeRecord.objects.filter(**filter_q).order_by('-date')
+
+    # --- الحسابات المالية الإجمالية (الدرج / السيولة): استعلام تجميع واحد لكل دفتر ---
+    totals = period_totals(filter_q)
+    invoices, c_expenses = totals['transactions'], totals['contact_expenses']
+
     # إجمالي التدفق الداخل (كاش مبيعات + مبالغ واردة + مبالغ وفرها التاجر بدفعه المصاريف)
-    total_inflow = actual_sales_collection + total_income_records + total_contact_exp_by_them
+    total_inflow = invoices['collected'] + totals['income'] + c_expenses['them']
 
-    # 4. سداد المشتريات (ما خرج فعلياً من الدرج لفواتير الوارد 'in')
-    actual_purchase_payments = transactions.filter(transaction_type='in').aggregate(
-        total=Coalesce(Sum('paid'), Decimal(0), output_field=DecimalField())
-    )['total']
-    
-    # 5. إجمالي مصاريف البيت
-    total_home_exp = home_expenses.aggregate(
-        total=Coalesce(Sum('amount'), Decimal(0), output_field=DecimalField())
-    )['total']
-    
-    # 6. إجمالي مصاريف التجار التي سددناها نحن (payer_type='us')
-    total_contact_exp_us = contact_expenses.filter(payer_type='us').aggregate(
-        total=Coalesce(Sum('amount'), Decimal(0), output_field=DecimalField())
-    )['total']
-    
-    # إجمالي التدفق الخارج الفعلي
-    total_outflow = actual_purchase_payments + total_home_exp + total_contact_exp_us
-    
-    # صافي السيولة النهائي
-    net_cash_flow = total_inflow - total_outflow
+    # إجمالي التدفق الخارج الفعلي (سداد المشتريات + مصاريف البيت + مصاريف التجار التي سددناها نحن)
+    total_outflow = invoices['paid'] + totals['home_expenses'] + c_expenses['us']
 
     context = {
         'transactions': transactions,
         'contact_expenses': contact_expenses,
         'home_expenses': home_expenses,
         'income_records': income_records,
-        'actual_collection': actual_sales_collection,
-        'actual_payments': actual_purchase_payments,
-        'total_income': total_income_records + total_contact_exp_by_them, # الوارد الكلي
-        'total_expenses': total_home_exp + total_contact_exp_us,           # الصادر الكلي
-        'net_cash_flow': net_cash_flow,
+        'actual_collection': invoices['collected'],
+        'actual_payments': invoices['paid'],
+        'total_income': total_inflow - invoices['collected'],  # الوارد الكلي
+        'total_expenses': total_outflow - invoices['paid'],     # الصادر الكلي
+        'net_cash_flow': total_inflow - total_outflow,
     }
 
     return render(request, 'transactions.html', context)
@@ -233,53 +150,33 @@ def transactions_list(request):
 def contact_detail(request, pk):
     contact = get_object_or_404(Contact, pk=pk)
     transactions = DailyTransaction.objects.filter(contact=contact).select_related('product', 'financialrecord').order_by('-date')
-    
     contact_expenses = ContactExpense.objects.filter(contact=contact).order_by('-date')
-    
-    products = Product.objects.all()
-    today = timezone.now().date()
-    
-    balance_us, balance_them = 0, 0
-    records = FinancialRecord.objects.filter(transaction__contact=contact)
-    for record in records:
-        if record.transaction.transaction_type == 'out': 
-            balance_us += record.remaining_amount
-        else: 
-            balance_them += record.remaining_amount
-
-    total_expenses = contact_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-
-    us_paid_expenses = contact_expenses.filter(payer_type='us').aggregate(Sum('amount'))['amount__sum'] or 0
-    balance_us += us_paid_expenses
-    
-    them_paid_expenses = contact_expenses.filter(payer_type='them').aggregate(Sum('amount'))['amount__sum'] or 0
-    balance_them += them_paid_expenses
 
-    net_balance = balance_us - balance_them
-    
+    # الإجماليات وصافي الحساب (لنا + / علينا -) باستعلامات تجميع بدلاً من المرور على كل فاتورة
+    summary = contact_summary(contact)
+
     payment_history = PaymentInstallment.objects.filter(
         financial_record__transaction__contact=contact
     ).select_related('financial_record__transaction__product', 'financial_record__transaction').order_by('-date_paid')
 
-    total_out = transactions.filter(transaction_type='out').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    total_in = transactions.filter(transaction_type='in').aggregate(Sum('total_price'))['total_price__sum'] or 0
-
     context = {
         'contact': contact, 
         'transactions': transactions, 
         'contact_expenses': contact_expenses,
-        'products': products,
-        'today': today,
-        'total_out': total_out,
-        'total_in': total_in,
-        'total_expenses': total_expenses,
-        'total_remaining': abs(net_balance), 
-        'net_balance': net_balance,
+        'products': Product.objects.all(),
+        'today': timezone.now().date(),
+        'total_out': summary['total_out'],
+        'total_in': summary['total_in'],
+        'total_expenses': summary['total_expenses'],
+        'total_remaining': abs(summary['net_balance']), 
+        'net_balance': summary['net_balance'],
+        'carry_forward': summary['carry_forward'],
         'payment_history': payment_history,
     }
     return render(request, 'contact_detail.html', context)
 
 @user_passes_test(lambda u: u.is_superuser)
+@idempotent
 def add_contact_expense(request):
     if request.method == 'POST':
         try:
@@ -340,6 +237,7 @@ def edit_contact_expense(request, expense_id):
     return redirect(request.META.get('HTTP_REFERER'))
 
 @user_passes_test(lambda u: u.is_superuser)
+@idempotent
 def add_transaction_direct(request):
     if request.method == 'POST':
         try:
@@ -371,6 +269,7 @@ def add_transaction_direct(request):
     return redirect(request.META.get('HTTP_REFERER'))
 
 @user_passes_test(lambda u: u.is_superuser)
+@idempotent
 def update_paid_amount(request, record_id):
     if request.method == 'POST':
         target_id = record_id if record_id != 0 else request.POST.get('record_id')
@@ -396,6 +295,9 @@ def update_paid_amount(request, record_id):
                 messages.warning(request, "يجب إدخال مبلغ أكبر من الصفر.")
         except (InvalidOperation, ValueError):
             messages.error(request, "خطأ في المبلغ.")
+        except ValidationError as e:
+            # دفعة بتاريخ داخل فترة مغلقة (block_edits_in_closed_period)
+            messages.error(request, e.messages[0])
     return redirect(request.META.get('HTTP_REFERER'))
 
 @login_required
@@ -434,25 +336,101 @@ def edit_payment_amount(request, payment_id):
             
     return redirect(request.META.get('HTTP_REFERER'))
 
+# --- 3.1 دفتر حركة المخزون ---
+
+@login_required
+def product_stock(request, pk):
+    """كشف حركة المنتج بالرصيد الجاري (من / إلى اختياري) ورصيده في أي تاريخ (as_of)"""
+    product = get_object_or_404(Product, pk=pk)
+    start = parse_date(request.GET.get('start') or '')
+    end = parse_date(request.GET.get('end') or '')
+    as_of = parse_date(request.GET.get('as_of') or '')
+    opening, movements = movement_history(product, start, end)
+
+    paginator = Paginator(movements, 100)
+    # بدون رقم صفحة تُعرض آخر الحركات
+    page = paginator.get_page(request.GET.get('page') or paginator.num_pages)
+    context = {
+        'product': product,
+        'page_obj': page,
+        'opening': opening,
+        'start': start,
+        'end': end,
+        'as_of': as_of,
+        'as_of_balance': stock_as_of(as_of, [product.pk]).get(product.pk) if as_of else None,
+        'today': timezone.now().date(),
+    }
+    return render(request, 'product_stock.html', context)
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@idempotent
+def adjust_product_stock(request, pk):
+    """تسوية يدوية للمخزون (هالك أو فرق جرد) تُسجل في الدفتر باسم المستخدم"""
+    product = get_object_or_404(Product, pk=pk)
+    if request.method == 'POST':
+        try:
+            quantity = Decimal(request.POST.get('quantity') or 0)
+            if request.POST.get('direction') == 'out':
+                quantity = -quantity
+            adjust_stock(
+                product, quantity, date=parse_date(request.POST.get('date') or ''),
+                notes=request.POST.get('notes', ''), user=request.user,
+            )
+        except InvalidOperation:
+            messages.error(request, "خطأ في الكمية.")
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(request, f"تم تسجيل التسوية. الكمية المتاحة الآن: {Product.objects.get(pk=pk).quantity_available}")
+    return redirect('product_stock', pk=product.pk)
+
 # --- 4. نظام البنك والأقساط ---
 
 @login_required
 def bank_statement(request):
-    loan = BankLoan.objects.filter(is_active=True).first()
-    installments = []
-    summary = {'total_flow': 0, 'total_interest': 0, 'total_paid': 0, 'total_remaining': 0}
-
-    if loan:
-        installments = BankInstallment.objects.filter(loan=loan).order_by('due_date')
-        aggregate_data = installments.aggregate(total_flow=Sum('total_installment_amount'), total_interest=Sum('interest_component'))
-        total_paid = installments.filter(is_paid=True).aggregate(Sum('total_installment_amount'))['total_installment_amount__sum'] or 0
-        total_flow = aggregate_data['total_flow'] or 0
-        summary = {
-            'total_flow': total_flow, 'total_interest': aggregate_data['total_interest'] or 0,
-            'total_paid': total_paid, 'total_remaining': total_flow - total_paid
-        }
-
-    return render(request, 'bank_statement.html', {'loan': loan, 'installments': installments, 'summary': summary})
+    """محفظة القروض: ملخص كل القروض النشطة مع رابط لكشف كل قرض"""
+    portfolio = portfolio_summary()
+    return render(request, 'bank_portfolio.html', portfolio)
+
+@login_required
+def bank_loan_statement(request, loan_id):
+    loan = get_object_or_404(BankLoan, pk=loan_id)
+    installments = BankInstallment.objects.filter(loan=loan).order_by('due_date')
+    return render(request, 'bank_statement.html', {
+        'loan': loan, 'installments': installments, 'summary': loan_totals(installments),
+    })
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def reschedule_loan(request, loan_id):
+    """سداد مبكر أو إعادة جدولة: GET يعرض المعاينة (قبل/بعد) و POST ينفذ نفس الخطة"""
+    loan = get_object_or_404(BankLoan, pk=loan_id)
+    data = request.POST if request.method == 'POST' else request.GET
+    try:
+        prepayment = Decimal(data.get('prepayment') or 0)
+        rate = Decimal(data['rate']) if data.get('rate') else None
+        months = int(data['months']) if data.get('months') else None
+    except (InvalidOperation, ValueError):
+        messages.error(request, "خطأ في الرقم.")
+        return redirect('bank_loan_statement', loan_id=loan.pk)
+
+    try:
+        plan = plan_reschedule(loan, prepayment=prepayment, mode=data.get('mode', 'installment'), rate=rate, months=months)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('bank_loan_statement', loan_id=loan.pk)
+
+    if request.method == 'POST':
+        try:
+            result = apply_reschedule(plan)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(request, f"تمت إعادة الجدولة: تعديل {result['updated']} قسط، إضافة {result['created']}، حذف {result['deleted']}.")
+        return redirect('bank_loan_statement', loan_id=loan.pk)
+
+    return render(request, 'loan_reschedule.html', {'loan': loan, 'plan': plan})
 
 @login_required
 def add_bank_installment(request):
@@ -462,37 +440,144 @@ def add_bank_installment(request):
 @user_passes_test(lambda u: u.is_superuser)
 def toggle_installment_status(request, inst_id):
     installment = get_object_or_404(BankInstallment, id=inst_id)
-    installment.is_paid = not installment.is_paid
-    installment.save()
-    
-    capital = Capital.objects.first()
-    if capital:
-        if installment.is_paid:
-            capital.initial_amount -= installment.total_installment_amount
+    try:
+        set_installments_paid([installment], not installment.is_paid)
+        messages.success(request, "تم تحديث القسط وتعديل الخزنة.")
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+    return redirect('bank_loan_statement', loan_id=installment.loan_id)
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def bulk_installment_status(request, loan_id):
+    """تعليم الأقساط المحددة من كشف القرض كمدفوعة أو غير مدفوعة بحركة خزنة واحدة"""
+    if request.method == 'POST':
+        paid = request.POST.get('action') == 'paid'
+        try:
+            on_date = parse_date(request.POST.get('date') or '')
+        except ValueError:
+            on_date = None
+        installments = BankInstallment.objects.filter(loan_id=loan_id, pk__in=request.POST.getlist('installments'))
+        try:
+            count, delta = set_installments_paid(list(installments), paid, on_date)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
         else:
-            capital.initial_amount += installment.total_installment_amount
-        capital.save()
-        
-    messages.success(request, "تم تحديث القسط وتعديل الخزنة.")
-    return redirect('bank_statement')
+            if count:
+                messages.success(request, f"تم تحديث {count} قسط وتعديل الخزنة بمبلغ {delta:+,.0f}.")
+            else:
+                messages.warning(request, "لم يتغير أي قسط.")
+    return redirect('bank_loan_statement', loan_id=loan_id)
+
+BANK_IMPORT_MAX_BYTES = 5 * 1024 * 1024
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def bank_import(request):
+    """رفع كشف البنك CSV ومعاينة المطابقة المقترحة لكل سطر (التأكيد في confirm_bank_import)"""
+    context = {}
+    if request.method == 'POST':
+        upload = request.FILES.get('statement')
+        if not upload:
+            messages.error(request, "اختر ملف الكشف أولاً.")
+        elif upload.size > BANK_IMPORT_MAX_BYTES:
+            messages.error(request, "حجم الملف أكبر من 5 ميجا.")
+        else:
+            try:
+                lines, errors = parse_statement(upload.read())
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                results = match_statement(lines)
+                context = {
+                    'file_name': upload.name,
+                    'results': results,
+                    'errors': errors,
+                    'matched': sum(1 for r in results if r['candidates']),
+                    'confirmed': sum(1 for r in results if r['confirm']),
+                    'duplicates': sum(1 for r in results if r['duplicate']),
+                    # الضغط مرتين على التأكيد لا يسجل الدفعات مرتين
+                    'idempotency_key': uuid.uuid4().hex,
+                }
+    return render(request, 'bank_import.html', context)
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@idempotent
+def confirm_bank_import(request):
+    """الأسطر المؤكدة من المعاينة تُكتب كدفعات بعملية جماعية واحدة"""
+    if request.method == 'POST':
+        try:
+            confirmed = []
+            for i in request.POST.getlist('line'):
+                record_id = request.POST.get(f'record_{i}')
+                if not record_id:
+                    continue
+                line = StatementLine(
+                    int(request.POST[f'number_{i}']), parse_date(request.POST[f'date_{i}']),
+                    Decimal(request.POST[f'amount_{i}']), request.POST.get(f'description_{i}', ''),
+                    request.POST.get(f'reference_{i}', ''), request.POST[f'key_{i}'],
+                )
+                if line.date is None:
+                    raise ValueError
+                confirmed.append((int(record_id), line))
+            count, delta = import_lines(confirmed)
+        except (KeyError, ValueError, InvalidOperation):
+            messages.error(request, "بيانات التأكيد غير صالحة. أعد رفع الكشف.")
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            if count:
+                messages.success(request, f"تم تسجيل {count} دفعة من كشف البنك (صافي حركة الخزنة {delta:,.2f}).")
+            else:
+                messages.warning(request, "لم يتم اختيار أي سطر.")
+    return redirect('bank_import')
 
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
 def update_installment_charges(request, inst_id):
+    installment = get_object_or_404(BankInstallment, id=inst_id)
     if request.method == 'POST':
         new_charges = request.POST.get('extra_charges')
         if new_charges is not None:
-            installment = get_object_or_404(BankInstallment, id=inst_id)
             try:
                 installment.extra_charges = Decimal(new_charges)
                 installment.save()
                 messages.success(request, "تم تحديث الرسوم.")
             except (InvalidOperation, ValueError):
                 messages.error(request, "خطأ في الرقم.")
-    return redirect('bank_statement')
+    return redirect('bank_loan_statement', loan_id=installment.loan_id)
 
 # --- 5. سجلات المدير (Admin Logs) ---
 
+ADMIN_LOGS_PAGE_SIZE = 25
+
+def _admin_logs_querysets(filter_q):
+    """استعلامات أقسام السجلات (كسولة: لا تُنفذ إلا عند عرض صفحة من القسم)"""
+    # نفس الفترة على تاريخ الدفع (date__gte -> date_paid__gte ...)
+    payments_q = {key.replace('date', 'date_paid', 1): value for key, value in filter_q.items()}
+    return {
+        'purchases': DailyTransaction.objects.filter(transaction_type='in', **filter_q).select_related(
+            'product', 'contact', 'financialrecord'
+        ).annotate(paid_amount=F('financialrecord__amount_paid')).order_by('-date', '-pk'),
+        'profits': DailyTransaction.objects.filter(transaction_type='out', **filter_q).select_related(
+            'product', 'contact', 'financialrecord'
+        ).annotate(
+            paid_amount=F('financialrecord__amount_paid'),
+            unit_profit=ExpressionWrapper(
+                F('total_price') - (F('weight') * F('product__purchase_price_per_kg')),
+                output_field=DecimalField()
+            )
+        ).order_by('-date', '-pk'),
+        'payments': PaymentInstallment.objects.filter(**payments_q).select_related(
+            'financial_record__transaction',
+            'financial_record__transaction__contact'
+        ).order_by('-date_paid', '-pk'),
+        'home_expenses': HomeExpense.objects.filter(**filter_q).order_by('-date', '-pk'),
+        'contact_expenses': ContactExpense.objects.filter(**filter_q).select_related('contact').order_by('-date', '-pk'),
+        'income': IncomeRecord.objects.filter(**filter_q).order_by('-date', '-pk'),
+    }
+
 @user_passes_test(lambda u: u.is_superuser)
 def admin_logs_dashboard(request):
     period = request.GET.get('period', 'all')
@@ -500,95 +585,43 @@ def admin_logs_dashboard(request):
     end_date = request.GET.get('end_date')
     today = timezone.now().date()
 
-    # --- 1. جلب البيانات الأساسية مع الفلترة ---
-    purchase_logs = DailyTransaction.objects.filter(transaction_type='in').select_related('product', 'contact', 'financialrecord').annotate(
-        paid_amount=F('financialrecord__amount_paid')
-    )
-    
-    payment_logs = PaymentInstallment.objects.select_related(
-        'financial_record__transaction', 
-        'financial_record__transaction__contact'
-    )
-
-    profit_logs = DailyTransaction.objects.filter(transaction_type='out').select_related('product', 'contact', 'financialrecord').annotate(
-        paid_amount=F('financialrecord__amount_paid'),
-        unit_profit=ExpressionWrapper(
-            F('total_price') - (F('weight') * F('product__purchase_price_per_kg')), 
-            output_field=DecimalField()
-        )
-    )
-
-    home_expenses = HomeExpense.objects.all()
-    contact_expenses = ContactExpense.objects.select_related('contact').all()
-    income_records = IncomeRecord.objects.all()
-
-    # تطبيق الفلترة الزمنية
-    if period == 'today':
-        purchase_logs, profit_logs = purchase_logs.filter(date=today), profit_logs.filter(date=today)
-        home_expenses, contact_expenses = home_expenses.filter(date=today), contact_expenses.filter(date=today)
-        income_records = income_records.filter(date=today)
-    elif period == 'week':
-        last_week = today - timedelta(days=7)
-        purchase_logs, profit_logs = purchase_logs.filter(date__gte=last_week), profit_logs.filter(date__gte=last_week)
-        home_expenses, contact_expenses = home_expenses.filter(date__gte=last_week), contact_expenses.filter(date__gte=last_week)
-        income_records = income_records.filter(date__gte=last_week)
-    elif period == 'month':
-        last_month = today - timedelta(days=30)
-        purchase_logs, profit_logs = purchase_logs.filter(date__gte=last_month), profit_logs.filter(date__gte=last_month)
-        home_expenses, contact_expenses = home_expenses.filter(date__gte=last_month), contact_expenses.filter(date__gte=last_month)
-        income_records = income_records.filter(date__gte=last_month)
-    elif start_date and end_date:
-        purchase_logs, profit_logs = purchase_logs.filter(date__range=[start_date, end_date]), profit_logs.filter(date__range=[start_date, end_date])
-        home_expenses, contact_expenses = home_expenses.filter(date__range=[start_date, end_date]), contact_expenses.filter(date__range=[start_date, end_date])
-        income_records = income_records.filter(date__range=[start_date, end_date])
+    # --- 1. الملخص فقط: جداول السجلات تُجلب لاحقاً من admin_logs_section صفحة بصفحة ---
+    totals = period_totals(period_filter(request.GET, today))
 
     # --- 2. حسابات صافي ربح الفترة ---
-    total_sales_profit = profit_logs.aggregate(total=Sum('unit_profit'))['total'] or 0
-    total_home_expenses = home_expenses.aggregate(total=Sum('amount'))['total'] or 0
-    total_contact_expenses = contact_expenses.aggregate(total=Sum('amount'))['total'] or 0
-    total_income_period = income_records.aggregate(total=Sum('amount'))['total'] or 0
+    total_sales_profit = totals['transactions']['profit']
+    total_home_expenses = totals['home_expenses']
+    total_contact_expenses = totals['contact_expenses']['total']
+    total_income_period = totals['income']
     
     net_profit_period = (total_sales_profit + total_income_period) - (total_home_expenses + total_contact_expenses)
 
-    # --- 3. منطق المقاصة الشامل (Netting Logic) ---
-    # جلب كافة الديون من الفواتير
-    financial_records = FinancialRecord.objects.all().annotate(
-        rem=ExpressionWrapper(F('transaction__total_price') - F('amount_paid'), output_field=DecimalField())
-    )
-
-    contact_balances = {} # قاموس لتجميع صافي كل تاجر
-
-    # إضافة ديون الفواتير (لنا + / علينا -)
-    for rec in financial_records:
-        cid = rec.transaction.contact.id
-        if rec.transaction.transaction_type == 'out':
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) + rec.rem
-        else:
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) - rec.rem
-
-    # إضافة كافة مصاريف التجار (دفعنا نحن + / دفع التاجر -)
-    all_c_expenses = ContactExpense.objects.all()
-    for exp in all_c_expenses:
-        cid = exp.contact.id
-        if exp.payer_type == 'us':
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) + exp.amount
-        else:
-            contact_balances[cid] = contact_balances.get(cid, Decimal(0)) - exp.amount
-
-    # حساب الإجماليات النهائية بعد المقاصة لكل التجار
-    receivable = sum(bal for bal in contact_balances.values() if bal > 0)
-    payable = abs(sum(bal for bal in contact_balances.values() if bal < 0))
-
-    # --- 4. حسابات المركز المالي ---
-    capital_obj = Capital.objects.first()
-    cash_in_hand = capital_obj.initial_amount if capital_obj else Decimal(0)
-
-    products = Product.objects.all()
-    total_inventory_value = sum(p.quantity_available * p.purchase_price_per_kg for p in products)
-
-    loan = BankLoan.objects.filter(is_active=True).first()
-    bank_remaining = BankInstallment.objects.filter(loan=loan, is_paid=False).aggregate(
-        total=Sum('total_installment_amount'))['total'] or 0 if loan else 0
+    # --- 3. المركز المالي: الآن، أو كما كان في نهاية يوم معين (as_of) ---
+    try:
+        as_of = parse_date(request.GET.get('as_of', ''))
+    except ValueError:
+        as_of = None
+    if as_of and as_of < today:
+        # أقرب لقطة قبل التاريخ + حركات ما بعدها فقط
+        position = position_as_of(as_of)
+        cash_in_hand = position['cash']
+        total_inventory_value = position['inventory_value']
+        receivable = position['receivable']
+        payable = position['payable']
+        bank_remaining = position['loan_remaining']
+    else:
+        as_of = None
+        # منطق المقاصة الشامل: أرصدة آخر لقطة + الفواتير والدفعات والمصاريف التي وقعت بعدها فقط
+        contact_balances = contact_balances_as_of()
+        receivable = sum(bal for bal in contact_balances.values() if bal > 0)
+        payable = abs(sum(bal for bal in contact_balances.values() if bal < 0))
+
+        capital_obj = Capital.objects.first()
+        cash_in_hand = capital_obj.initial_amount if capital_obj else Decimal(0)
+
+        total_inventory_value = inventory_value()
+
+        bank_remaining = portfolio_summary(today)['totals']['remaining_total']
 
     # إجمالي رأس المال المعدل بالمقاصة
     total_capital = (cash_in_hand + total_inventory_value + receivable) - (payable + bank_remaining)
@@ -605,16 +638,127 @@ def admin_logs_dashboard(request):
         'total_home_expenses': total_home_expenses,
         'total_contact_expenses': total_contact_expenses,
         'net_profit_period': net_profit_period,
-        'purchase_logs': purchase_logs.order_by('-date'),
-        'payment_logs': payment_logs.order_by('-date_paid')[:20],
-        'profit_logs': profit_logs.order_by('-date'),
-        'home_expenses': home_expenses.order_by('-date'),
-        'contact_expenses': contact_expenses.order_by('-date'),
-        'income_logs': income_records.order_by('-date'),
         'today': today,
+        'as_of': as_of,
         'start_date': start_date,
         'end_date': end_date,
         'period': period,
     }
 
-    return render(request, 'admin_logs.html', context)
\ No newline at end of file
+    return render(request, 'admin_logs.html', context)
+
+@user_passes_test(lambda u: u.is_superuser)
+def admin_logs_section(request, section):
+    """جزء HTML لقسم واحد من سجلات المدير (صفحة واحدة فقط) يُحمل عند الحاجة من admin_logs.html"""
+    logs = _admin_logs_querysets(period_filter(request.GET))
+    if section not in logs:
+        raise Http404
+    page = Paginator(logs[section], ADMIN_LOGS_PAGE_SIZE).get_page(request.GET.get('page'))
+    query = request.GET.copy()
+    query.pop('page', None)
+    return render(request, f'partials/admin_logs_{section}.html', {
+        'page': page,
+        'section': section,
+        'query': query.urlencode(),
+    })
+
+@user_passes_test(lambda u: u.is_superuser)
+def analytics_report(request):
+    """ربحية المنتجات والتجار والشهور، توزيع هامش الربح، ودوران المخزون لفترة (الافتراضي: آخر سنة)"""
+    try:
+        start = parse_date(request.GET.get('start_date', ''))
+        end = parse_date(request.GET.get('end_date', ''))
+    except ValueError:
+        start = end = None
+    if start and end and start > end:
+        messages.error(request, "تاريخ البداية بعد تاريخ النهاية.")
+        start = end = None
+
+    return render(request, 'analytics_report.html', {'report': profitability_report(start, end)})
+
+@user_passes_test(lambda u: u.is_superuser)
+def report_api(request):
+    """منشئ التقارير: JSON لأي تجميع من الأبعاد والمقاييس (انظر store/report_builder.py)"""
+    try:
+        spec = parse_spec(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(run_report(spec))
+
+@login_required
+def forecast_api(request):
+    """توقع رصيد الخزنة يوماً بيوم للرسم البياني في الرئيسية (?months= من 1 إلى 24، انظر store/forecast.py)"""
+    try:
+        months = int(request.GET.get('months') or 0) or None
+    except ValueError:
+        return JsonResponse({'error': "months يجب أن يكون رقماً صحيحاً"}, status=400)
+    return JsonResponse(cash_forecast(months))
+
+@user_passes_test(lambda u: u.is_superuser)
+def slow_queries(request):
+    """أبطأ أشكال الاستعلامات من سجل STORE_SLOW_QUERY_MS بمجموع الوقت، مع خطة تنفيذ أبطأ مرة لكل شكل"""
+    return render(request, 'slow_queries.html', {
+        'queries': top_queries(),
+        'threshold_ms': getattr(settings, 'STORE_SLOW_QUERY_MS', 0),
+    })
+
+def metrics_view(request):
+    """
+    مقاييس التشغيل وأرقام العمل بصيغة Prometheus (انظر store/metrics.py): للمدير، أو لخادم
+    Prometheus بالرأس Authorization: Bearer <STORE_METRICS_TOKEN>.
+    """
+    token = getattr(settings, 'STORE_METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    by_token = bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    if not (by_token or request.user.is_superuser):
+        return HttpResponseForbidden()
+    values = metrics.collect()
+    values.update(metrics.business_gauges())
+    return HttpResponse(metrics.render(values), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- 6. التطبيق على الهاتف (PWA) والعمل بدون اتصال ---
+
+# ملفات واجهة التطبيق التي تُخزن في الهاتف عند أول فتح، فتفتح الصفحات بدون إنترنت
+PWA_SHELL = [
+    'vendor/bootstrap/css/bootstrap.rtl.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/icons.min.css',
+    'vendor/fontawesome/webfonts/fa-solid-900.woff2',
+    'vendor/fontawesome/webfonts/fa-regular-400.woff2',
+    'images/1.jpeg',
+    'js/offline-queue.js',
+    'js/offline.js',
+]
+
+@cache_control(no_cache=True)
+def service_worker(request):
+    """
+    يُخدم من جذر الموقع (وليس من /static/) ليتحكم في كل الصفحات. روابط الملفات المشفرة
+    تتغير مع كل collectstatic فيتغير رقم النسخة ويُحدث المتصفح الـ service worker تلقائياً.
+    """
+    shell = [static(name) for name in PWA_SHELL] + [reverse('offline')]
+    return render(request, 'sw.js', {
+        'shell': json.dumps(shell),
+        'version': hashlib.sha256(''.join(shell).encode()).hexdigest()[:12],
+        'offline_url': reverse('offline'),
+        'static_url': settings.STATIC_URL,
+        'queue_script': static('js/offline-queue.js'),
+    }, content_type='application/javascript')
+
+def web_manifest(request):
+    return JsonResponse({
+        'name': 'الروماني للاستيراد والتصدير',
+        'short_name': 'الروماني',
+        'lang': 'ar',
+        'dir': 'rtl',
+        'start_url': reverse('dashboard'),
+        'scope': '/',
+        'display': 'standalone',
+        'background_color': '#f8f9fa',
+        'theme_color': '#2c3e50',
+        'icons': [{'src': static('images/1.jpeg'), 'sizes': '1290x1295', 'type': 'image/jpeg'}],
+    }, content_type='application/manifest+json', json_dumps_params={'ensure_ascii': False})
+
+def offline(request):
+    """الصفحة البديلة عند فتح صفحة لم تُخزن من قبل أثناء انقطاع الاتصال"""
+    return render(request, 'offline.html')
@@ -0,0 +1,97 @@
+/*
+ * Service worker (مولد من templates/sw.js بواسطة views.service_worker). النسخة: {{ version }}
+ *
+ * - ملفات الواجهة (CSS / JS / الخطوط) تُخزن عند التثبيت وتُقرأ من الهاتف دائماً (أسماؤها مشفرة فلا تتغير).
+ * - الصفحات: من الشبكة أولاً، وآخر نسخة ناجحة من كل صفحة تُحفظ لتُعرض عند انقطاع الاتصال.
+ * - طابور النماذج (offline-queue.js) يُرسل عند عودة الاتصال عبر Background Sync إن توفر.
+ */
+importScripts('{{ queue_script }}');
+
+var VERSION = '{{ version }}';
+var SHELL_CACHE = 'shell-' + VERSION;
+var PAGES_CACHE = 'pages';
+var SHELL = {{ shell|safe }};
+var OFFLINE_URL = '{{ offline_url }}';
+
+self.addEventListener('install', function (event) {
+    event.waitUntil(
+        caches.open(SHELL_CACHE).then(function (cache) { return cache.addAll(SHELL); }).then(function () {
+            return self.skipWaiting();
+        })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys().then(function (names) {
+            return Promise.all(names.filter(function (name) {
+                return name.indexOf('shell-') === 0 && name !== SHELL_CACHE;
+            }).map(function (name) { return caches.delete(name); }));
+        }).then(function () { return self.clients.claim(); })
+    );
+});
+
+function fromShell(request) {
+    return caches.match(request).then(function (cached) {
+        return cached || fetch(request).then(function (response) {
+            if (response.ok) {
+                var copy = response.clone();
+                caches.open(SHELL_CACHE).then(function (cache) { cache.put(request, copy); });
+            }
+            return response;
+        });
+    });
+}
+
+function networkFirst(request) {
+    return fetch(request).then(function (response) {
+        // صفحة الدخول (بعد انتهاء الجلسة) لا تُحفظ مكان الصفحة المطلوبة
+        if (response.ok && !response.redirected) {
+            var copy = response.clone();
+            caches.open(PAGES_CACHE).then(function (cache) { cache.put(request, copy); });
+        }
+        return response;
+    }).catch(function () {
+        return caches.open(PAGES_CACHE).then(function (cache) {
+            return cache.match(request, { ignoreVary: true });
+        }).then(function (cached) {
+            return cached || caches.match(OFFLINE_URL);
+        });
+    });
+}
+
+self.addEventListener('fetch', function (event) {
+    var request = event.request;
+    var url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname.indexOf('/admin/') === 0) {
+        return;
+    }
+    if (url.pathname.indexOf('{{ static_url }}') === 0) {
+        event.respondWith(fromShell(request));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+function notifyClients(results) {
+    return self.clients.matchAll({ type: 'window' }).then(function (clients) {
+        clients.forEach(function (client) { client.postMessage({ type: 'replayed', results: results }); });
+    });
+}
+
+self.addEventListener('sync', function (event) {
+    if (event.tag === 'store-replay') {
+        event.waitUntil(OfflineQueue.replay().then(function (results) {
+            return notifyClients(results.map(function (result) {
+                return { done: result.done, reason: result.reason, data: result.data, label: result.entry.label };
+            }));
+        }));
+    }
+});
+
+self.addEventListener('message', function (event) {
+    // الصفحات المحفوظة فيها بيانات الحسابات، فتُحذف عند تسجيل الخروج
+    if (event.data && event.data.type === 'logout') {
+        event.waitUntil(caches.delete(PAGES_CACHE));
+    }
+});